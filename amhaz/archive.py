@@ -0,0 +1,40 @@
+"""
+Shared helpers for moving old rows into archive tables.
+
+An archive model mirrors the live model's columns (same attnames, same
+primary keys, created_at without auto_now_add) so rows can be copied
+with a plain values() -> bulk_create round trip. Each batch is copied and
+deleted in one transaction, so a run can be interrupted at any point.
+"""
+from django.db import transaction
+
+COPY_BATCH_SIZE = 1000
+
+
+def copy_rows(queryset, archive_model):
+    fields = [field.attname for field in archive_model._meta.concrete_fields]
+    archive_model.objects.bulk_create(
+        [archive_model(**row) for row in queryset.values(*fields)],
+        batch_size=COPY_BATCH_SIZE,
+    )
+
+
+def archive_in_batches(queryset, archive_model, batch_size=1000, related=()):
+    """
+    Move the rows of `queryset` into `archive_model`, `batch_size` at a time.
+    `related` lists (model, fk_name, archive_model) children copied along
+    with each batch before the parents are deleted (deleting the parents
+    cascades to them). Returns the number of rows moved.
+    """
+    model = queryset.model
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return moved
+            copy_rows(model.objects.filter(id__in=ids), archive_model)
+            for child_model, fk_name, child_archive in related:
+                copy_rows(child_model.objects.filter(**{f"{fk_name}__in": ids}), child_archive)
+            model.objects.filter(id__in=ids).delete()
+            moved += len(ids)
@@ -3,6 +3,10 @@ ASGI config for amhaz project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Set ASYNC_CHECKOUT=True in the environment to serve the cart and checkout
+endpoints with async views (e.g. `uvicorn amhaz.asgi:application`); order
+emails are then sent with aiosmtplib when it is installed.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
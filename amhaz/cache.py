@@ -0,0 +1,144 @@
+"""
+Shared cache helpers.
+
+Keys are namespaced (catalog, cart, search) and versioned: bumping a
+namespace's version invalidates every key in it at once, across all
+workers, without having to know or delete the keys. A key can also
+belong to a group inside its namespace (one subcategory's listing) with
+a version of its own, to invalidate just that group. Values are stored
+with a "fresh until" time so an expired entry can still be served while
+a single worker (holding a short lock) rebuilds it.
+"""
+import time
+
+from django.core.cache import cache
+
+NAMESPACES = ("catalog", "cart", "search")
+
+DEFAULT_TIMEOUT = 300      # seconds a value is fresh
+STALE_TIMEOUT = 3600       # extra seconds a stale value may still be served
+LOCK_TIMEOUT = 30          # max seconds a rebuild may hold the lock
+LOCK_WAIT = 2              # seconds to wait for another worker's rebuild on a cold key
+
+
+def _version_key(namespace, group=None):
+    if group is None:
+        return f"ns:{namespace}:version"
+    return f"ns:{namespace}:{group}:version"
+
+
+def get_version(namespace, group=None):
+    version_key = _version_key(namespace, group)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, 1, timeout=None)
+        version = cache.get(version_key, 1)
+    return version
+
+
+def make_key(namespace, *parts, group=None):
+    """
+    Versioned key for `parts` in `namespace`. Keys made with a `group`
+    (e.g. one subcategory's listing) also carry the group's own version,
+    so invalidate_group() can drop them without touching the namespace.
+    """
+    if namespace not in NAMESPACES:
+        raise ValueError(f"Unknown cache namespace: {namespace}")
+    suffix = ":".join(str(part) for part in parts)
+    version = f"v{get_version(namespace)}"
+    if group is not None:
+        version += f":{group}:v{get_version(namespace, group)}"
+    return f"{namespace}:{version}:{suffix}"
+
+
+def _bump(version_key):
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # Version key missing (evicted or never set): start a new one
+        cache.set(version_key, int(time.time()), timeout=None)
+
+
+def invalidate(*namespaces):
+    """
+    Invalidate every key of the given namespaces by bumping their version.
+    """
+    for namespace in namespaces:
+        _bump(_version_key(namespace))
+
+
+def invalidate_group(namespace, group):
+    """
+    Invalidate only the keys made with `group` in `namespace`.
+    """
+    _bump(_version_key(namespace, group))
+
+
+def _count(namespace, outcome):
+    key = f"stats:{namespace}:{outcome}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def stats():
+    """
+    Return {namespace: {"hit": n, "stale": n, "miss": n}} shared by all workers.
+    """
+    outcomes = ("hit", "stale", "miss")
+    values = cache.get_many(
+        [f"stats:{namespace}:{outcome}" for namespace in NAMESPACES for outcome in outcomes]
+    )
+    return {
+        namespace: {
+            outcome: values.get(f"stats:{namespace}:{outcome}", 0)
+            for outcome in outcomes
+        }
+        for namespace in NAMESPACES
+    }
+
+
+def get_or_build(namespace, parts, builder, timeout=DEFAULT_TIMEOUT, group=None):
+    """
+    Return the cached value for (namespace, *parts), building it with
+    `builder()` when needed. See make_key() for `group`.
+
+    Only one worker rebuilds an expired value; the others keep serving the
+    stale copy until it is replaced. On a cold key the others wait up to
+    LOCK_WAIT seconds for the rebuild before building it themselves.
+    """
+    key = make_key(namespace, *parts, group=group)
+    lock_key = f"lock:{key}"
+    entry = cache.get(key)
+    now = time.time()
+
+    if entry is not None:
+        value, fresh_until = entry
+        if now < fresh_until:
+            _count(namespace, "hit")
+            return value
+
+        _count(namespace, "stale")
+        locked = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+        if not locked:
+            return value
+    else:
+        _count(namespace, "miss")
+        locked = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+        if not locked:
+            deadline = now + LOCK_WAIT
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+
+    try:
+        value = builder()
+        cache.set(key, (value, time.time() + timeout), timeout=timeout + STALE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
@@ -0,0 +1,182 @@
+"""
+Per-client request throttling for public endpoints.
+
+Each (scope, client) pair gets a sliding-window counter in the shared
+cache: hits are counted with add()/incr() in fixed windows, and the
+previous window's count is weighted by how much of it still overlaps
+the last `period` seconds. That smooths out the burst a plain fixed
+window allows at its edges, like a bucket that drains continuously.
+When the cache is unreachable, counting falls back to this process.
+
+incr() is atomic on the locmem (within a process) and redis backends.
+The file backend implements it as get() then set(), so hits counted by
+several workers at the same moment can overwrite each other: limits
+are then approximate, letting some extra requests through under
+concurrency, never throttling early. Use redis where limits must hold.
+
+Usage:
+
+    @ratelimit("search", rate="30/m")
+    def product_search(request): ...
+
+Throttled requests get a 429 with a Retry-After header.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+LOCAL_MAX_KEYS = 10000  # the in-process fallback forgets everything past this
+
+_local_counts = {}
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """
+    "30/m" -> (30, 60).
+    """
+    count, period = rate.split("/")
+    return int(count), PERIODS[period]
+
+
+def client_key(request, key="ip"):
+    """
+    Who is being throttled: the client IP, or for key="session" the
+    session (falling back to the IP for visitors without one) and the
+    user id for logged-in users. Behind settings.RATELIMIT_PROXY_COUNT
+    reverse proxies the IP is read from X-Forwarded-For.
+    """
+    if key == "session":
+        if request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        if request.session.session_key:
+            return f"session:{request.session.session_key}"
+    proxies = getattr(settings, "RATELIMIT_PROXY_COUNT", 0)
+    if proxies:
+        # Each trusted proxy appends the address it received the request
+        # from, so the client is `proxies` entries from the right. Entries
+        # further left come from the client and can be anything.
+        forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+        if len(forwarded) >= proxies:
+            return f"ip:{forwarded[-proxies]}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _incr(key, timeout):
+    try:
+        if cache.add(key, 1, timeout=timeout):
+            return 1
+        return cache.incr(key)
+    except ValueError:
+        # expired between add() and incr()
+        cache.add(key, 1, timeout=timeout)
+        return 1
+    except Exception:
+        logger.warning("Rate limit cache unavailable, counting in process", exc_info=True)
+        with _local_lock:
+            if len(_local_counts) > LOCAL_MAX_KEYS:
+                _local_counts.clear()
+            _local_counts[key] = _local_counts.get(key, 0) + 1
+            return _local_counts[key]
+
+
+def _get(key):
+    try:
+        return cache.get(key, 0)
+    except Exception:
+        return _local_counts.get(key, 0)
+
+
+def _count_throttled(scope):
+    key = f"ratelimit:stats:{scope}:throttled"
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception:
+        pass
+
+
+def stats(scopes):
+    """
+    {scope: throttled requests} across all workers.
+    """
+    keys = {f"ratelimit:stats:{scope}:throttled": scope for scope in scopes}
+    try:
+        values = cache.get_many(list(keys))
+    except Exception:
+        values = {}
+    return {scope: values.get(key, 0) for key, scope in keys.items()}
+
+
+def hit(scope, client, rate):
+    """
+    Count a request and return 0 if it is allowed, otherwise the number
+    of seconds to wait before retrying.
+    """
+    limit, period = parse_rate(rate)
+    now = time.time()
+    window = int(now // period)
+    elapsed = now - window * period
+
+    current = _incr(f"ratelimit:{scope}:{client}:{window}", timeout=2 * period)
+    previous = _get(f"ratelimit:{scope}:{client}:{window - 1}")
+    weighted = previous * (period - elapsed) / period + current
+
+    if weighted <= limit:
+        return 0
+    # Time until the previous window's share has drained enough
+    if previous and current <= limit:
+        wait = (weighted - limit) * period / previous
+    else:
+        wait = period - elapsed
+    return max(math.ceil(wait), 1)
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse("Too many requests, please slow down.", status=429, content_type="text/plain")
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, rate, key="ip"):
+    """
+    Throttle a view (sync or async) to `rate` requests per client.
+    settings.RATELIMIT_RATES can override the rate per scope. Nothing is
+    throttled unless settings.RATELIMIT_ENABLED is True.
+    """
+    def check(request):
+        if not getattr(settings, "RATELIMIT_ENABLED", False):
+            return None
+        client = client_key(request, key)
+        retry_after = hit(scope, client, getattr(settings, "RATELIMIT_RATES", {}).get(scope, rate))
+        if not retry_after:
+            return None
+        _count_throttled(scope)
+        logger.warning("Throttled %s on %s (retry after %ss)", client, scope, retry_after)
+        return too_many_requests(retry_after)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response = await sync_to_async(check)(request)
+                return response or await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return check(request) or view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
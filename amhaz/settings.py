@@ -12,18 +12,16 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
-STATIC_URL = '/static/'
 
-STATICFILES_DIRS = [
-    BASE_DIR / 'static',
-]
+# Load environment variables from the .env file, when there is one (servers
+# set them in the environment and skip importing python-dotenv)
+if (BASE_DIR / ".env").exists():
+    from dotenv import load_dotenv
+
+    load_dotenv(BASE_DIR / ".env")
 
 # Quick-start development settings - unsuitable for production
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -41,7 +39,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'products',
-    'cloudinary',
     'cloudinary_storage',
     'order',
 
@@ -49,12 +46,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'amhaz.templating.TemplateProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'amhaz.urls'
@@ -63,7 +62,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
@@ -72,11 +70,37 @@ TEMPLATES = [
                 'products.context_processors.navbar_data',
                 'products.context_processors.cart_context',
             ],
+            # Templates are compiled once per process; the runserver autoreloader
+            # clears them when a template changes. `manage.py precompile_templates`
+            # checks they all compile, gunicorn workers compile them at boot.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+# Log how long each template takes to render on every request and send it in
+# a Server-Timing header (amhaz/templating.py). For development and profiling;
+# `manage.py profile_templates <path>` does the same for a single page.
+TEMPLATE_PROFILING = os.getenv("TEMPLATE_PROFILING", "False") == "True"
+if TEMPLATE_PROFILING:
+    LOGGING = {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "handlers": {"console": {"class": "logging.StreamHandler"}},
+        "loggers": {"amhaz.templating": {"handlers": ["console"], "level": "INFO"}},
+    }
+
 WSGI_APPLICATION = 'amhaz.wsgi.application'
+ASGI_APPLICATION = 'amhaz.asgi.application'
+
+# Serve cart_add, cart_update_quantity and checkout with the async views in
+# order/async_views.py. Only useful when running under an ASGI server.
+ASYNC_CHECKOUT = os.getenv("ASYNC_CHECKOUT", "False") == "True"
 
 
 # Email configuration
@@ -106,6 +130,55 @@ DATABASES = {
 }
 
 
+# Cache
+# CACHE_BACKEND selects a shared cache so invalidation reaches every worker:
+# "locmem" (per process, default), "file" or "redis". CACHE_LOCATION is the
+# directory for "file" and the server URL for "redis"
+# (e.g. redis://127.0.0.1:6379/1). Helpers live in amhaz/cache.py.
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "amhaz"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / ".cache")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")]
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_DEFAULT_LOCATION),
+        "KEY_PREFIX": "amhaz",
+        "TIMEOUT": 300,
+    }
+}
+
+
+# Rate limiting of public endpoints (amhaz/ratelimit.py). Counters live in
+# the cache above, so use a shared backend for limits across workers; only
+# redis counts concurrent hits atomically ("file" can lose some).
+# RATELIMIT_RATES overrides a scope's rate, e.g. {"search": "60/m"}.
+# Clients are keyed by IP, so it is off until enabled. Behind reverse proxies
+# set RATELIMIT_PROXY_COUNT to how many of them append to X-Forwarded-For
+# (1 for a single nginx or load balancer): otherwise every visitor arrives
+# from the proxy's address and shares one limit.
+RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "False") == "True"
+RATELIMIT_PROXY_COUNT = int(os.getenv("RATELIMIT_PROXY_COUNT", "0"))
+RATELIMIT_RATES = {}
+
+
+# Checkout stock holds (order/reservations.py). Expired holds are released
+# whenever a cart adds or checks out the same product; the release_reservations
+# command sweeps the rest (run it from cron to keep the counters tidy)
+STOCK_RESERVATION_MINUTES = int(os.getenv("STOCK_RESERVATION_MINUTES", 15))
+
+
+# Sessions
+# cached_db serves session reads from the cache. Anonymous visitors only get
+# a session once they add to cart (see order.utils.get_cart). Set to
+# "django.contrib.sessions.backends.signed_cookies" to keep sessions out of
+# the database entirely.
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
+SESSION_SERIALIZER = "django.contrib.sessions.serializers.JSONSerializer"
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -123,7 +196,22 @@ USE_TZ = True
 
 
 # Static files (CSS, JavaScript, Images)
+# `manage.py collectstatic` copies them to STATIC_ROOT under content-hashed
+# names, with gzip and brotli (when the brotli package is installed) copies.
+# WhiteNoise serves the hashed files with far-future immutable cache headers,
+# so returning visitors only download a file again once it changes. The
+# manifest is strict: a {% static %} reference to a file that wasn't collected
+# raises instead of rendering a broken link. The brand logo (images/logo.jpeg)
+# is not tracked; the deploy puts it in static/ before collectstatic.
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / os.getenv("STATIC_ROOT", "staticfiles")
+STATICFILES_DIRS = [
+    BASE_DIR / 'static',
+]
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
 
 # Cloudinary configuration
 CLOUDINARY_STORAGE = {
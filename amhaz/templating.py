@@ -0,0 +1,224 @@
+"""
+Template compilation and render profiling.
+
+Templates are compiled once per process by the cached loader (TEMPLATES in
+settings). precompile() fills that cache up front, so the first request a
+worker serves doesn't pay for parsing base.html and the page on top of it.
+
+With TEMPLATE_PROFILING=True, TemplateProfileMiddleware times every template
+rendered during a request: the page, the templates it extends, their
+{% block %}s and each {% include %} (once per loop iteration). The
+breakdown is logged and sent in a Server-Timing header. Outside requests:
+
+    with profile_renders() as profile:
+        render(...)
+    profile.rows()
+"""
+import contextlib
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template import Template, TemplateSyntaxError, engines
+from django.template.loader_tags import BLOCK_CONTEXT_KEY, BlockNode
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENTRIES = 5  # templates listed in the Server-Timing header
+
+_profile = ContextVar("template_profile", default=None)
+_originals = {}  # render methods replaced while profiling, restored afterwards
+_installed = 0  # open profile_renders() blocks, across threads
+_install_lock = threading.Lock()
+
+
+def django_engine():
+    return engines["django"].engine
+
+
+def cached_loaders(engine=None):
+    engine = engine or django_engine()
+    return [loader for loader in engine.template_loaders if hasattr(loader, "get_template_cache")]
+
+
+def template_names(engine=None):
+    """
+    Names of every template the engine's loaders can find, sorted. A name
+    found in several directories is listed once, as the loaders would
+    only ever load the first one.
+    """
+    engine = engine or django_engine()
+    names = set()
+    for loader in engine.template_loaders:
+        for sub_loader in getattr(loader, "loaders", [loader]):
+            for directory in sub_loader.get_dirs():
+                for root, dirs, files in os.walk(directory):
+                    dirs[:] = [name for name in dirs if not name.startswith(".")]
+                    for filename in files:
+                        if not filename.startswith("."):
+                            path = os.path.join(root, filename)
+                            names.add(os.path.relpath(path, directory).replace(os.sep, "/"))
+    return sorted(names)
+
+
+def precompile(engine=None):
+    """
+    Compile every template into the cached loader's cache.
+    Returns (compiled names, {name: error} for those that don't compile).
+    """
+    engine = engine or django_engine()
+    compiled, errors = [], {}
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except (TemplateSyntaxError, UnicodeDecodeError) as exc:
+            errors[name] = exc
+        else:
+            compiled.append(name)
+    return compiled, errors
+
+
+def reset_template_cache(engine=None):
+    for loader in cached_loaders(engine):
+        loader.reset()
+
+
+# ----------------------------
+# RENDER PROFILING
+# ----------------------------
+class RenderProfile:
+    """
+    Render time per template (or block): calls, total time (including the
+    templates and blocks rendered inside it) and own time (excluding them).
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self._children = []  # time spent in nested renders, one slot per open render
+
+    def add(self, name, elapsed, nested):
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - nested
+
+    def rows(self):
+        """
+        [(name, calls, total ms, own ms)], most expensive first.
+        """
+        return sorted(
+            ((name, calls, total * 1000, own * 1000) for name, (calls, total, own) in self.stats.items()),
+            key=lambda row: row[3],
+            reverse=True,
+        )
+
+    def total_ms(self):
+        return sum(own for _, _, _, own in self.rows())
+
+
+def _timed(name, render, *args):
+    profile = _profile.get()
+    if profile is None:
+        return render(*args)
+
+    profile._children.append(0.0)
+    start = time.perf_counter()
+    try:
+        return render(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = profile._children.pop()
+        if profile._children:
+            profile._children[-1] += elapsed
+        profile.add(name, elapsed, nested)
+
+
+def _profiled_render(self, context):
+    return _timed(self.origin.template_name or "<string>", _originals["template"], self, context)
+
+
+def _profiled_block_render(self, context):
+    # A child template's blocks render inside its parent (base.html); time
+    # them separately, under the template whose block is actually used
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    block = (block_context and block_context.get_block(self.name)) or self
+    origin = getattr(block, "origin", None)
+    template_name = origin.template_name if origin else "<string>"
+    return _timed(f"{template_name} {{% block {self.name} %}}", _originals["block"], self, context)
+
+
+def install_profiler():
+    """
+    Patch the render methods (process-wide) while any profile_renders() is
+    open; the last one to close puts back whatever was there before.
+    """
+    global _installed
+    with _install_lock:
+        if not _installed:
+            _originals.update(template=Template._render, block=BlockNode.render)
+            # Template._render is what pages, {% extends %} parents and {% include %} all go through
+            Template._render = _profiled_render
+            BlockNode.render = _profiled_block_render
+        _installed += 1
+
+
+def uninstall_profiler():
+    global _installed
+    with _install_lock:
+        _installed -= 1
+        if not _installed:
+            Template._render = _originals["template"]
+            BlockNode.render = _originals["block"]
+
+
+@contextlib.contextmanager
+def profile_renders():
+    install_profiler()
+    profile = RenderProfile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+        uninstall_profiler()
+
+
+def server_timing(profile):
+    entries = [f'templates;dur={profile.total_ms():.1f}']
+    for index, (name, calls, _, own) in enumerate(profile.rows()[:SERVER_TIMING_ENTRIES]):
+        description = name.replace('"', "'")
+        entries.append(f'tpl{index};dur={own:.1f};desc="{description} x{calls}"')
+    return ", ".join(entries)
+
+
+class TemplateProfileMiddleware:
+    """
+    Logs the per-template render times of each request when
+    TEMPLATE_PROFILING is on; removes itself otherwise.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "TEMPLATE_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with profile_renders() as profile:
+            response = self.get_response(request)
+
+        if profile.stats:
+            response["Server-Timing"] = server_timing(profile)
+            logger.info(
+                "%s rendered in %.1fms:\n%s",
+                request.path,
+                profile.total_ms(),
+                "\n".join(
+                    f"  {own:8.2f}ms own {total:8.2f}ms total  x{calls:<4} {name}"
+                    for name, calls, total, own in profile.rows()
+                ),
+            )
+        return response
@@ -1,5 +1,16 @@
 from django.contrib import admin
+
+from amhaz.admin import IndexedSearchMixin
 from .models import UserProfile
 
-admin.site.register(UserProfile)
 
+@admin.register(UserProfile)
+class UserProfileAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("user", "customer_phone", "district")
+    list_filter = ("district",)
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_ids = ("user_id",)
+    search_phones = ("phone_e164",)
+    search_help_text = "User id or phone number"
+    show_full_result_count = False
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_alter_userprofile_customer_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.conf import settings
 from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .phones import normalize_phone
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(
@@ -14,6 +16,7 @@ class UserProfile(models.Model):
         region="LB",
         blank=False
     )
+    phone_e164 = models.CharField(max_length=20, blank=True, db_index=True, editable=False)  # filled on save
     DISTRICT_CHOICES = [
         ("akkar", "Akkar - عكار"),
         ("aley", "Aley - عاليه"),
@@ -47,6 +50,10 @@ class UserProfile(models.Model):
     customer_address = models.TextField(blank=True, default='')
     building_name = models.CharField(max_length=50, blank=True)
 
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.customer_phone)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} profile"
 
@@ -0,0 +1,16 @@
+from phonenumber_field.phonenumber import to_python
+
+DEFAULT_REGION = "LB"
+
+
+def normalize_phone(value, region=DEFAULT_REGION):
+    """
+    E.164 form of a phone number ("+96171123456"), or "" when it can't be
+    parsed. Used for the indexed phone_e164 lookup columns.
+    """
+    if not value:
+        return ""
+    number = to_python(value, region=region)
+    if number is None or not number.is_valid():
+        return ""
+    return number.as_e164
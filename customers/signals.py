@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import UserProfile
+from .utils import profile_cache_key
 
 User = get_user_model()
 
@@ -9,3 +11,7 @@ User = get_user_model()
 def create_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def clear_cached_profile(sender, instance, **kwargs):
+    cache.delete(profile_cache_key(instance.user_id))
@@ -0,0 +1,34 @@
+from django.core.cache import cache
+
+from .models import UserProfile
+
+PROFILE_TIMEOUT = 3600
+
+# Cached for users without a profile, so they don't hit the database either
+NO_PROFILE = "none"
+
+
+def profile_cache_key(user_id):
+    return f"profile:{user_id}"
+
+
+def get_cached_profile(user):
+    """
+    Return the user's UserProfile (or None) from the cache, loading it
+    once per PROFILE_TIMEOUT. UserProfile saves and deletes clear it.
+    """
+    key = profile_cache_key(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        profile = UserProfile.objects.filter(user_id=user.pk).first() or NO_PROFILE
+        cache.set(key, profile, PROFILE_TIMEOUT)
+    return None if profile == NO_PROFILE else profile
+
+
+async def aget_cached_profile(user):
+    key = profile_cache_key(user.pk)
+    profile = await cache.aget(key)
+    if profile is None:
+        profile = await UserProfile.objects.filter(user_id=user.pk).afirst() or NO_PROFILE
+        await cache.aset(key, profile, PROFILE_TIMEOUT)
+    return None if profile == NO_PROFILE else profile
@@ -0,0 +1,47 @@
+"""
+Optional gunicorn settings: `gunicorn amhaz.wsgi` picks this file up
+from the project root.
+
+With the default per-process (locmem) cache every worker starts cold, so
+each one primes its own cache before taking requests. With a shared cache
+(CACHE_BACKEND=redis/file) running `manage.py warm_caches` once per deploy
+is enough; set WARM_CACHES_ON_BOOT=False to skip the per-worker warm-up.
+A worker spends at most WARM_CACHES_BUDGET seconds warming before it takes
+requests (a query still running then finishes in the background), and
+starts cold if warming fails, e.g. with the database down.
+
+Compiled templates always live in the worker's memory, so each worker
+compiles them all before its first request (PRECOMPILE_TEMPLATES_ON_BOOT).
+"""
+import os
+
+PRECOMPILE_TEMPLATES_ON_BOOT = os.getenv("PRECOMPILE_TEMPLATES_ON_BOOT", "True") == "True"
+WARM_CACHES_ON_BOOT = os.getenv("WARM_CACHES_ON_BOOT", "True") == "True"
+WARM_CACHES_BUDGET = float(os.getenv("WARM_CACHES_BUDGET", 10))
+
+
+def post_worker_init(worker):
+    # Runs in each worker once the Django app is loaded (post_fork would be too early)
+    if PRECOMPILE_TEMPLATES_ON_BOOT:
+        from amhaz.templating import precompile
+
+        compiled, errors = precompile()
+        for name, error in errors.items():
+            worker.log.error("Template %s doesn't compile: %s", name, error)
+        worker.log.info("Compiled %d templates", len(compiled))
+
+    if not WARM_CACHES_ON_BOOT:
+        return
+    from products.warmup import warm, warm_tasks
+
+    # A worker that can't warm up (database down at boot, ...) starts cold;
+    # raising here would make gunicorn respawn it in a loop
+    try:
+        warmed, failed, skipped, seconds = warm(warm_tasks(), budget=WARM_CACHES_BUDGET)
+    except Exception:
+        worker.log.exception("Cache warm-up failed, starting with a cold cache")
+        return
+    worker.log.info(
+        "Warmed %d cache entries in %.1fs (%d failed, %d skipped)",
+        len(warmed), seconds, len(failed), len(skipped),
+    )
@@ -1,7 +1,68 @@
 from django.contrib import admin
-from .models import CartItem, Order, Cart
 
-admin.site.register(CartItem)
-admin.site.register(Order)
-admin.site.register(Cart)
+from amhaz.admin import IndexedSearchMixin
+from .models import CartItem, Order, Cart, OrderItem, OrderStatusEvent
 
+# Product and user foreign keys use raw id / autocomplete widgets so forms
+# don't render the whole table into a <select>.
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    raw_id_fields = ("product",)
+    extra = 0
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "session_key", "is_active", "updated_at")
+    list_filter = ("is_active",)
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    inlines = (CartItemInline,)
+    show_full_result_count = False
+
+
+@admin.register(CartItem)
+class CartItemAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("product", "quantity", "cart")
+    list_select_related = ("product", "cart__user")
+    raw_id_fields = ("cart", "product")
+    search_ids = ("cart_id", "product_id")
+    search_help_text = "Cart or product id"
+    show_full_result_count = False
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ("product",)
+    extra = 0
+
+
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    fields = ("created_at", "from_status", "to_status", "user", "note")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("user")
+
+
+@admin.register(Order)
+class OrderAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("id", "customer_name", "customer_phone", "district", "status", "item_count", "subtotal", "created_at")
+    list_filter = ("status", "order_type")
+    raw_id_fields = ("user",)
+    date_hierarchy = "created_at"
+    search_ids = ("id",)
+    search_phones = ("phone_e164",)
+    search_help_text = "Order number or phone number"
+    readonly_fields = ("subtotal", "item_count")
+    inlines = (OrderItemInline, OrderStatusEventInline)
+    ordering = ("-id",)
+    show_full_result_count = False
@@ -0,0 +1,41 @@
+from django.db.models import Exists, OuterRef
+
+from amhaz.archive import archive_in_batches
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedOrderStatusEvent,
+    Order, OrderItem, OrderStatusEvent,
+)
+
+# Orders that can't change any more once they are old enough
+ARCHIVABLE_STATUSES = ["delivered", "returned", "partially_returned"]
+
+
+def archive_orders(cutoff, batch_size=1000):
+    """
+    Move closed orders created before `cutoff`, whose last status change is
+    also before it, to the archive tables with their items and status
+    events. Run archive_movements() with the same cutoff first: their stock
+    movements then already live in the archive and keep their order id.
+    """
+    recent_change = OrderStatusEvent.objects.filter(order=OuterRef("pk"), created_at__gte=cutoff)
+    orders = Order.objects.filter(
+        created_at__lt=cutoff, status__in=ARCHIVABLE_STATUSES
+    ).exclude(Exists(recent_change))
+    return archive_in_batches(
+        orders,
+        ArchivedOrder,
+        batch_size=batch_size,
+        related=[
+            (OrderItem, "order", ArchivedOrderItem),
+            (OrderStatusEvent, "order", ArchivedOrderStatusEvent),
+        ],
+    )
+
+
+def archived_orders(**filters):
+    """
+    Archived orders matching `filters`, or None when the range doesn't
+    reach into the archive (one indexed EXISTS).
+    """
+    orders = ArchivedOrder.objects.filter(**filters)
+    return orders if orders.exists() else None
@@ -0,0 +1,196 @@
+"""
+Async versions of the cart and checkout views, used instead of the ones in
+views.py when ASYNC_CHECKOUT is enabled (see amhaz/asgi.py).
+
+Only the stock/order transaction runs in a thread (sync_to_async); cart
+reads and writes use the async ORM and emails are sent after commit
+without holding a worker thread.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.http import JsonResponse
+from django.shortcuts import render, aget_object_or_404, redirect
+from django.views.decorators.http import require_POST
+
+from amhaz.ratelimit import ratelimit
+from customers.utils import aget_cached_profile
+from products.models import Product
+from .emails import asend_order_emails
+from .forms import CheckoutForm
+from .models import CartItem
+from .reservations import OutOfStock, aheld_quantity, release_expired, reserve_cart
+from .utils import (
+    aget_cart, aget_or_create_cart, aplaced_order, new_checkout_token, place_order,
+    posted_checkout_token, redirect_to_placed,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@ratelimit("cart", rate="60/m")
+async def cart_add(request, product_id):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    product = await aget_object_or_404(Product, id=product_id)
+
+    # Expired checkout holds count as reserved until they're released
+    if product.reserved_quantity and await sync_to_async(release_expired)(product_ids=[product.id]):
+        await product.arefresh_from_db(fields=["cached_quantity", "reserved_quantity"])
+
+    # What this cart holds is reserved for it, not for someone else
+    cart = await aget_cart(request)
+    max_stock = product.available_quantity + await aheld_quantity(cart, product)
+
+    if max_stock <= 0:
+        return JsonResponse({"error": "Out of stock"}, status=400)
+
+    cart = cart or await aget_or_create_cart(request)
+
+    item, created = await CartItem.objects.aget_or_create(
+        cart=cart,
+        product=product,
+        defaults={"quantity": 1}
+    )
+
+    if not created and item.quantity < max_stock:
+        item.quantity += 1
+        await item.asave(update_fields=["quantity"])
+
+    totals = await cart.items.aaggregate(total=Sum("quantity"))
+
+    return JsonResponse({
+        "success": True,
+        "cart_count": totals["total"] or 0
+    })
+
+
+@require_POST
+@ratelimit("cart", rate="60/m")
+async def cart_update_quantity(request):
+    item_id = request.POST.get("item_id")
+    action = request.POST.get("action")
+
+    item = await aget_object_or_404(
+        CartItem.objects.select_related("product", "cart"),
+        id=item_id,
+    )
+
+    max_stock = item.product.available_quantity + await aheld_quantity(item.cart, item.product)
+
+    if action == "increase":
+        # ❌ Do not exceed available stock
+        if item.quantity < max_stock:
+            item.quantity += 1
+        else:
+            return JsonResponse({
+                "blocked": "max",
+                "quantity": item.quantity,
+                "max_stock": max_stock,
+                "cart_total": await item.cart.atotal_price(),
+            })
+
+    elif action == "decrease":
+        item.quantity -= 1
+
+        # ✅ Quantity = 0 → remove item
+        if item.quantity <= 0:
+            await item.adelete()
+            return JsonResponse({
+                "removed": True,
+                "cart_total": await item.cart.atotal_price(),
+            })
+
+    await item.asave(update_fields=["quantity"])
+
+    return JsonResponse({
+        "blocked": False,
+        "quantity": item.quantity,
+        "max_stock": max_stock,
+        "cart_total": await item.cart.atotal_price(),
+    })
+
+
+async def checkout(request):
+    token = posted_checkout_token(request) if request.method == "POST" else None
+
+    # A retried submit: the first one placed the order and emptied the cart
+    placed = await aplaced_order(token)
+    if placed:
+        return redirect_to_placed(placed)
+
+    cart = await aget_cart(request)
+    items = cart.items.select_related("product") if cart else None
+
+    if items is None or not await items.aexists():
+        messages.error(request, "Your cart is empty.")
+        return redirect("cart_view")
+
+    user = await request.auser()
+
+    if request.method == "POST":
+        form = CheckoutForm(request.POST)
+        if await sync_to_async(form.is_valid)():
+            order = form.save(commit=False)
+            order.user = user if user.is_authenticated else None
+            order.status = "confirmed"
+            order.checkout_token = token
+
+            return await finalize_order(request, order, cart)
+
+    else:
+        # Hold the cart's stock while the customer fills in the form
+        try:
+            await sync_to_async(reserve_cart)(cart)
+        except OutOfStock as exc:
+            messages.error(request, str(exc))
+            return redirect("cart_view")
+
+        form = CheckoutForm()
+
+        if user.is_authenticated:
+            form.prefill(user, await aget_cached_profile(user))
+
+    # Context processors query the database, so render in a thread
+    return await sync_to_async(render)(request, "order/checkout.html", {
+        "form": form,
+        "cart": cart,
+        "items": items,
+        "checkout_token": token or new_checkout_token(),
+    })
+
+
+async def finalize_order(request, order, cart):
+    try:
+        items = await sync_to_async(place_order)(order, cart)
+    except OutOfStock as exc:
+        messages.error(request, str(exc))
+        return redirect("cart_view")
+    except IntegrityError:
+        # Same checkout_token submitted twice at once; the other request
+        # placed the order
+        placed = await aplaced_order(order.checkout_token)
+        if placed:
+            return redirect_to_placed(placed)
+        raise
+
+    # place_order has committed by now, so this is the async side of
+    # send_order_emails_on_commit: a mail failure is logged and the order
+    # stays placed, as in the sync view.
+    try:
+        await asend_order_emails(order, items)
+    except Exception:
+        logger.exception("Could not send emails for order #%s", order.id)
+
+    # The cart is now inactive; a new one is created on the next cart_add
+
+    messages.success(
+        request,
+        "Order placed successfully! A confirmation email has been sent."
+    )
+
+    return redirect_to_placed(order)
@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from customers.models import UserProfile
+from customers.phones import normalize_phone
+from .models import ArchivedOrder, CustomerStats, Order
+
+User = get_user_model()
+
+RETURNED_STATUSES = ["returned", "partially_returned"]
+
+
+def link_guest_orders():
+    """
+    Attach guest orders to the activated account with the same email, in
+    one set-based UPDATE. Activation proves the account owns the mailbox;
+    profile phone numbers are never verified, so they are only used for
+    CustomerStats and never to hand orders to an account. When several
+    active accounts share an email the oldest one wins.
+    Returns the number of orders linked.
+    """
+    users = (
+        User.objects.filter(is_active=True, email__iexact=OuterRef("customer_email"))
+        .order_by("id")
+    )
+    return (
+        Order.objects.filter(user=None).exclude(customer_email="")
+        .filter(Exists(users))
+        .update(user_id=Subquery(users.values("id")[:1]))
+    )
+
+
+def _order_counts(orders):
+    return (
+        orders.exclude(phone_e164="")
+        .values("phone_e164")
+        .annotate(
+            order_count=Count("id"),
+            delivered_count=Count("id", filter=Q(status="delivered")),
+            returned_count=Count("id", filter=Q(status__in=RETURNED_STATUSES)),
+            last_order_at=Max("created_at"),
+            user_id=Max("user_id"),
+        )
+        .order_by()
+    )
+
+
+@transaction.atomic
+def rebuild_customer_stats():
+    """
+    Recompute lifetime order counts per phone number over live and
+    archived orders with two GROUP BY queries. Returns the number of rows.
+    """
+    totals = defaultdict(lambda: dict(order_count=0, delivered_count=0, returned_count=0, last_order_at=None, user_id=None))
+    for orders in (Order.objects.all(), ArchivedOrder.objects.all()):
+        for row in _order_counts(orders):
+            total = totals[row["phone_e164"]]
+            for field in ("order_count", "delivered_count", "returned_count"):
+                total[field] += row[field]
+            if total["last_order_at"] is None or row["last_order_at"] > total["last_order_at"]:
+                total["last_order_at"] = row["last_order_at"]
+            total["user_id"] = total["user_id"] or row["user_id"]
+
+    now = timezone.now()
+    CustomerStats.objects.all().delete()
+    CustomerStats.objects.bulk_create(
+        [CustomerStats(phone_e164=phone, computed_at=now, **total) for phone, total in totals.items()],
+        batch_size=1000,
+    )
+    return len(totals)
+
+
+def customer_lookup(query):
+    """
+    Orders (live and archived) and profiles for a phone number or an email.
+    Each table is searched with one query on an indexed column.
+    Returns a template context.
+    """
+    query = query.strip()
+    if "@" in query:
+        # Orders store customer_email lowercased
+        email = query.lower()
+        orders = Order.objects.filter(customer_email=email)
+        archived = ArchivedOrder.objects.filter(customer_email=email)
+        profiles = UserProfile.objects.filter(user__email__iexact=query)
+        phones = set(orders.exclude(phone_e164="").values_list("phone_e164", flat=True)[:20])
+    else:
+        query = normalize_phone(query)
+        if not query:
+            return {"query": "", "profiles": [], "orders": [], "archived_orders": [], "stats": []}
+        orders = Order.objects.filter(phone_e164=query)
+        archived = ArchivedOrder.objects.filter(phone_e164=query)
+        profiles = UserProfile.objects.filter(phone_e164=query)
+        phones = {query}
+
+    return {
+        "query": query,
+        "profiles": profiles.select_related("user"),
+        "orders": orders.prefetch_related("items__product").order_by("-created_at"),
+        "archived_orders": archived.order_by("-created_at"),
+        "stats": CustomerStats.objects.filter(phone_e164__in=phones),
+    }
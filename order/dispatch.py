@@ -0,0 +1,62 @@
+from django.db.models import Count, F, Sum
+
+from .models import Order, OrderItem
+
+DISTRICT_LABELS = dict(Order.DISTRICT_CHOICES)
+
+
+def dispatch_plan(start, end):
+    """
+    Group confirmed cash-on-delivery orders created in [start, end) by
+    district. Each district gets its orders, a pick list of products
+    summed across those orders and the cash the courier has to collect.
+    Three GROUP BY / range queries on the (status, district, created_at)
+    index, whatever the number of orders.
+
+    Only "confirmed" orders are planned: that is the one status where the
+    order has taken stock but hasn't left with a courier yet. Pending
+    orders aren't confirmed with the customer, and dispatched, delivered
+    or (partially) returned ones are already out or back, so sheets
+    printed twice in a day never send an order out again.
+    """
+    window = dict(status="confirmed", order_type="delivery", created_at__gte=start, created_at__lt=end)
+
+    districts = {
+        row["district"]: {
+            "district": row["district"],
+            "label": DISTRICT_LABELS.get(row["district"], row["district"] or "No district"),
+            "order_count": row["order_count"],
+            "item_count": row["item_count"] or 0,
+            "cash_to_collect": row["cash_to_collect"] or 0,
+            "orders": [],
+            "pick_list": [],
+        }
+        for row in Order.objects.filter(**window)
+        .values("district")
+        .annotate(
+            order_count=Count("id"),
+            item_count=Sum("item_count"),
+            cash_to_collect=Sum("subtotal"),
+        )
+        .order_by("district")
+    }
+
+    for row in (
+        OrderItem.objects.filter(**{f"order__{key}": value for key, value in window.items()})
+        .values("order__district", "product_id", "product__name")
+        .annotate(quantity=Sum(F("quantity") - F("returned_quantity")))
+        .order_by("order__district", "product__name")
+    ):
+        districts[row["order__district"]]["pick_list"].append(row)
+
+    for row in (
+        Order.objects.filter(**window)
+        .values(
+            "id", "district", "customer_name", "customer_phone",
+            "customer_address", "building_name", "subtotal", "item_count",
+        )
+        .order_by("district", "id")
+    ):
+        districts[row["district"]]["orders"].append(row)
+
+    return list(districts.values())
@@ -0,0 +1,124 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+try:
+    import aiosmtplib
+except ImportError:  # optional, only used by the async checkout
+    aiosmtplib = None
+
+SMTP_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+logger = logging.getLogger(__name__)
+
+
+def build_order_emails(order, items):
+    """
+    Build the customer confirmation and the admin notification for an order.
+    `items` are the cart items (with product) the order was placed from.
+    """
+    # ----------------------------
+    # PLAIN TEXT (ADMIN FALLBACK)
+    # ----------------------------
+    message_lines = [
+        f"New Order #{order.id}",
+        f"Type: {order.get_order_type_display()}",
+        "",
+        "Items:",
+    ]
+    message_lines.extend(
+        f"- {item.product.name} x{item.quantity}" for item in items
+    )
+    message_lines.extend([
+        "",
+        f"Customer: {order.customer_name}",
+        f"Phone: {order.customer_phone}",
+        f"Email: {order.customer_email}",
+        f"District: {order.get_district_display()}",
+        f"Address: {order.customer_address}",
+        f"Building: {order.building_name}",
+    ])
+
+    context = {
+        "order": order,
+        "items": items,
+        "total_price": order.subtotal,
+    }
+
+    # ----------------------------
+    # CUSTOMER EMAIL (HTML)
+    # ----------------------------
+    customer_html = render_to_string("email/order_confirmation.html", context)
+    customer_email = EmailMultiAlternatives(
+        subject=f"Your Order #{order.id} Has Been Received",
+        body=strip_tags(customer_html),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.customer_email],
+    )
+    customer_email.attach_alternative(customer_html, "text/html")
+
+    # ----------------------------
+    # ADMIN EMAIL (HTML)
+    # ----------------------------
+    admin_html = render_to_string("email/order_admin.html", context)
+    admin_email = EmailMultiAlternatives(
+        subject=f"🚨 New Order #{order.id}",
+        body="\n".join(message_lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[settings.DEFAULT_FROM_EMAIL],
+    )
+    admin_email.attach_alternative(admin_html, "text/html")
+
+    return [customer_email, admin_email]
+
+
+def send_order_emails(order, items):
+    get_connection(fail_silently=False).send_messages(build_order_emails(order, items))
+
+
+def send_order_emails_on_commit(order, items):
+    """
+    Send the order emails once the transaction placing `order` commits.
+    The order is placed either way: a mail failure is logged, it doesn't
+    roll the order back or turn it into an error page.
+    """
+    def send():
+        try:
+            send_order_emails(order, items)
+        except Exception:
+            logger.exception("Could not send emails for order #%s", order.id)
+
+    transaction.on_commit(send)
+
+
+async def asend_order_emails(order, items):
+    """
+    Send the order emails without blocking the event loop: over aiosmtplib
+    when the SMTP backend is configured and aiosmtplib is installed,
+    otherwise through the configured backend in a worker thread.
+    """
+    emails = build_order_emails(order, items)
+
+    if aiosmtplib is None or settings.EMAIL_BACKEND != SMTP_BACKEND:
+        connection = get_connection(fail_silently=False)
+        await sync_to_async(connection.send_messages, thread_sensitive=False)(emails)
+        return
+
+    async with aiosmtplib.SMTP(
+        hostname=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        start_tls=settings.EMAIL_USE_TLS,
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+    ) as smtp:
+        for email in emails:
+            await smtp.send_message(
+                email.message(),
+                sender=email.from_email,
+                recipients=email.recipients(),
+            )
@@ -0,0 +1,168 @@
+import csv
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from products.archive import archived_movements
+from products.models import StockMovement
+from .archive import archived_orders
+from .models import CENTS, ArchivedOrderItem, OrderItem
+
+CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = [
+    "order_id",
+    "created_at",
+    "status",
+    "order_type",
+    "customer_name",
+    "customer_email",
+    "customer_phone",
+    "district",
+    "product_id",
+    "product_name",
+    "quantity",
+    "returned_quantity",
+    "unit_price",
+    "line_total",
+    "order_total",
+]
+LINE_TOTAL = ORDER_COLUMNS.index("line_total")
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+MOVEMENT_COLUMNS = [
+    "movement_id",
+    "created_at",
+    "product_id",
+    "product_name",
+    "change",
+    "kind",
+    "order_id",
+    "user_id",
+    "reason",
+]
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for streaming csv."""
+
+    def write(self, value):
+        return value
+
+
+def csv_safe(value):
+    """
+    Quote text that a spreadsheet would run as a formula (customer names,
+    emails, movement reasons...) by prefixing it with an apostrophe.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def day_start(value, days=0):
+    """
+    Aware midnight of a YYYY-MM-DD date (plus `days`), in the current timezone.
+    """
+    day = datetime.strptime(value, "%Y-%m-%d").date() + timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def date_range(from_date, to_date):
+    """
+    Turn two inclusive YYYY-MM-DD dates into an aware half-open
+    [start, end) datetime range so `created_at` indexes can be used.
+    """
+    return day_start(from_date), day_start(to_date, days=1)
+
+
+def order_rows(start, end):
+    """
+    One row per order line, with the order's stored subtotal. line_total
+    is net of returned units, like the subtotal. Archived
+    orders come first when the range reaches into the archive.
+    """
+    rows = _order_item_rows(OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end))
+    if archived_orders(created_at__gte=start, created_at__lt=end) is None:
+        return rows
+    archived = ArchivedOrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+    return chain(_order_item_rows(archived), rows)
+
+
+def _order_item_rows(items):
+    rows = (
+        items
+        .annotate(line_total=ExpressionWrapper(
+            F("price") * (F("quantity") - F("returned_quantity")), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+        .order_by("order_id", "id")
+        .values_list(
+            "order_id",
+            "order__created_at",
+            "order__status",
+            "order__order_type",
+            "order__customer_name",
+            "order__customer_email",
+            "order__customer_phone",
+            "order__district",
+            "product_id",
+            "product__name",
+            "quantity",
+            "returned_quantity",
+            "price",
+            "line_total",
+            "order__subtotal",
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    # SQLite doesn't scale computed decimals to the output field (11.9800000000000)
+    return (
+        row[:LINE_TOTAL] + (row[LINE_TOTAL].quantize(CENTS),) + row[LINE_TOTAL + 1:]
+        for row in rows
+    )
+
+
+def movement_rows(start, end):
+    rows = _movement_rows(StockMovement.objects.filter(created_at__gte=start, created_at__lt=end))
+    archived = archived_movements(created_at__gte=start, created_at__lt=end)
+    return rows if archived is None else chain(_movement_rows(archived), rows)
+
+
+def _movement_rows(movements):
+    return (
+        movements
+        .order_by("id")
+        .values_list(
+            "id",
+            "created_at",
+            "product_id",
+            "product__name",
+            "change",
+            "kind",
+            "order_id",
+            "user_id",
+            "reason",
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+EXPORTS = {
+    "orders": (ORDER_COLUMNS, order_rows),
+    "movements": (MOVEMENT_COLUMNS, movement_rows),
+}
+
+
+def stream_csv(kind, start, end):
+    """
+    Yield CSV lines one at a time, for StreamingHttpResponse or a file.
+    """
+    columns, rows = EXPORTS[kind]
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows(start, end):
+        yield writer.writerow([csv_safe(value) for value in row])
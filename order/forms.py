@@ -21,4 +21,21 @@ class CheckoutForm(forms.ModelForm):
             "customer_address": "Delivery Address",
             "building_name": "Building Name",
             "order_type": "Payment Method",
-        }
\ No newline at end of file
+        }
+
+    def prefill(self, user, profile):
+        """
+        Pre-fill the form for a logged-in customer from their account and profile.
+        """
+        self.fields["customer_name"].widget.attrs["value"] = (
+            user.get_full_name() or user.username
+        )
+        self.fields["customer_email"].widget.attrs["value"] = user.email
+        self.fields["customer_phone"].widget.attrs["value"] = (
+            profile.customer_phone if profile else ""
+        )
+
+        self.initial["district"] = profile.district if profile else ""
+        self.initial["customer_address"] = profile.customer_address if profile else ""
+        self.initial["building_name"] = profile.building_name if profile else ""
+        self.fields["order_type"].widget.attrs["value"] = "delivery"
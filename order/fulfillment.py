@@ -0,0 +1,129 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from products.listings import invalidate_listings
+from products.models import Product, StockMovement
+from .models import Order, OrderItem, OrderStatusEvent
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def allowed_sources(to_status):
+    return [
+        status for status, targets in Order.STATUS_TRANSITIONS.items()
+        if to_status in targets
+    ]
+
+
+def _restock(returns, reason, user=None):
+    """
+    Put returned quantities back into stock in one UPDATE and log them as
+    "return" movements. `returns` is a list of (order_id, product_id, quantity).
+    """
+    per_product = Counter()
+    for _, product_id, quantity in returns:
+        per_product[product_id] += quantity
+    if not per_product:
+        return
+
+    Product.objects.filter(id__in=per_product).update(
+        cached_quantity=F("cached_quantity") + Case(
+            *[When(id=product_id, then=Value(quantity)) for product_id, quantity in per_product.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=product_id, change=quantity, kind="return",
+            order_id=order_id, user=user, reason=reason.format(order_id=order_id),
+        )
+        for order_id, product_id, quantity in returns
+    ])
+    # bulk_create and update() skip the model signals
+    invalidate_listings(per_product)
+
+
+@transaction.atomic
+def bulk_transition(order_ids, to_status, user=None, note=""):
+    """
+    Move many orders to `to_status` with set-based updates. Orders whose
+    current status doesn't allow the change are left alone. Moving to
+    "returned" puts every not-yet-returned item back into stock, except
+    for pending orders, which never took any.
+    Returns the ids of the orders that changed.
+    """
+    if to_status not in Order.STATUS_TRANSITIONS:
+        raise InvalidTransition(f"Unknown status: {to_status}")
+    if to_status == "partially_returned":
+        raise InvalidTransition("Partial returns are made per item with return_items()")
+
+    orders = dict(
+        Order.objects.select_for_update()
+        .filter(id__in=order_ids, status__in=allowed_sources(to_status))
+        .values_list("id", "status")
+    )
+    if not orders:
+        return []
+
+    if to_status == "returned":
+        # Pending orders never took stock, so there is nothing to put back
+        stocked = [order_id for order_id, status in orders.items() if status in Order.RETURNABLE_STATUSES]
+        returns = list(
+            OrderItem.objects.filter(order_id__in=stocked, quantity__gt=F("returned_quantity"))
+            .annotate(remaining=F("quantity") - F("returned_quantity"))
+            .values_list("order_id", "product_id", "remaining")
+        )
+        _restock(returns, "Order #{order_id} returned", user)
+        OrderItem.objects.filter(order_id__in=orders).update(returned_quantity=F("quantity"))
+        Order.objects.filter(id__in=orders).update(status=to_status, subtotal=0, item_count=0)
+    else:
+        Order.objects.filter(id__in=orders).update(status=to_status)
+
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(order_id=order_id, from_status=from_status, to_status=to_status, user=user, note=note)
+        for order_id, from_status in orders.items()
+    ])
+    return list(orders)
+
+
+@transaction.atomic
+def return_items(order, quantities, user=None, note=""):
+    """
+    Return part of an order. `quantities` maps OrderItem ids to how many
+    units came back; requests above what is still out are capped.
+    The order ends up "returned" when nothing is left out, otherwise
+    "partially_returned". Returns the number of units put back in stock.
+    """
+    order = Order.objects.select_for_update().get(id=order.id)
+    if order.status not in Order.RETURNABLE_STATUSES:
+        raise InvalidTransition(f"Order #{order.id} is {order.get_status_display()}")
+
+    items = list(order.items.filter(id__in=quantities))
+    returns = []
+    for item in items:
+        quantity = min(max(int(quantities[item.id]), 0), item.quantity - item.returned_quantity)
+        if quantity:
+            item.returned_quantity += quantity
+            returns.append((order.id, item.product_id, quantity))
+
+    if not returns:
+        return 0
+
+    OrderItem.objects.bulk_update(items, ["returned_quantity"])
+    _restock(returns, "Order #{order_id} partially returned", user)
+
+    from_status = order.status
+    fully_returned = not order.items.filter(quantity__gt=F("returned_quantity")).exists()
+    order.status = "returned" if fully_returned else "partially_returned"
+    order.update_totals()
+    order.save(update_fields=["status", "subtotal", "item_count"])
+
+    OrderStatusEvent.objects.create(
+        order=order, from_status=from_status, to_status=order.status, user=user, note=note
+    )
+    return sum(quantity for _, _, quantity in returns)
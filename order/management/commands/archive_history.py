@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from order.archive import archive_orders
+from products.archive import archive_movements
+
+
+class Command(BaseCommand):
+    help = "Move stock movements and closed orders older than N months to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=12, help="Keep this many months in the live tables")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["months"] < 1:
+            raise CommandError("--months must be at least 1")
+        cutoff = timezone.now() - timedelta(days=30 * options["months"])
+
+        # movements first, so archived orders never leave live movements behind
+        movements = archive_movements(cutoff, batch_size=options["batch_size"])
+        orders = archive_orders(cutoff, batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {movements} stock movements and {orders} orders created before {cutoff:%Y-%m-%d}"
+        ))
@@ -0,0 +1,97 @@
+import time
+from decimal import Decimal
+from itertools import cycle
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+from order.models import CENTS, Order, OrderItem
+from products.models import Category, Product, SubCategory
+
+# Prices that don't add up exactly as floats (0.10 + 0.20 != 0.30)
+PRICES = [Decimal(price) for price in ["0.10", "0.20", "19.99", "4.35", "129.95", "0.05", "1.15"]]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the SQL money aggregates (order subtotals, revenue per order and per day) "
+        "on a large synthetic order table and check they match exact Decimal sums. "
+        "Everything is written inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100_000)
+        parser.add_argument("--items", type=int, default=3, help="Items per order.")
+        parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs per query.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            first_id, items, expected = self.seed(options["orders"], options["items"])
+            self.stdout.write(f"{options['orders']} orders, {items} order items")
+            # Only the seeded orders, whatever else the database holds
+            orders = Order.objects.filter(id__gte=first_id)
+            order_items = OrderItem.objects.filter(order_id__gte=first_id)
+
+            checks = [
+                ("revenue", options["orders"], lambda: orders.aggregate(total=Sum("subtotal"))["total"]),
+                ("revenue per order", items, lambda: sum(
+                    row["total"] for row in order_items.values("order_id")
+                    .annotate(total=Sum(F("price") * F("quantity"))).order_by()
+                )),
+                ("revenue per day", options["orders"], lambda: sum(
+                    row["total"] for row in orders
+                    .values(day=TruncDate("created_at")).annotate(total=Sum("subtotal")).order_by()
+                )),
+            ]
+            exact = True
+            for name, rows, query in checks:
+                elapsed, total = self.best_of(options["repeat"], query)
+                matches = total.quantize(CENTS) == expected
+                exact = exact and matches
+                self.stdout.write(
+                    f"{name:<18} {elapsed * 1000:9.1f}ms  {rows / elapsed:12,.0f} rows/s  "
+                    f"{total.quantize(CENTS)} {'exact' if matches else f'!= {expected}'}"
+                )
+            transaction.set_rollback(True)
+
+        style = self.style.SUCCESS if exact else self.style.ERROR
+        self.stdout.write(style("All totals exact" if exact else "Totals drifted"))
+
+    def seed(self, order_count, items_per_order):
+        category = Category.objects.create(name="Benchmark")
+        subcategory = SubCategory.objects.create(name="Benchmark", category=category)
+        products = Product.objects.bulk_create(
+            Product(name=f"Benchmark {price}", price=price, category=subcategory) for price in PRICES
+        )
+
+        lines = cycle(products)
+        orders, lines_per_order, expected = [], [], Decimal(0)
+        for _ in range(order_count):
+            order_lines = [(next(lines), quantity) for quantity in range(1, items_per_order + 1)]
+            subtotal = sum(product.price * quantity for product, quantity in order_lines)
+            orders.append(Order(
+                customer_name="Benchmark", customer_email="benchmark@example.com",
+                customer_phone="+96171000000", status="delivered",
+                subtotal=subtotal, item_count=items_per_order,
+            ))
+            lines_per_order.append(order_lines)
+            expected += subtotal
+
+        Order.objects.bulk_create(orders, batch_size=5000)
+        items = [
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for order, order_lines in zip(orders, lines_per_order)
+            for product, quantity in order_lines
+        ]
+        OrderItem.objects.bulk_create(items, batch_size=5000)
+        return orders[0].id, len(items), expected
+
+    def best_of(self, repeat, query):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            total = query()
+            timings.append(time.perf_counter() - start)
+        return min(timings), total
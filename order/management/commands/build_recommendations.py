@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from order.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Update \"frequently bought together\" pair counts with the orders placed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Orders mined per transaction")
+        parser.add_argument(
+            "--settle-minutes", type=int, default=10,
+            help="Leave orders newer than this for the next run, in case older ones are still committing",
+        )
+
+    def handle(self, *args, **options):
+        mined = build_recommendations(
+            batch_size=options["batch_size"],
+            settle_minutes=options["settle_minutes"],
+            stdout=self.stdout if options["verbosity"] >= 2 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Mined {mined} new orders"))
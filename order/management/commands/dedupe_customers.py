@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from order.customers import link_guest_orders, rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Link guest orders to activated accounts with the same email and rebuild per-customer order counts. Run it nightly."
+
+    def handle(self, *args, **options):
+        linked = link_guest_orders()
+        customers = rebuild_customer_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {linked} guest orders to activated accounts by email; "
+            f"counted orders for {customers} customers"
+        ))
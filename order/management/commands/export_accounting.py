@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from order.exports import EXPORTS, date_range, stream_csv
+
+
+class Command(BaseCommand):
+    help = "Export orders (one line per item) or stock movements for a date range as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--from", dest="from_date", help="YYYY-MM-DD, inclusive (defaults to today)")
+        parser.add_argument("--to", dest="to_date", help="YYYY-MM-DD, inclusive (defaults to today)")
+        parser.add_argument("--output", "-o", help="File to write (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate().strftime("%Y-%m-%d")
+        try:
+            start, end = date_range(
+                options["from_date"] or today,
+                options["to_date"] or today,
+            )
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        lines = stream_csv(options["kind"], start, end)
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as fh:
+                fh.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
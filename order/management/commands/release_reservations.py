@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Release expired checkout stock holds. Run it every minute or so from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+from django.db import migrations
+from django.db.models import F, Sum
+
+BATCH_SIZE = 1000
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model("order", "Order")
+    OrderItem = apps.get_model("order", "OrderItem")
+
+    last_id = 0
+    while True:
+        ids = list(
+            Order.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        totals = {
+            row["order_id"]: row
+            for row in OrderItem.objects.filter(order_id__in=ids)
+            .values("order_id")
+            .annotate(subtotal=Sum(F("price") * F("quantity")), item_count=Sum("quantity"))
+        }
+
+        orders = []
+        for order_id in ids:
+            row = totals.get(order_id, {})
+            orders.append(Order(
+                id=order_id,
+                subtotal=row.get("subtotal") or 0,
+                item_count=row.get("item_count") or 0,
+            ))
+        Order.objects.bulk_update(orders, ["subtotal", "item_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0015_order_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0016_backfill_order_totals'),
+        ('products', '0010_decimal_prices'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
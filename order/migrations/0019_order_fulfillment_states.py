@@ -0,0 +1,66 @@
+# Generated by Django 6.0 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+BATCH_SIZE = 1000
+
+
+def mark_returned_items(apps, schema_editor):
+    """
+    Orders returned before items tracked returns: every item came back.
+    """
+    Order = apps.get_model("order", "Order")
+    OrderItem = apps.get_model("order", "OrderItem")
+
+    last_id = 0
+    while True:
+        ids = list(
+            Order.objects.filter(status="returned", id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        OrderItem.objects.filter(order_id__in=ids).update(returned_quantity=F("quantity"))
+        Order.objects.filter(id__in=ids).update(subtotal=0, item_count=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0018_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='returned_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('dispatched', 'Dispatched'), ('delivered', 'Delivered'), ('returned', 'Returned'), ('partially_returned', 'Partially Returned')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('dispatched', 'Dispatched'), ('delivered', 'Delivered'), ('returned', 'Returned'), ('partially_returned', 'Partially Returned')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='order.order')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order', 'created_at'], name='order_order_order_i_c359f8_idx')],
+            },
+        ),
+        migrations.RunPython(mark_returned_items, migrations.RunPython.noop),
+    ]
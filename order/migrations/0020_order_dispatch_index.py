@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0019_order_fulfillment_states'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'district', 'created_at'], name='order_order_status_a03b22_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0020_order_dispatch_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='order_order_user_id_55dcc8_idx'),
+        ),
+    ]
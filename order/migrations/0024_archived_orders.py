@@ -0,0 +1,68 @@
+# Generated by Django 6.0 on 2026-10-19 13:45
+
+import django.db.models.deletion
+import phonenumber_field.modelfields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0023_productpair_recommendationrun'),
+        ('products', '0016_archivedstockmovement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('customer_name', models.CharField(max_length=120)),
+                ('customer_email', models.EmailField(max_length=254)),
+                ('customer_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region='LB')),
+                ('district', models.CharField(blank=True, choices=[('akkar', 'Akkar - عكار'), ('aley', 'Aley - عاليه'), ('baabda', 'Baabda - بعبدا'), ('baalbek', 'Baalbek - بعلبك'), ('batroun', 'Batroun - البترون'), ('beirut', 'Beirut - بيروت'), ('bint_jbeil', 'Bint Jbeil - بنت جبيل'), ('bsharri', 'Bsharri - بشري'), ('byblos', 'Byblos - جبيل'), ('chouf', 'Chouf - الشوف'), ('danniyeh', 'Danniyeh - الضنية'), ('hasbaya', 'Hasbaya - حاصبيا'), ('hermel', 'Hermel - الهرمل'), ('jezzine', 'Jezzine - جزين'), ('keserwan', 'Keserwan - كسروان'), ('koura', 'Koura - الكورة'), ('marjeyoun', 'Marjeyoun - مرجعيون'), ('matn', 'Matn - المتن'), ('nabatieh', 'Nabatieh - النبطية'), ('rashaya', 'Rashaya - راشيا'), ('sidon', 'Sidon - صيدا'), ('tripoli', 'Tripoli - طرابلس'), ('tyre', 'Tyre - صور'), ('western_bekaa', 'Western Bekaa - البقاع الغربي'), ('zahle', 'Zahle - زحلة'), ('zgharta', 'Zgharta - زغرتا')], max_length=50)),
+                ('customer_address', models.CharField(blank=True)),
+                ('building_name', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('dispatched', 'Dispatched'), ('delivered', 'Delivered'), ('returned', 'Returned'), ('partially_returned', 'Partially Returned')], max_length=20)),
+                ('order_type', models.CharField(choices=[('delivery', 'Cash On Delivery')], default='delivery', max_length=20)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('returned_quantity', models.PositiveIntegerField(default=0)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='order.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderStatusEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('dispatched', 'Dispatched'), ('delivered', 'Delivered'), ('returned', 'Returned'), ('partially_returned', 'Partially Returned')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='order.archivedorder')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['status', 'created_at'], name='order_archi_status_4f303a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at'], name='order_archi_created_aad0a4_idx'),
+        ),
+    ]
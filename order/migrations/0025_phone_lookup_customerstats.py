@@ -0,0 +1,88 @@
+# Generated by Django 6.0 on 2026-10-19 14:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from phonenumber_field.phonenumber import to_python
+
+BATCH_SIZE = 1000
+
+
+def normalize_phone(value):
+    # Frozen copy of customers.phones.normalize_phone as of this migration
+    if not value:
+        return ""
+    number = to_python(value, region="LB")
+    if number is None or not number.is_valid():
+        return ""
+    return number.as_e164
+
+
+def fill_phone_e164(apps, schema_editor):
+    """
+    Store the E.164 form of existing phone numbers, batch by batch, for
+    orders, archived orders and customer profiles.
+    """
+    for app_label, model_name in [("order", "Order"), ("order", "ArchivedOrder"), ("customers", "UserProfile")]:
+        model = apps.get_model(app_label, model_name)
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "customer_phone")[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                row.phone_e164 = normalize_phone(row.customer_phone)
+            model.objects.bulk_update(rows, ["phone_e164"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0024_archived_orders'),
+        ('customers', '0005_userprofile_phone_e164'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('phone_e164', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('delivered_count', models.PositiveIntegerField(default=0)),
+                ('returned_count', models.PositiveIntegerField(default=0)),
+                ('last_order_at', models.DateTimeField(null=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(fill_phone_e164, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone_e164', 'created_at'], name='order_order_phone_e_2b851c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_email', 'created_at'], name='order_order_custome_ea287f_idx'),
+        ),
+        migrations.AddField(
+            model_name='customerstats',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 12:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0026_order_checkout_token'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'created_at'], name='order_archi_user_id_fde2e5_idx'),
+        ),
+    ]
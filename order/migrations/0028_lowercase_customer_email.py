@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def lowercase_customer_email(apps, schema_editor):
+    """
+    Orders now store customer_email lowercased on save; bring the existing
+    rows in line with one UPDATE per table.
+    """
+    for model_name in ("Order", "ArchivedOrder"):
+        model = apps.get_model("order", model_name)
+        model.objects.exclude(customer_email=Lower("customer_email")).update(customer_email=Lower("customer_email"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0027_archivedorder_user_created_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_customer_email, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['customer_email', 'created_at'], name='order_archi_custome_ed103b_idx'),
+        ),
+    ]
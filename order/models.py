@@ -1,9 +1,15 @@
+from decimal import Decimal
+
 from django.conf import settings
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import F, Sum
+from customers.phones import normalize_phone
 from products.models import Product
 from phonenumber_field.modelfields import PhoneNumberField
 
+CENTS = Decimal("0.01")
+
 
 class Cart(models.Model):
     user = models.ForeignKey(
@@ -25,13 +31,19 @@ class Cart(models.Model):
     is_active = models.BooleanField(default=True)
 
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(total=Sum("quantity"))["total"] or 0
 
     def total_price(self):
-        return sum(
-            item.quantity * item.product.price
-            for item in self.items.select_related('product')
+        total = self.items.aggregate(
+            total=Sum(F("quantity") * F("product__price"))
+        )["total"]
+        return (total or Decimal(0)).quantize(CENTS)
+
+    async def atotal_price(self):
+        totals = await self.items.aaggregate(
+            total=Sum(F("quantity") * F("product__price"))
         )
+        return (totals["total"] or Decimal(0)).quantize(CENTS)
 
     def __str__(self):
         owner = self.user.username if self.user else self.session_key
@@ -70,6 +82,7 @@ class Order(models.Model):
         region="LB",
         blank=False
     )
+    phone_e164 = models.CharField(max_length=20, blank=True, editable=False)  # filled on save, for lookups
     DISTRICT_CHOICES = [
         ("akkar", "Akkar - عكار"),
         ("aley", "Aley - عاليه"),
@@ -104,14 +117,35 @@ class Order(models.Model):
     building_name = models.CharField(max_length=50, blank=True)
 
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # One-time token from the checkout form; a resubmitted form finds its order
+    checkout_token = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('dispatched', 'Dispatched'),
+        ('delivered', 'Delivered'),
+        ('returned', 'Returned'),
+        ('partially_returned', 'Partially Returned'),
+    ]
+
+    # Allowed status changes, applied by order/fulfillment.py
+    STATUS_TRANSITIONS = {
+        'pending': ['confirmed', 'returned'],
+        'confirmed': ['dispatched', 'delivered', 'returned', 'partially_returned'],
+        'dispatched': ['delivered', 'returned', 'partially_returned'],
+        'delivered': ['returned', 'partially_returned'],
+        'partially_returned': ['dispatched', 'delivered', 'returned', 'partially_returned'],
+        'returned': [],
+    }
+
+    # Statuses whose items took stock and can still (partly) come back into it
+    RETURNABLE_STATUSES = ['confirmed', 'dispatched', 'delivered', 'partially_returned']
 
     status = models.CharField(
         max_length=20,
-        choices=[
-            ('returned', 'Returned'),
-            ('confirmed', 'Confirmed'),
-        ]
+        choices=STATUS_CHOICES,
     )
 
     order_type = models.CharField(
@@ -122,6 +156,39 @@ class Order(models.Model):
         default='delivery'
     )
 
+    # Denormalized totals, filled by finalize_order and kept in sync by return_order
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    currency = models.CharField(max_length=3, default="USD")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "district", "created_at"]),
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["phone_e164", "created_at"]),
+            models.Index(fields=["customer_email", "created_at"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.customer_phone)
+        # Stored lowercased, so the customer lookup is a plain indexed equality
+        self.customer_email = self.customer_email.lower()
+        super().save(*args, **kwargs)
+
+    def update_totals(self):
+        """
+        Recompute subtotal and item_count from the order items (net of
+        returned quantities) in one SQL aggregate.
+        """
+        kept = F("quantity") - F("returned_quantity")
+        totals = self.items.aggregate(
+            subtotal=Sum(F("price") * kept),
+            item_count=Sum(kept),
+        )
+        self.subtotal = (totals["subtotal"] or Decimal(0)).quantize(CENTS)
+        self.item_count = totals["item_count"] or 0
+
     def __str__(self):
         return f"Order {self.id} - {self.customer_name}"
 
@@ -129,9 +196,175 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
-    price = models.FloatField()  # snapshot of product price at time of order
+    returned_quantity = models.PositiveIntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2)  # snapshot of product price at time of order
+
+    @property
+    def remaining_quantity(self):
+        return self.quantity - self.returned_quantity
+
+    def __str__(self):
+        return f"{self.product.name} x {self.quantity}"
+
+class OrderStatusEvent(models.Model):
+    """
+    Append-only history of an order's status changes.
+    """
+    order = models.ForeignKey(Order, related_name="status_events", on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+class StockReservation(models.Model):
+    """
+    Stock held for a cart while its owner fills in the checkout form.
+    The held quantity is also counted in Product.reserved_quantity.
+    """
+    cart = models.ForeignKey(Cart, related_name="reservations", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('cart', 'product')
+
+    def __str__(self):
+        return f"{self.product.name} x {self.quantity} (cart {self.cart_id})"
+
+class ProductPair(models.Model):
+    """
+    How many orders contained both `product` and `related`. Both directions
+    are stored so a product's neighbours are one index range scan.
+    Filled by the build_recommendations command.
+    """
+    product = models.ForeignKey(Product, related_name="+", on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name="paired_with", on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=["product", "-count"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id}: {self.count}"
+
+class RecommendationRun(models.Model):
+    """
+    One build_recommendations run; the latest last_order_id is where the next run starts.
+    """
+    last_order_id = models.PositiveBigIntegerField()
+    orders = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Recommendations up to order {self.last_order_id}"
+
+# ----------------------------
+# ARCHIVE
+# Closed orders moved out of the live tables by archive_history.
+# Same ids and columns, read-only.
+# ----------------------------
+class ArchivedOrder(models.Model):
+    is_archived = True
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    customer_name = models.CharField(max_length=120)
+    customer_email = models.EmailField()
+    customer_phone = PhoneNumberField(region="LB")
+    phone_e164 = models.CharField(max_length=20, blank=True, db_index=True)
+    district = models.CharField(max_length=50, choices=Order.DISTRICT_CHOICES, blank=True)
+    customer_address = models.CharField(blank=True)
+    building_name = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_type = models.CharField(max_length=20, choices=[('delivery', 'Cash On Delivery')], default='delivery')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    currency = models.CharField(max_length=3, default="USD")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["user", "created_at"]),  # "My orders" past the archive cutoff
+            models.Index(fields=["customer_email", "created_at"]),  # customer lookup
+        ]
+
+    def __str__(self):
+        return f"Order {self.id} - {self.customer_name} (archived)"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name="items", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="+", on_delete=models.PROTECT)
+    quantity = models.PositiveIntegerField(default=1)
+    returned_quantity = models.PositiveIntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
+class ArchivedOrderStatusEvent(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name="status_events", on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+class CustomerStats(models.Model):
+    """
+    Lifetime order counts per phone number (live and archived orders),
+    rebuilt by the dedupe_customers command. Used to spot customers who
+    keep refusing cash-on-delivery orders.
+    """
+    phone_e164 = models.CharField(max_length=20, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    order_count = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    returned_count = models.PositiveIntegerField(default=0)  # fully or partially refused/returned
+    last_order_at = models.DateTimeField(null=True)
+    computed_at = models.DateTimeField()
 
+    def __str__(self):
+        return f"{self.phone_e164}: {self.order_count} orders, {self.returned_count} returned"
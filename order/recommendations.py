@@ -0,0 +1,103 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from products.models import Product
+from .models import Order, OrderItem, ProductPair, RecommendationRun
+
+
+def last_mined_order_id():
+    run = RecommendationRun.objects.order_by("-id").values_list("last_order_id", flat=True).first()
+    return run or 0
+
+
+def count_pairs(first_id, last_id):
+    """
+    Co-occurrence counts for orders with first_id <= id <= last_id, as
+    {(product_id, related_id): orders}. The pairs are counted by the
+    database in one self-join + GROUP BY, not row by row in Python.
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__gte=first_id, order_id__lte=last_id)
+        .exclude(product_id=F("order__items__product_id"))
+        .values_list("product_id", "order__items__product_id")
+        .annotate(orders=Count("order_id", distinct=True))
+        .order_by()
+    )
+    return {(product_id, related_id): orders for product_id, related_id, orders in rows}
+
+
+@transaction.atomic
+def add_pairs(counts):
+    """
+    Add `counts` to the stored ProductPair rows with a single upsert.
+    """
+    if not counts:
+        return
+    existing = Counter()
+    for product_id, related_id, count in ProductPair.objects.filter(
+        product_id__in={product_id for product_id, _ in counts}
+    ).values_list("product_id", "related_id", "count"):
+        if (product_id, related_id) in counts:
+            existing[product_id, related_id] = count
+
+    ProductPair.objects.bulk_create(
+        [
+            ProductPair(product_id=product_id, related_id=related_id, count=existing[product_id, related_id] + count)
+            for (product_id, related_id), count in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["product", "related"],
+        update_fields=["count"],
+        batch_size=1000,
+    )
+
+
+def build_recommendations(batch_size=5000, settle_minutes=10, stdout=None):
+    """
+    Mine the orders placed since the last run, `batch_size` order ids at a
+    time. Each batch and the cursor move forward together, so an
+    interrupted run picks up where it stopped. Returns the number of
+    orders mined.
+
+    Only orders older than `settle_minutes` are mined. Ids are handed out
+    when a checkout's transaction inserts its order, not when it commits,
+    so a lower id can still become visible after a higher one; the cursor
+    never goes back, and would skip it for good.
+    """
+    last_id = last_mined_order_id()
+    settled = timezone.now() - timedelta(minutes=settle_minutes)
+    upper = Order.objects.filter(created_at__lt=settled).aggregate(last=Max("id"))["last"] or 0
+    mined = 0
+
+    while last_id < upper:
+        end = min(last_id + batch_size, upper)
+        with transaction.atomic():
+            add_pairs(count_pairs(last_id + 1, end))
+            orders = Order.objects.filter(id__gt=last_id, id__lte=end).count()
+            RecommendationRun.objects.create(last_order_id=end, orders=orders)
+        mined += orders
+        last_id = end
+        if stdout:
+            stdout.write(f"Mined orders up to #{end}")
+
+    return mined
+
+
+def frequently_bought_with(product_ids, limit=4):
+    """
+    Visible products most often ordered together with `product_ids`,
+    ranked by the summed pair counts. One query.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return Product.objects.none()
+    return (
+        Product.objects.filter(is_visible=True, paired_with__product_id__in=product_ids)
+        .exclude(id__in=product_ids)
+        .annotate(score=Sum("paired_with__count"))
+        .order_by("-score", "id")[:limit]
+    )
@@ -0,0 +1,168 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from products.listings import invalidate_listings
+from products.models import Product
+from .models import StockReservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, product):
+        super().__init__(f"Not enough stock for {product.name}")
+        self.product = product
+
+
+def _give_back(held):
+    """
+    Remove `held` ({product_id: quantity}) from the products' reserved counters.
+    """
+    given_back = [product_id for product_id, quantity in sorted(held.items()) if quantity]
+    for product_id in given_back:
+        Product.objects.filter(id=product_id).update(
+            reserved_quantity=Greatest(F("reserved_quantity") - held[product_id], Value(0))
+        )
+    if given_back:
+        # update() sends no signals; listings show available stock
+        invalidate_listings(given_back)
+
+
+def cart_holds(cart):
+    """
+    Lock and return the cart's holds as {product_id: quantity}, expired or not.
+    Must run inside a transaction.
+    """
+    holds = Counter()
+    for product_id, quantity in (
+        StockReservation.objects.select_for_update()
+        .filter(cart=cart)
+        .values_list("product_id", "quantity")
+    ):
+        holds[product_id] += quantity
+    return holds
+
+
+def held_quantity(cart, product):
+    """
+    Units of `product` held for `cart`. They are part of the product's
+    reserved_quantity, so the cart itself may still use them.
+    """
+    if cart is None or not product.reserved_quantity:
+        return 0
+    return StockReservation.objects.filter(cart=cart, product=product).values_list("quantity", flat=True).first() or 0
+
+
+async def aheld_quantity(cart, product):
+    if cart is None or not product.reserved_quantity:
+        return 0
+    return await StockReservation.objects.filter(cart=cart, product=product).values_list("quantity", flat=True).afirst() or 0
+
+
+@transaction.atomic
+def reserve_cart(cart):
+    """
+    Hold every cart quantity for STOCK_RESERVATION_MINUTES. Re-opening
+    checkout with an unchanged cart only extends the existing holds.
+    Raises OutOfStock (keeping the previous holds) when a product doesn't
+    have enough unreserved stock.
+    """
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    wanted = Counter(dict(cart.items.values_list("product_id", "quantity")))
+    # Other carts' expired holds (and this cart's) stop counting now
+    release_expired(product_ids=list(wanted))
+    holds = cart_holds(cart)
+
+    if holds == wanted:
+        StockReservation.objects.filter(cart=cart).update(expires_at=expires_at)
+        return
+
+    _give_back(holds)
+    StockReservation.objects.filter(cart=cart).delete()
+
+    for product_id, quantity in sorted(wanted.items()):
+        held = Product.objects.filter(
+            id=product_id,
+            cached_quantity__gte=F("reserved_quantity") + quantity,
+        ).update(reserved_quantity=F("reserved_quantity") + quantity)
+        if not held:
+            raise OutOfStock(Product.objects.get(id=product_id))
+
+    StockReservation.objects.bulk_create([
+        StockReservation(cart=cart, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in wanted.items()
+    ])
+    invalidate_listings(wanted)
+
+
+@transaction.atomic
+def release_cart(cart):
+    holds = cart_holds(cart)
+    if holds:
+        _give_back(holds)
+        StockReservation.objects.filter(cart=cart).delete()
+
+
+def take_stock(item, holds):
+    """
+    Decrement stock for an order line, consuming the cart's hold on the
+    product first. Only the part that isn't held is checked against
+    unreserved stock. Raises OutOfStock. The "sale" StockMovement logged
+    for the line invalidates the product's cached listing.
+    """
+    held = min(holds.get(item.product_id, 0), item.quantity)
+    holds[item.product_id] -= held
+    needed = item.quantity - held
+
+    products = Product.objects.filter(id=item.product_id)
+    if needed:
+        products = products.filter(cached_quantity__gte=F("reserved_quantity") + needed)
+    else:
+        products = products.filter(cached_quantity__gte=item.quantity)
+
+    updated = products.update(
+        cached_quantity=F("cached_quantity") - item.quantity,
+        # Floored like _give_back: after a release race the counter must
+        # not go negative and show more stock than there is
+        reserved_quantity=Greatest(F("reserved_quantity") - held, Value(0)),
+    )
+    if not updated:
+        raise OutOfStock(item.product)
+
+
+def finish_holds(cart, holds):
+    """
+    Release what is left of the cart's holds once the order lines took theirs.
+    """
+    _give_back(holds)
+    StockReservation.objects.filter(cart=cart).delete()
+
+
+def release_expired(batch_size=1000, product_ids=None):
+    """
+    Release expired holds in batches, only those on `product_ids` when
+    given. Returns the number of holds released.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.select_for_update().filter(expires_at__lte=timezone.now())
+            if product_ids is not None:
+                expired = expired.filter(product_id__in=product_ids)
+            rows = list(
+                expired
+                .values_list("id", "product_id", "quantity")[:batch_size]
+            )
+            if not rows:
+                return released
+
+            held = Counter()
+            for _, product_id, quantity in rows:
+                held[product_id] += quantity
+            _give_back(held)
+            StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+            released += len(rows)
@@ -0,0 +1,59 @@
+document.addEventListener("DOMContentLoaded", function () {
+
+    const cartTable = document.getElementById("cartTable");
+    if (!cartTable) return;
+    const { updateUrl, csrfToken } = cartTable.dataset;
+
+    document.querySelectorAll(".qty-btn").forEach(btn => {
+        btn.addEventListener("click", function () {
+            const itemId = this.dataset.itemId;
+            const action = this.dataset.action;
+
+            fetch(updateUrl, {
+                method: "POST",
+                headers: {
+                    "X-CSRFToken": csrfToken,
+                    "Content-Type": "application/x-www-form-urlencoded",
+                },
+                body: new URLSearchParams({
+                    item_id: itemId,
+                    action: action
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+
+                if (data.removed) {
+                    location.reload();
+                    return;
+                }
+
+                // Update quantity
+                const qtyEl = document.getElementById(`qty-${itemId}`);
+                if (qtyEl) {
+                    qtyEl.textContent = data.quantity;
+                }
+
+                // Update cart total
+                const totalEl = document.querySelector(
+                    ".fs-5.fw-bold.text-primary"
+                );
+                if (totalEl) {
+                    totalEl.textContent = `$${data.cart_total}`;
+                }
+
+                // Disable "-" if quantity is 0 or 1
+                const minusBtn = document.querySelector(
+                    `.qty-btn[data-item-id="${itemId}"][data-action="decrease"]`
+                );
+                if (minusBtn) {
+                    minusBtn.disabled = (data.quantity <= 1);
+                }
+            })
+            .catch(error =>
+                console.error("Cart update error:", error)
+            );
+        });
+    });
+
+});
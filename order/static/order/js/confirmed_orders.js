@@ -0,0 +1,5 @@
+document.getElementById("selectAll")?.addEventListener("change", (e) => {
+  document.querySelectorAll(".order-check").forEach((box) => {
+    box.checked = e.target.checked;
+  });
+});
@@ -1,3 +1,889 @@
-from django.test import TestCase
+import asyncio
+import csv
+import email.policy
+import importlib
+import io
+import re
+import socketserver
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+from phonenumber_field.phonenumber import to_python
+
+from customers.models import UserProfile
+from products.listings import subcategory_products
+from products.models import Category, Product, StockMovement, SubCategory
+from . import async_views
+from .archive import archive_orders
+from .customers import customer_lookup as lookup_customer, link_guest_orders
+from .dispatch import dispatch_plan
+from .exports import ORDER_COLUMNS, day_start, stream_csv
+from .fulfillment import InvalidTransition, bulk_transition, return_items
+from .models import (
+    ArchivedOrder, Cart, CartItem, Order, OrderItem, OrderStatusEvent, ProductPair, RecommendationRun,
+    StockReservation,
+)
+from .recommendations import build_recommendations, frequently_bought_with
+from .reservations import release_cart, reserve_cart
+from .utils import place_order
+
+# Pages render {% static %} without a collectstatic run
+PLAIN_STATIC = override_settings(STORAGES={
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+
+User = get_user_model()
+
+
+def make_order(**fields):
+    values = dict(
+        customer_name="Guest", customer_email="guest@example.com",
+        customer_phone="71123456", status="confirmed",
+    )
+    values.update(fields)
+    return Order.objects.create(**values)
+
+
+def make_product(name="USB-C charger", price="5.99", quantity=10):
+    category, _ = Category.objects.get_or_create(name="Phones")
+    subcategory, _ = SubCategory.objects.get_or_create(name="Chargers", category=category)
+    return Product.objects.create(name=name, price=Decimal(price), cached_quantity=quantity, category=subcategory)
+
+
+class LinkGuestOrdersTests(TestCase):
+    def test_links_to_activated_account_with_same_email(self):
+        user = User.objects.create_user("owner", email="Guest@Example.com", password="x")
+        order = make_order()
+
+        self.assertEqual(link_guest_orders(), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.user, user)
+
+    def test_ignores_accounts_that_were_never_activated(self):
+        User.objects.create_user("pending", email="guest@example.com", password="x", is_active=False)
+        order = make_order()
+
+        self.assertEqual(link_guest_orders(), 0)
+        order.refresh_from_db()
+        self.assertIsNone(order.user)
+
+    def test_never_links_by_unverified_profile_phone(self):
+        # Anyone can sign up with somebody else's phone number
+        squatter = User.objects.create_user("squatter", email="squatter@example.com", password="x")
+        profile = UserProfile.objects.get(user=squatter)
+        profile.customer_phone = "71123456"
+        profile.save()
+        order = make_order()
+
+        self.assertEqual(link_guest_orders(), 0)
+        order.refresh_from_db()
+        self.assertIsNone(order.user)
+
+
+class CustomerLookupTests(TestCase):
+    def test_email_lookup_ignores_case_in_live_and_archived_orders(self):
+        old = make_order(customer_email="John@X.com", status="delivered")
+        Order.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=400))
+        archive_orders(timezone.now() - timedelta(days=365))
+        live = make_order(customer_email="john@x.COM")
+
+        context = lookup_customer("JOHN@x.com ")
+
+        self.assertEqual([order.id for order in context["orders"]], [live.id])
+        self.assertEqual([order.id for order in context["archived_orders"]], [old.id])
+
+    def test_migration_lowercases_stored_emails(self):
+        order = make_order()
+        Order.objects.filter(id=order.id).update(customer_email="Guest@Example.com")
+        migration = importlib.import_module("order.migrations.0028_lowercase_customer_email")
+
+        migration.lowercase_customer_email(apps, None)
+
+        order.refresh_from_db()
+        self.assertEqual(order.customer_email, "guest@example.com")
+
+
+class OrderExportTests(TestCase):
+    def test_line_total_has_two_decimal_places(self):
+        order = make_order()
+        OrderItem.objects.create(order=order, product=make_product(), quantity=2, price=Decimal("5.99"))
+        today = timezone.localdate().isoformat()
+
+        lines = list(stream_csv("orders", day_start(today), day_start(today, days=1)))
+
+        self.assertEqual(len(lines), 2)
+        self.assertIn(",5.99,11.98,", lines[1])
+
+    def test_line_total_is_net_of_returned_units(self):
+        order = make_order()
+        OrderItem.objects.create(
+            order=order, product=make_product(), quantity=3, returned_quantity=1, price=Decimal("5.99")
+        )
+        today = timezone.localdate().isoformat()
+
+        lines = list(stream_csv("orders", day_start(today), day_start(today, days=1)))
+
+        self.assertIn(",3,1,5.99,11.98,", lines[1])
+
+    def test_formula_cells_are_quoted(self):
+        order = make_order(customer_name="=HYPERLINK(\"http://evil\")")
+        OrderItem.objects.create(order=order, product=make_product("@SUM(A1)"), quantity=1, price=Decimal("5.99"))
+        today = timezone.localdate().isoformat()
+
+        row = next(csv.reader(list(stream_csv("orders", day_start(today), day_start(today, days=1)))[1:]))
+
+        self.assertEqual(row[ORDER_COLUMNS.index("customer_name")], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual(row[ORDER_COLUMNS.index("product_name")], "'@SUM(A1)")
+        self.assertEqual(row[ORDER_COLUMNS.index("quantity")], "1")
+
+
+class BenchmarkTotalsTests(TestCase):
+    def test_sql_totals_are_exact_and_rolled_back(self):
+        out = io.StringIO()
+        call_command("benchmark_totals", orders=50, repeat=1, stdout=out)
+
+        self.assertIn("All totals exact", out.getvalue())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Product.objects.exists())
+
+
+@PLAIN_STATIC
+class ExpiredHoldTests(TestCase):
+    def setUp(self):
+        # The last unit is held by a checkout that was abandoned an hour ago
+        self.product = make_product(quantity=1)
+        self.product.reserved_quantity = 1
+        self.product.save()
+        self.abandoned = Cart.objects.create(session_key="abandoned")
+        StockReservation.objects.create(
+            cart=self.abandoned, product=self.product, quantity=1,
+            expires_at=timezone.now() - timedelta(hours=1),
+        )
+
+    def test_cart_add_releases_expired_holds(self):
+        response = self.client.post(reverse("cart_add", args=[self.product.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(StockReservation.objects.filter(cart=self.abandoned).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 0)
+
+    def test_reserve_cart_releases_expired_holds(self):
+        cart = Cart.objects.create(session_key="shopper")
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+
+        reserve_cart(cart)
+
+        self.assertEqual(list(StockReservation.objects.values_list("cart", flat=True)), [cart.id])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 1)
+
+    def test_holds_refresh_the_cached_listing(self):
+        cache.clear()
+        StockReservation.objects.all().delete()
+        Product.objects.filter(id=self.product.id).update(cached_quantity=3, reserved_quantity=0)
+        cart = Cart.objects.create(session_key="shopper")
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.assertEqual(subcategory_products(self.product.category_id)[0].available_quantity, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_cart(cart)
+        self.assertEqual(subcategory_products(self.product.category_id)[0].available_quantity, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_cart(cart)
+        self.assertEqual(subcategory_products(self.product.category_id)[0].available_quantity, 3)
+
+    def test_live_holds_are_kept(self):
+        StockReservation.objects.update(expires_at=timezone.now() + timedelta(minutes=5))
+
+        response = self.client.post(reverse("cart_add", args=[self.product.id]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(StockReservation.objects.filter(cart=self.abandoned).exists())
+
+
+@PLAIN_STATIC
+class CartHoldTests(TestCase):
+    def setUp(self):
+        self.product = make_product(quantity=2)
+        self.client.post(reverse("cart_add", args=[self.product.id]))
+        self.client.get(reverse("place_order"))  # holds the unit in the cart
+        self.item = CartItem.objects.get()
+
+    def test_cart_add_can_use_the_carts_own_hold(self):
+        response = self.client.post(reverse("cart_add", args=[self.product.id]))
+
+        self.assertEqual(response.json()["cart_count"], 2)
+
+    def test_update_quantity_counts_the_carts_own_hold(self):
+        increase = {"item_id": self.item.id, "action": "increase"}
+
+        self.assertEqual(self.client.post(reverse("cart_update_quantity"), increase).json()["quantity"], 2)
+        blocked = self.client.post(reverse("cart_update_quantity"), increase).json()
+        self.assertEqual((blocked["blocked"], blocked["max_stock"]), ("max", 2))
+
+    def test_other_carts_still_see_the_hold(self):
+        response = self.client_class().post(reverse("cart_add", args=[self.product.id]))
+        self.assertEqual(response.json()["cart_count"], 1)
+
+        Product.objects.filter(id=self.product.id).update(cached_quantity=1)
+        response = self.client_class().post(reverse("cart_add", args=[self.product.id]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_taking_stock_never_leaves_a_negative_reservation(self):
+        # A release race already gave the hold back
+        Product.objects.filter(id=self.product.id).update(reserved_quantity=0)
+        order = Order(customer_name="Guest", customer_email="guest@example.com", customer_phone="71123456", status="confirmed")
+
+        place_order(order, self.item.cart)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.cached_quantity, self.product.reserved_quantity), (1, 0))
+
+
+@PLAIN_STATIC
+class MyOrdersTests(TestCase):
+    def test_pages_run_through_archived_orders(self):
+        user = User.objects.create_user("owner", password="x")
+        now = timezone.now()
+        for days in range(25):
+            order = make_order(user=user, status="delivered")
+            Order.objects.filter(id=order.id).update(created_at=now - timedelta(days=30 * days))
+        archive_orders(now - timedelta(days=365))
+        self.assertEqual(ArchivedOrder.objects.count(), 12)
+
+        self.client.force_login(user)
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse("my_orders"), {"before": cursor} if cursor else {})
+            seen += [order.id for order in response.context["orders"]]
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+
+        newest_first = sorted(
+            Order.objects.values_list("created_at", "id").union(ArchivedOrder.objects.values_list("created_at", "id")),
+            reverse=True,
+        )
+        self.assertEqual(seen, [order_id for _, order_id in newest_first])
+
+
+CHECKOUT_FORM = {
+    "customer_name": "Guest",
+    "customer_email": "guest@example.com",
+    "customer_phone": "71123456",
+    "district": "beirut",
+    "customer_address": "Hamra street",
+    "building_name": "Block A",
+    "order_type": "delivery",
+}
+
+
+def checkout_token(response):
+    return re.search(rb'name="checkout_token" value="([^"]+)"', response.content).group(1).decode()
+
+
+@PLAIN_STATIC
+class CheckoutIdempotencyTests(TestCase):
+    def setUp(self):
+        self.product = make_product(quantity=5)
+        self.client.post(reverse("cart_add", args=[self.product.id]))
+        self.client.post(reverse("cart_add", args=[self.product.id]))
+        self.token = checkout_token(self.client.get(reverse("place_order")))
+
+    def submit(self):
+        return self.client.post(reverse("place_order"), {"checkout_token": self.token, **CHECKOUT_FORM})
+
+    def assert_placed_once(self):
+        order = Order.objects.get()
+        self.assertEqual(order.checkout_token, self.token)
+        self.assertEqual(
+            list(StockMovement.objects.values_list("order", "product", "change")),
+            [(order.id, self.product.id, -2)],
+        )
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.cached_quantity, self.product.reserved_quantity), (3, 0))
+
+    def test_repeated_submit_places_one_order(self):
+        first = self.submit()
+        second = self.submit()
+
+        placed = reverse("order_placed", args=[self.token])
+        self.assertRedirects(first, placed)
+        self.assertRedirects(second, placed)
+        self.assert_placed_once()
+
+    def test_concurrent_submit_falls_back_to_the_placed_order(self):
+        # Another request with the same token commits while this one is
+        # between its duplicate check and place_order
+        def race(order, cart):
+            winner = Order(**{name: getattr(order, name) for name in CHECKOUT_FORM}, checkout_token=order.checkout_token)
+            place_order(winner, Cart.objects.get(id=cart.id))
+            return place_order(order, cart)
+
+        with mock.patch("order.views.place_order", side_effect=race):
+            response = self.submit()
+
+        self.assertRedirects(response, reverse("order_placed", args=[self.token]))
+        self.assert_placed_once()
+
+    def test_placed_page_shows_the_order(self):
+        self.submit()
+        order = Order.objects.get()
+
+        response = self.client.get(reverse("order_placed", args=[self.token]))
+
+        self.assertContains(response, f"#{order.id}")
+        self.assertEqual(self.client.get(reverse("order_placed", args=["unknown"])).status_code, 404)
+
+
+class FulfillmentTests(TestCase):
+    def setUp(self):
+        # Three chargers and a cable went out with the order
+        self.charger = make_product(quantity=7)
+        self.cable = make_product(name="USB-C cable", price="3.00", quantity=9)
+        self.order = self.make_order_with_items()
+
+    def make_order_with_items(self, status="confirmed"):
+        order = make_order(status=status)
+        self.charger_item = OrderItem.objects.create(order=order, product=self.charger, quantity=3, price=self.charger.price)
+        self.cable_item = OrderItem.objects.create(order=order, product=self.cable, quantity=1, price=self.cable.price)
+        order.update_totals()
+        order.save()
+        return order
+
+    def stock(self):
+        return list(Product.objects.order_by("id").values_list("cached_quantity", flat=True))
+
+    def test_moves_only_orders_whose_status_allows_it(self):
+        delivered = make_order(status="delivered")
+
+        changed = bulk_transition([self.order.id, delivered.id], "dispatched")
+
+        self.assertEqual(changed, [self.order.id])
+        self.assertEqual(
+            dict(Order.objects.values_list("id", "status")),
+            {self.order.id: "dispatched", delivered.id: "delivered"},
+        )
+        self.assertEqual(
+            list(OrderStatusEvent.objects.values_list("order", "from_status", "to_status")),
+            [(self.order.id, "confirmed", "dispatched")],
+        )
+        self.assertEqual(bulk_transition([self.order.id], "confirmed"), [])
+        self.assertEqual(self.stock(), [7, 9])
+
+    def test_rejects_unknown_and_partial_statuses(self):
+        for status in ["shipped", "partially_returned"]:
+            with self.subTest(status=status), self.assertRaises(InvalidTransition):
+                bulk_transition([self.order.id], status)
+
+    def test_partial_returns_restock_what_came_back(self):
+        self.assertEqual(return_items(self.order, {self.charger_item.id: 2}), 2)
+
+        self.charger_item.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.charger_item.returned_quantity, 2)
+        self.assertEqual(self.order.status, "partially_returned")
+        self.assertEqual((self.order.subtotal, self.order.item_count), (Decimal("8.99"), 2))
+        self.assertEqual(self.stock(), [9, 9])
+
+        # More than is still out is capped
+        self.assertEqual(return_items(self.order, {self.charger_item.id: 5, self.cable_item.id: 1}), 2)
+
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.subtotal, self.order.item_count), ("returned", 0, 0))
+        self.assertEqual(self.stock(), [10, 10])
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(kind="return").values_list("product", "change")),
+            [(self.charger.id, 1), (self.charger.id, 2), (self.cable.id, 1)],
+        )
+        with self.assertRaises(InvalidTransition):
+            return_items(self.order, {self.cable_item.id: 1})
+
+    def test_returning_the_order_restocks_what_is_still_out(self):
+        return_items(self.order, {self.charger_item.id: 1})
+
+        self.assertEqual(bulk_transition([self.order.id], "returned"), [self.order.id])
+
+        self.assertEqual(self.stock(), [10, 10])
+        self.assertEqual(
+            list(OrderItem.objects.values_list("quantity", "returned_quantity")),
+            [(3, 3), (1, 1)],
+        )
+
+    def test_returning_a_pending_order_does_not_restock(self):
+        pending = self.make_order_with_items(status="pending")
+
+        self.assertEqual(bulk_transition([pending.id], "returned"), [pending.id])
+
+        self.assertEqual(self.stock(), [7, 9])
+        self.assertFalse(StockMovement.objects.exists())
+
+    @PLAIN_STATIC
+    def test_return_order_view_only_accepts_post(self):
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+        url = reverse("return_order", args=[self.order.id])
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "confirmed")
+
+        self.assertRedirects(self.client.post(url), reverse("confirmed_orders"), fetch_redirect_response=False)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "returned")
+        self.assertEqual(self.stock(), [10, 10])
+
+
+@PLAIN_STATIC
+class DispatchPlanTests(TestCase):
+    def setUp(self):
+        self.charger = make_product(quantity=20)
+        self.cable = make_product(name="USB-C cable", price="3.00", quantity=20)
+        today = timezone.localdate().isoformat()
+        self.start, self.end = day_start(today), day_start(today, days=1)
+
+    def make_order_with_items(self, district, lines, status="confirmed"):
+        order = make_order(district=district, status=status)
+        for product, quantity, returned in lines:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=quantity, returned_quantity=returned, price=product.price
+            )
+        order.update_totals()
+        order.save()
+        return order
+
+    def test_groups_orders_and_sums_pick_list_and_cash_per_district(self):
+        first = self.make_order_with_items("baabda", [(self.charger, 2, 0), (self.cable, 1, 0)])
+        second = self.make_order_with_items("baabda", [(self.charger, 3, 1)])
+        third = self.make_order_with_items("aley", [(self.cable, 4, 0)])
+
+        with self.assertNumQueries(3):
+            plan = dispatch_plan(self.start, self.end)
+
+        self.assertEqual([district["district"] for district in plan], ["aley", "baabda"])
+        aley, baabda = plan
+        self.assertEqual([order["id"] for order in aley["orders"]], [third.id])
+        self.assertEqual([order["id"] for order in baabda["orders"]], [first.id, second.id])
+        self.assertEqual(baabda["order_count"], 2)
+        self.assertEqual(baabda["item_count"], 5)
+        self.assertEqual(baabda["cash_to_collect"], Decimal("26.96"))
+        self.assertEqual(aley["cash_to_collect"], Decimal("12.00"))
+        # Returned units don't go on the pick list
+        self.assertEqual(
+            [(row["product__name"], row["quantity"]) for row in baabda["pick_list"]],
+            [("USB-C cable", 1), ("USB-C charger", 4)],
+        )
+
+    def test_plans_only_confirmed_orders_in_the_window(self):
+        confirmed = self.make_order_with_items("baabda", [(self.charger, 1, 0)])
+        for status in ("pending", "dispatched", "delivered", "returned", "partially_returned"):
+            self.make_order_with_items("baabda", [(self.charger, 1, 0)], status=status)
+        yesterday = self.make_order_with_items("baabda", [(self.charger, 1, 0)])
+        Order.objects.filter(id=yesterday.id).update(created_at=self.start - timedelta(hours=1))
+
+        plan = dispatch_plan(self.start, self.end)
+
+        self.assertEqual([order["id"] for district in plan for order in district["orders"]], [confirmed.id])
+        self.assertEqual(plan[0]["pick_list"][0]["quantity"], 1)
+
+    def test_sheet_totals_cover_every_district(self):
+        self.make_order_with_items("baabda", [(self.charger, 2, 0)])
+        self.make_order_with_items("aley", [(self.cable, 1, 0)])
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+
+        response = self.client.get(reverse("dispatch_sheets"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_orders"], 2)
+        self.assertEqual(response.context["total_cash"], Decimal("14.98"))
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.phone, self.case, self.charger = (
+            make_product(name=name) for name in ["Phone", "Phone case", "Charger"]
+        )
+
+    def order_of(self, *products, minutes_ago=60):
+        order = make_order()
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(minutes=minutes_ago))
+        return order
+
+    def pairs(self):
+        return dict(((pair.product_id, pair.related_id), pair.count) for pair in ProductPair.objects.all())
+
+    def test_counts_pairs_in_both_directions(self):
+        self.order_of(self.phone, self.case)
+        self.order_of(self.phone, self.case, self.charger)
+        self.order_of(self.phone, self.charger)
+        self.order_of(self.charger)
+
+        self.assertEqual(build_recommendations(), 4)
+
+        phone, case, charger = self.phone.id, self.case.id, self.charger.id
+        self.assertEqual(self.pairs(), {
+            (phone, case): 2, (case, phone): 2,
+            (phone, charger): 2, (charger, phone): 2,
+            (case, charger): 1, (charger, case): 1,
+        })
+        self.assertEqual(list(frequently_bought_with([self.case.id])), [self.phone, self.charger])
+
+    def test_later_runs_only_add_new_orders(self):
+        self.order_of(self.phone, self.case)
+        self.assertEqual(build_recommendations(batch_size=1), 1)
+
+        self.order_of(self.phone, self.charger)
+        last = self.order_of(self.phone, self.case)
+
+        self.assertEqual(build_recommendations(batch_size=1), 2)
+        self.assertEqual(build_recommendations(), 0)
+        self.assertEqual(self.pairs()[self.phone.id, self.case.id], 2)
+        self.assertEqual(self.pairs()[self.phone.id, self.charger.id], 1)
+        self.assertEqual(RecommendationRun.objects.latest("id").last_order_id, last.id)
+
+    def test_recent_orders_wait_for_a_later_run(self):
+        # The second order may still be committing behind a lower id
+        settled = self.order_of(self.phone, self.case)
+        recent = self.order_of(self.phone, self.case, minutes_ago=2)
+
+        self.assertEqual(build_recommendations(), 1)
+        self.assertEqual(RecommendationRun.objects.latest("id").last_order_id, settled.id)
+
+        Order.objects.filter(id=recent.id).update(created_at=timezone.now() - timedelta(minutes=15))
+        self.assertEqual(build_recommendations(), 1)
+        self.assertEqual(self.pairs()[self.phone.id, self.case.id], 2)
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP for smtplib and aiosmtplib: every message is accepted
+    and kept in server.messages.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 stub ESMTP")
+        recipients = []
+        while line := self.rfile.readline():
+            verb = line[:4].decode().upper()
+            if verb == "RCPT":
+                recipients.append(re.search(r"<(.*)>", line.decode()).group(1))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                self.server.messages.append((recipients, email.message_from_bytes(data, policy=email.policy.default)))
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:  # EHLO, MAIL, RSET, NOOP
+                self.reply("250 OK")
+
+
+class FakeAioSMTP:
+    """
+    Stands in for the aiosmtplib module: SMTP() records what it sends and
+    yields to the event loop like a network write would.
+    """
+    sent = []
+
+    class SMTP:
+        def __init__(self, **options):
+            self.options = options
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+        async def send_message(self, message, sender, recipients):
+            await asyncio.sleep(0)
+            FakeAioSMTP.sent.append((recipients, email.message_from_bytes(message.as_bytes(), policy=email.policy.default)))
+
+
+class AsyncCheckoutUrls:
+    # What ASYNC_CHECKOUT=True routes to, whatever the setting was at import time
+    urlpatterns = [
+        path("order/add/<int:product_id>/", async_views.cart_add, name="cart_add"),
+        path("order/place/", async_views.checkout, name="place_order"),
+        path("", include("amhaz.urls")),
+    ]
+
+
+@PLAIN_STATIC
+@override_settings(
+    ROOT_URLCONF=AsyncCheckoutUrls,
+    EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+    EMAIL_HOST="127.0.0.1",
+    EMAIL_USE_TLS=False,
+    EMAIL_HOST_USER="",
+    EMAIL_HOST_PASSWORD="",
+    DEFAULT_FROM_EMAIL="shop@example.com",
+)
+class AsyncCheckoutTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubSMTPHandler)
+        cls.smtp.messages = []
+        threading.Thread(target=cls.smtp.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.smtp.server_close)
+        cls.addClassCleanup(cls.smtp.shutdown)
+
+    def setUp(self):
+        self.smtp.messages.clear()
+        FakeAioSMTP.sent.clear()
+        self.product = make_product(quantity=3)
+
+    async def test_cart_add_checkout_and_emails(self):
+        client = AsyncClient()
+
+        response = await client.post(f"/order/add/{self.product.id}/")
+        self.assertEqual(response.json(), {"success": True, "cart_count": 1})
+
+        response = await client.get("/order/place/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await StockReservation.objects.filter(product=self.product).aexists())
+        token = checkout_token(response)
+
+        with self.settings(EMAIL_PORT=self.smtp.server_address[1]):
+            response = await client.post("/order/place/", {"checkout_token": token, **CHECKOUT_FORM})
+
+        self.assertRedirects(response, reverse("order_placed", args=[token]), fetch_redirect_response=False)
+        order = await Order.objects.aget(checkout_token=token)
+        self.assertEqual((order.subtotal, order.item_count), (Decimal("5.99"), 1))
+        await self.product.arefresh_from_db()
+        self.assertEqual((self.product.cached_quantity, self.product.reserved_quantity), (2, 0))
+
+        sent = {message["Subject"]: recipients for recipients, message in self.smtp.messages}
+        self.assertEqual(sent, {
+            f"Your Order #{order.id} Has Been Received": ["guest@example.com"],
+            f"🚨 New Order #{order.id}": ["shop@example.com"],
+        })
+
+
+    async def test_repeated_submit_places_one_order(self):
+        client = AsyncClient()
+        await client.post(f"/order/add/{self.product.id}/")
+        token = checkout_token(await client.get("/order/place/"))
+
+        with self.settings(EMAIL_PORT=self.smtp.server_address[1]):
+            responses = [
+                await client.post("/order/place/", {"checkout_token": token, **CHECKOUT_FORM})
+                for _ in range(2)
+            ]
+
+        for response in responses:
+            self.assertRedirects(response, reverse("order_placed", args=[token]), fetch_redirect_response=False)
+        order = await Order.objects.aget()
+        self.assertEqual(order.checkout_token, token)
+        self.assertEqual(
+            [movement async for movement in StockMovement.objects.values_list("order", "change")],
+            [(order.id, -1)],
+        )
+        await self.product.arefresh_from_db()
+        self.assertEqual(self.product.cached_quantity, 2)
+        self.assertEqual(len(self.smtp.messages), 2)
+
+
+    async def test_concurrent_checkouts_never_oversell(self):
+        # Eight shoppers race for five units; nobody went through the GET
+        # that would have held stock for them
+        await Product.objects.filter(id=self.product.id).aupdate(cached_quantity=5)
+        clients = [AsyncClient() for _ in range(8)]
+        for client in clients:
+            await client.post(f"/order/add/{self.product.id}/")
+
+        with mock.patch("order.emails.aiosmtplib", FakeAioSMTP), self.settings(EMAIL_PORT=2525):
+            responses = await asyncio.gather(*(
+                client.post("/order/place/", {"checkout_token": f"race-{i}", **CHECKOUT_FORM})
+                for i, client in enumerate(clients)
+            ))
+
+        placed = [response.url for response in responses if response.url != reverse("cart_view")]
+        orders = [order async for order in Order.objects.order_by("id")]
+        self.assertEqual(len(orders), 5)
+        self.assertCountEqual(placed, [reverse("order_placed", args=[order.checkout_token]) for order in orders])
+        await self.product.arefresh_from_db()
+        self.assertEqual((self.product.cached_quantity, self.product.reserved_quantity), (0, 0))
+        self.assertEqual(await StockMovement.objects.filter(kind="sale").acount(), 5)
+
+        # Two emails per order, over aiosmtplib and not the stub server
+        self.assertEqual(self.smtp.messages, [])
+        self.assertCountEqual(
+            [message["Subject"] for _, message in FakeAioSMTP.sent],
+            [subject for order in orders for subject in (
+                f"Your Order #{order.id} Has Been Received", f"🚨 New Order #{order.id}",
+            )],
+        )
+
+    async def test_mail_failure_keeps_the_order(self):
+        client = AsyncClient()
+        await client.post(f"/order/add/{self.product.id}/")
+
+        with mock.patch("order.async_views.asend_order_emails", side_effect=OSError("SMTP down")), \
+                self.assertLogs("order.async_views", "ERROR"):
+            response = await client.post("/order/place/", {"checkout_token": "mail-down", **CHECKOUT_FORM})
+
+        self.assertRedirects(response, reverse("order_placed", args=["mail-down"]), fetch_redirect_response=False)
+        self.assertTrue(await Order.objects.filter(checkout_token="mail-down").aexists())
+
+
+@PLAIN_STATIC
+class CheckoutEmailTests(TestCase):
+    def setUp(self):
+        product = make_product()
+        self.client.post(reverse("cart_add", args=[product.id]))
+
+    def submit(self):
+        return self.client.post(reverse("place_order"), {"checkout_token": "sync", **CHECKOUT_FORM})
+
+    def test_emails_are_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.submit()
+            self.assertEqual(mail.outbox, [])
+
+        for callback in callbacks:
+            callback()
+        order = Order.objects.get()
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            [f"Your Order #{order.id} Has Been Received", f"🚨 New Order #{order.id}"],
+        )
+
+    def test_mail_failure_keeps_the_order(self):
+        with mock.patch("order.emails.send_order_emails", side_effect=OSError("SMTP down")), \
+                self.assertLogs("order.emails", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            response = self.submit()
+
+        self.assertRedirects(response, reverse("order_placed", args=["sync"]))
+        self.assertTrue(Order.objects.filter(checkout_token="sync").exists())
+
+
+@PLAIN_STATIC
+class AnonymousBrowsingTests(TestCase):
+    def test_browsing_writes_nothing(self):
+        make_product()
+        for url in ["/", "/search/?q=charger", "/order/"]:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+
+                self.assertEqual(response.status_code, 200)
+                writes = [
+                    query["sql"] for query in queries
+                    if query["sql"].lstrip().upper().startswith(("INSERT", "UPDATE"))
+                ]
+                self.assertEqual(writes, [])
+        self.assertNotIn("sessionid", self.client.cookies)
+
+
+@tag("slow")  # about a minute: skip with `manage.py test --exclude-tag slow`
+@PLAIN_STATIC
+class AdminChangelistTests(TestCase):
+    ROWS = 100_000
+    MAX_QUERIES = 10  # session, user, count, page, related... but never one per row
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "x")
+        category = Category.objects.create(name="Phones")
+        subcategory = SubCategory.objects.create(name="Chargers", category=category)
+        # bulk_create skips save(), so phone_e164 is filled in by hand; the
+        # displayed phone is parsed once, it costs more than the insert
+        phone = to_python("+96171000000")
+        products = Product.objects.bulk_create(
+            (Product(sku=f"SKU-{i}", name=f"Product {i}", price=1, category=subcategory) for i in range(cls.ROWS)),
+            batch_size=5000,
+        )
+        orders = Order.objects.bulk_create(
+            (
+                Order(customer_name=f"Customer {i}", customer_email="guest@example.com",
+                      customer_phone=phone, phone_e164=f"+9617{i:07d}", status="confirmed")
+                for i in range(cls.ROWS)
+            ),
+            batch_size=5000,
+        )
+        StockMovement.objects.bulk_create(
+            (StockMovement(product=product, change=1, kind="adjustment") for product in products),
+            batch_size=5000,
+        )
+        carts = Cart.objects.bulk_create(Cart(session_key=f"s{i}") for i in range(cls.ROWS // 100))
+        CartItem.objects.bulk_create(
+            (CartItem(cart=carts[i // 100], product=product) for i, product in enumerate(products)),
+            batch_size=5000,
+        )
+        users = User.objects.bulk_create(
+            (User(username=f"user{i}", email=f"user{i}@example.com") for i in range(cls.ROWS)),
+            batch_size=5000,
+        )
+        UserProfile.objects.bulk_create(
+            (UserProfile(user=user, customer_phone=phone, phone_e164=f"+9613{i:06d}")
+             for i, user in enumerate(users)),
+            batch_size=5000,
+        )
+        cls.order, cls.product = orders[-1], products[-1]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get_changelist(self, model, **params):
+        url = reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.MAX_QUERIES, [query["sql"] for query in queries])
+        return response
+
+    def assert_search_uses_index(self, model, search_term):
+        queryset, _ = admin.site._registry[model].get_search_results(None, model.objects.all(), search_term)
+        self.assertTrue(queryset.exists())
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            self.assertNotRegex(plan, rf"SCAN {model._meta.db_table}\b")
+        elif connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan)
+
+    def test_changelists_run_a_fixed_number_of_queries(self):
+        for model in [Order, Cart, CartItem, Product, StockMovement, UserProfile]:
+            with self.subTest(model=model.__name__):
+                self.get_changelist(model)
+
+    def test_searches_use_indexes(self):
+        searches = [
+            (Order, str(self.order.id)),
+            (Order, self.order.phone_e164[4:]),  # typed without the country code
+            (CartItem, str(self.product.id)),
+            (Product, self.product.sku),
+            (Product, str(self.product.id)),
+            (StockMovement, str(self.product.id)),
+            (UserProfile, "03 000 123"),
+        ]
+        for model, term in searches:
+            with self.subTest(model=model.__name__, q=term):
+                response = self.get_changelist(model, q=term)
+                self.assertContains(response, 'id="searchbar"')
+                self.assertEqual(response.context["cl"].result_count, 1)
+                self.assert_search_uses_index(model, term)
@@ -1,14 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Under ASGI the cart and checkout endpoints can be served by async views
+cart_views = async_views if settings.ASYNC_CHECKOUT else views
 
 urlpatterns = [
     path('', views.cart_view, name='cart_view'),
-    path("add/<int:product_id>/", views.cart_add, name="cart_add"),
+    path("add/<int:product_id>/", cart_views.cart_add, name="cart_add"),
     path("cart/remove/<int:item_id>/", views.cart_remove, name="cart_remove"),
-    path("place/", views.checkout, name="place_order"),
-    path("cart/update-quantity/", views.cart_update_quantity, name="cart_update_quantity"),
+    path("place/", cart_views.checkout, name="place_order"),
+    path("cart/update-quantity/", cart_views.cart_update_quantity, name="cart_update_quantity"),
     path("confirmed/", views.confirmed_orders, name="confirmed_orders"),
+    path("customers/", views.customer_lookup, name="customer_lookup"),
     path("<int:order_id>/return/", views.return_order, name="return_order"),
+    path("<int:order_id>/return-items/", views.return_order_items, name="return_order_items"),
+    path("bulk-status/", views.bulk_order_status, name="bulk_order_status"),
+    path("dispatch/", views.dispatch_sheets, name="dispatch_sheets"),
     path("success/", views.order_success, name="order_success"),
+    path("success/<str:token>/", views.order_success, name="order_placed"),
+    path("mine/", views.my_orders, name="my_orders"),
+    path("export/<str:kind>.csv", views.accounting_export, name="accounting_export"),
 
 ]
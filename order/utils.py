@@ -1,25 +1,155 @@
+import secrets
+
+from django.db import transaction
 from django.db.models import Sum
+from django.shortcuts import redirect
 
-from .models import Cart
+from products.models import StockMovement
+from .models import Cart, Order, OrderItem, OrderStatusEvent
+from .reservations import cart_holds, finish_holds, release_expired, take_stock
 
-def get_or_create_cart(request):
+CHECKOUT_TOKEN_LENGTH = Order._meta.get_field("checkout_token").max_length
+
+def get_cart(request):
+    """
+    Return the visitor's active cart, or None. Never writes to the database
+    or the session, so browsing doesn't create carts or session rows.
+    """
     # Logged-in user
     if request.user.is_authenticated:
-        cart, _ = Cart.objects.get_or_create(
-            user=request.user,
-            is_active=True
-        )
-        return cart
+        return Cart.objects.filter(user=request.user, is_active=True).first()
 
     # Guest user (session-based)
     cart_id = request.session.get("cart_id")
-    cart = None
+    if not cart_id:
+        return None
+    return Cart.objects.filter(id=cart_id, is_active=True).first()
 
-    if cart_id:
-        cart = Cart.objects.filter(id=cart_id, is_active=True).first()
+def get_or_create_cart(request):
+    cart = get_cart(request)
+    if cart:
+        return cart
+
+    if request.user.is_authenticated:
+        return Cart.objects.create(user=request.user, is_active=True)
+
+    cart = Cart.objects.create(is_active=True)
+    request.session["cart_id"] = cart.id
+    return cart
+
+async def aget_cart(request):
+    # Logged-in user
+    user = await request.auser()
+    if user.is_authenticated:
+        return await Cart.objects.filter(user=user, is_active=True).afirst()
+
+    # Guest user (session-based)
+    cart_id = await request.session.aget("cart_id")
+    if not cart_id:
+        return None
+    return await Cart.objects.filter(id=cart_id, is_active=True).afirst()
+
+async def aget_or_create_cart(request):
+    cart = await aget_cart(request)
+    if cart:
+        return cart
 
-    if not cart:
-        cart = Cart.objects.create(is_active=True)
-        request.session["cart_id"] = cart.id
+    user = await request.auser()
+    if user.is_authenticated:
+        return await Cart.objects.acreate(user=user, is_active=True)
 
+    cart = await Cart.objects.acreate(is_active=True)
+    await request.session.aset("cart_id", cart.id)
     return cart
+
+def new_checkout_token():
+    return secrets.token_urlsafe(32)
+
+def posted_checkout_token(request):
+    """
+    The one-time token rendered into the checkout form, or None when it is
+    missing or malformed. Orders are saved with it under a unique
+    constraint, so a retried or double-clicked submit can't place twice.
+    """
+    token = request.POST.get("checkout_token", "")
+    if 0 < len(token) <= CHECKOUT_TOKEN_LENGTH:
+        return token
+    return None
+
+def placed_order(token):
+    """
+    Return the order already placed with `token`, or None.
+    """
+    if not token:
+        return None
+    return Order.objects.filter(checkout_token=token).first()
+
+async def aplaced_order(token):
+    if not token:
+        return None
+    return await Order.objects.filter(checkout_token=token).afirst()
+
+def redirect_to_placed(order):
+    """
+    Redirect to the confirmation page of `order`. Orders placed without a
+    checkout token get the generic one.
+    """
+    if order.checkout_token:
+        return redirect("order_placed", token=order.checkout_token)
+    return redirect("order_success")
+
+
+@transaction.atomic
+def place_order(order, cart):
+    """
+    Save the order, move the cart items into it, decrement stock and
+    close the cart, all in one transaction. Stock held for the cart at
+    checkout is converted as is; anything not held is checked against
+    unreserved stock and raises OutOfStock (rolling everything back).
+    Returns the cart items the order was built from.
+    """
+    items = list(cart.items.select_related("product"))
+    # Expired holds on these products would otherwise still block take_stock
+    release_expired(product_ids=[item.product_id for item in items])
+    holds = cart_holds(cart)
+    # A concurrent submit with the same checkout_token fails here with
+    # IntegrityError, before any stock is touched
+    order.save()
+
+    # ----------------------------
+    # PROCESS ITEMS & STOCK
+    # ----------------------------
+    for item in items:
+        product = item.product
+        take_stock(item, holds)
+
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            quantity=item.quantity,
+            price=product.price,
+        )
+
+        StockMovement.objects.create(
+            product=product,
+            change=-item.quantity,
+            kind="sale",
+            order=order,
+            user=order.user,
+            reason=f"Order #{order.id}",
+        )
+
+    finish_holds(cart, holds)
+    order.update_totals()
+    order.save(update_fields=["subtotal", "item_count"])
+
+    OrderStatusEvent.objects.create(order=order, to_status=order.status, user=order.user)
+
+    # ----------------------------
+    # RESET CART
+    # ----------------------------
+    cart.items.all().delete()
+    cart.is_active = False
+    cart.save(update_fields=["is_active"])
+
+    return items
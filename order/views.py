@@ -1,26 +1,39 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test, login_required
-from django.core.mail import EmailMultiAlternatives
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Sum
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404, redirect
-from django.template.loader import render_to_string
 from django.utils import timezone
-from django.utils.html import strip_tags
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.http import require_POST
+from amhaz.ratelimit import ratelimit
+from customers.utils import get_cached_profile
 from products.models import Product, Category, SubCategory
 from .forms import CheckoutForm
-from .models import Cart, CartItem, Order, OrderItem
-from products.models import StockMovement
-from .utils import get_or_create_cart
-from amhaz import settings
+from .models import ArchivedOrder, CartItem, CustomerStats, Order
+from .emails import send_order_emails_on_commit
+from .archive import archived_orders
+from .customers import customer_lookup as lookup_customer
+from .dispatch import dispatch_plan
+from .fulfillment import InvalidTransition, bulk_transition, return_items
+from .reservations import OutOfStock, held_quantity, release_cart, release_expired, reserve_cart
+from .recommendations import frequently_bought_with
+from .utils import (
+    get_cart, get_or_create_cart, new_checkout_token, place_order, placed_order,
+    posted_checkout_token, redirect_to_placed,
+)
+from .exports import EXPORTS, date_range, day_start, stream_csv
 
 def staff_required(user):
     return user.is_staff
 
 def cart_view(request):
-    cart = get_or_create_cart(request)
+    cart = get_cart(request)
+
+    # Back from checkout: the cart can change again, so drop its stock holds
+    if cart:
+        release_cart(cart)
 
     # filters
     category_id = request.GET.get("category")
@@ -29,8 +42,11 @@ def cart_view(request):
 
     products = Product.objects.all()
 
+    if not request.user.is_staff:
+        products = products.filter(is_visible=True)
+
     if category_id:
-        products = products.filter(category__category_id=category_id)
+        products = products.filter(top_category_id=category_id)
 
     if subcategory_id:
         products = products.filter(category_id=subcategory_id)
@@ -47,9 +63,12 @@ def cart_view(request):
         if category_id else SubCategory.objects.none()
     )
 
+    items = list(cart.items.select_related("product")) if cart else []
+
     context = {
         "cart": cart,
-        "items": cart.items.select_related("product"),
+        "items": items,
+        "recommended": frequently_bought_with(item.product_id for item in items),
         "products": products[:12],
         "categories": categories,
         "subcategories": subcategories,
@@ -59,16 +78,25 @@ def cart_view(request):
     }
     return render(request, "order/cart_view.html", context)
 
+@ratelimit("cart", rate="60/m")
 def cart_add(request, product_id):
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request"}, status=400)
 
     product = get_object_or_404(Product, id=product_id)
 
-    if product.cached_quantity <= 0:
+    # Expired checkout holds count as reserved until they're released
+    if product.reserved_quantity and release_expired(product_ids=[product.id]):
+        product.refresh_from_db(fields=["cached_quantity", "reserved_quantity"])
+
+    # What this cart holds is reserved for it, not for someone else
+    cart = get_cart(request)
+    max_stock = product.available_quantity + held_quantity(cart, product)
+
+    if max_stock <= 0:
         return JsonResponse({"error": "Out of stock"}, status=400)
 
-    cart = get_or_create_cart(request)
+    cart = cart or get_or_create_cart(request)
 
     item, created = CartItem.objects.get_or_create(
         cart=cart,
@@ -76,7 +104,7 @@ def cart_add(request, product_id):
         defaults={"quantity": 1}
     )
 
-    if not created and item.quantity < product.cached_quantity:
+    if not created and item.quantity < max_stock:
         item.quantity += 1
         item.save()
 
@@ -95,10 +123,17 @@ def cart_remove(request, item_id):
     return redirect("cart_view")
 
 def checkout(request):
-    cart = get_or_create_cart(request)
-    items = cart.items.select_related("product")
+    token = posted_checkout_token(request) if request.method == "POST" else None
 
-    if not items.exists():
+    # A retried submit: the first one placed the order and emptied the cart
+    placed = placed_order(token)
+    if placed:
+        return redirect_to_placed(placed)
+
+    cart = get_cart(request)
+    items = cart.items.select_related("product") if cart else None
+
+    if items is None or not items.exists():
         messages.error(request, "Your cart is empty.")
         return redirect("cart_view")
 
@@ -108,162 +143,58 @@ def checkout(request):
             order = form.save(commit=False)
             order.user = request.user if request.user.is_authenticated else None
             order.status = "confirmed"
-            order.save()
+            order.checkout_token = token
 
             return finalize_order(request, order, cart)
 
     else:
+        # Hold the cart's stock while the customer fills in the form
+        try:
+            reserve_cart(cart)
+        except OutOfStock as exc:
+            messages.error(request, str(exc))
+            return redirect("cart_view")
+
         form = CheckoutForm()
 
         if request.user.is_authenticated:
-            profile = getattr(request.user, "profile", None)
-
-            form.fields["customer_name"].widget.attrs["value"] = (
-                request.user.get_full_name() or request.user.username
-            )
-            form.fields["customer_email"].widget.attrs["value"] = request.user.email
-            form.fields["customer_phone"].widget.attrs["value"] = (
-                profile.customer_phone if profile else ""
-            )
-
-            form.initial["district"] = profile.district if profile else ""
-            form.initial["customer_address"] = profile.customer_address if profile else ""
-            form.initial["building_name"] = profile.building_name if profile else ""
-            form.fields["order_type"].widget.attrs["value"] = "delivery"
+            form.prefill(request.user, get_cached_profile(request.user))
 
     return render(request, "order/checkout.html", {
         "form": form,
         "cart": cart,
         "items": items,
+        "checkout_token": token or new_checkout_token(),
     })
 
 @transaction.atomic
 def finalize_order(request, order, cart):
-    items = cart.items.select_related("product")
-    customer_name = order.customer_name
-
-    # ----------------------------
-    # PLAIN TEXT (ADMIN FALLBACK)
-    # ----------------------------
-    message_lines = [
-        f"New Order #{order.id}",
-        f"Type: {order.get_order_type_display()}",
-        "",
-        "Items:",
-    ]
-
-    # ----------------------------
-    # PROCESS ITEMS & STOCK
-    # ----------------------------
-    for item in items:
-        product = item.product
-
-        if product.cached_quantity < item.quantity:
-            messages.error(
-                request,
-                f"Not enough stock for {product.name}"
-            )
-            return redirect("cart_view")
-
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=item.quantity,
-            price=product.price,
-        )
-
-        product.cached_quantity -= item.quantity
-        product.save(update_fields=["cached_quantity"])
-
-        StockMovement.objects.create(
-            product=product,
-            change=-item.quantity,
-            reason=f"Order #{order.id} from {customer_name}",
-        )
-
-        message_lines.append(
-            f"- {product.name} x{item.quantity}"
-        )
-
-    message_lines.extend([
-        "",
-        f"Customer: {customer_name}",
-        f"Phone: {order.customer_phone}",
-        f"Email: {order.customer_email}",
-        f"District: {order.get_district_display()}",
-        f"Address: {order.customer_address}",
-        f"Building: {order.building_name}",
-    ])
-
-    admin_text_body = "\n".join(message_lines)
-
-    # ----------------------------
-    # CUSTOMER EMAIL (HTML)
-    # ----------------------------
-    total_price = sum(item.product.price * item.quantity for item in items)
-    customer_html = render_to_string(
-        "email/order_confirmation.html",
-        {
-            "order": order,
-            "items": items,
-            "total_price": total_price,
-        }
-    )
+    try:
+        items = place_order(order, cart)
+    except OutOfStock as exc:
+        messages.error(request, str(exc))
+        return redirect("cart_view")
+    except IntegrityError:
+        # Same checkout_token submitted twice at once; the other request
+        # placed the order
+        placed = placed_order(order.checkout_token)
+        if placed:
+            return redirect_to_placed(placed)
+        raise
 
-    customer_email = EmailMultiAlternatives(
-        subject=f"Your Order #{order.id} Has Been Received",
-        body=strip_tags(customer_html),
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[order.customer_email],
-    )
-    customer_email.attach_alternative(customer_html, "text/html")
-    customer_email.send(fail_silently=False)
-
-    # ----------------------------
-    # ADMIN EMAIL (HTML)
-    # ----------------------------
-    admin_html = render_to_string(
-        "email/order_admin.html",
-        {
-            "order": order,
-            "items": items,
-            "total_price": total_price,
-        }
-    )
+    send_order_emails_on_commit(order, items)
 
-    admin_email = EmailMultiAlternatives(
-        subject=f"🚨 New Order #{order.id}",
-        body=admin_text_body,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[settings.DEFAULT_FROM_EMAIL],
-    )
-    admin_email.attach_alternative(admin_html, "text/html")
-    admin_email.send(fail_silently=False)
-
-    # ----------------------------
-    # RESET CART
-    # ----------------------------
-    cart.items.all().delete()
-    cart.is_active = False
-    cart.save(update_fields=["is_active"])
-
-    # ----------------------------
-    # CREATE NEW CART
-    # ----------------------------
-    if request.user.is_authenticated:
-        Cart.objects.create(user=request.user)
-    else:
-        new_cart = Cart.objects.create()
-        request.session["cart_id"] = new_cart.id
+    # The cart is now inactive; a new one is created on the next cart_add
 
     messages.success(
         request,
         "Order placed successfully! A confirmation email has been sent."
     )
 
-    return redirect("order_success")
+    return redirect_to_placed(order)
 
 @require_POST
+@ratelimit("cart", rate="60/m")
 def cart_update_quantity(request):
     item_id = request.POST.get("item_id")
     action = request.POST.get("action")
@@ -274,7 +205,7 @@ def cart_update_quantity(request):
     )
 
     product = item.product
-    max_stock = product.cached_quantity
+    max_stock = product.available_quantity + held_quantity(item.cart, product)
 
     if action == "increase":
         # ❌ Do not exceed available stock
@@ -315,63 +246,225 @@ def confirmed_orders(request):
     from_date = request.GET.get("from", today.strftime("%Y-%m-%d"))
     to_date = request.GET.get("to", today.strftime("%Y-%m-%d"))
     order_number = request.GET.get("order_number", "")
+    status = request.GET.get("status", "confirmed")
 
-    orders = Order.objects.filter(status="confirmed")
-
+    # half-open created_at range, so the (status, created_at) index is used
+    filters = {}
+    if status:
+        filters["status"] = status
     if from_date:
-        orders = orders.filter(created_at__date__gte=from_date)
+        filters["created_at__gte"] = day_start(from_date)
     if to_date:
-        orders = orders.filter(created_at__date__lte=to_date)
+        filters["created_at__lt"] = day_start(to_date, days=1)
     if order_number:
-        orders = orders.filter(id=order_number)
+        filters["id"] = order_number
+
+    orders = list(Order.objects.filter(**filters).prefetch_related("items__product").order_by("-created_at"))
+
+    # closed orders older than the archive cutoff live in their own tables
+    archived = archived_orders(**filters)
+    if archived is not None:
+        orders += archived.prefetch_related("items__product").order_by("-created_at")
+        orders.sort(key=lambda order: order.created_at, reverse=True)
+
+    # lifetime counts of the customers on this page, to spot repeat refusers
+    stats = CustomerStats.objects.in_bulk({order.phone_e164 for order in orders if order.phone_e164})
+    for order in orders:
+        order.customer_stats = stats.get(order.phone_e164)
 
     context = {
-        "orders": orders.order_by("-created_at"),
+        "orders": orders,
         "from_date": from_date,
         "to_date": to_date,
         "order_number": order_number,
+        "status": status,
+        "status_choices": Order.STATUS_CHOICES,
+        "bulk_statuses": ["dispatched", "delivered", "returned"],
+        "returnable_statuses": Order.RETURNABLE_STATUSES,
     }
     return render(request, "order/confirmed_orders.html", context)
 
 @login_required
 @user_passes_test(staff_required)
+def customer_lookup(request):
+    """
+    Every order and account for a phone number or an email.
+    """
+    query = request.GET.get("q", "").strip()
+    context = lookup_customer(query) if query else {}
+    context["search"] = query
+    return render(request, "order/customer_lookup.html", context)
+
+@login_required
+@user_passes_test(staff_required)
+@require_POST
 def return_order(request, order_id):
     """
-    Return/discard an order:
-    - Re-add all items to stock
-    - Log stock movement
+    Return/discard a whole order:
+    - Re-add all items still out to stock
+    - Log stock movements
     - Mark order as returned
     """
+    order = get_object_or_404(Order, id=order_id, status__in=Order.RETURNABLE_STATUSES)
 
-    order = get_object_or_404(Order, id=order_id, status="confirmed")
+    bulk_transition([order.id], "returned", user=request.user)
 
-    order_items = order.items.select_related("product")
+    messages.success(request, f"Order #{order.id} returned successfully.")
 
-    for item in order_items:
-        product = item.product
-        quantity = item.quantity
+    return redirect("confirmed_orders")
 
-        # ✅ Re-add stock
-        product.cached_quantity += quantity
-        product.save(update_fields=["cached_quantity"])
+@login_required
+@user_passes_test(staff_required)
+@require_POST
+def bulk_order_status(request):
+    """
+    Move all selected orders to one status in a single transaction.
+    """
+    order_ids = [pk for pk in request.POST.getlist("order_ids") if pk.isdigit()]
+    status = request.POST.get("status")
 
-        # ✅ Stock movement log
-        StockMovement.objects.create(
-            product=product,
-            change=quantity,
-            reason=f"Order #{order.id} returned"
+    try:
+        changed = bulk_transition(order_ids, status, user=request.user)
+    except InvalidTransition as exc:
+        messages.error(request, str(exc))
+    else:
+        skipped = len(order_ids) - len(changed)
+        messages.success(
+            request,
+            f"{len(changed)} order(s) marked as {status}."
+            + (f" {skipped} skipped (status doesn't allow it)." if skipped else "")
         )
 
-    # ✅ Mark order as returned
-    order.status = "returned"
-    order.save(update_fields=["status"])
+    return redirect("confirmed_orders")
 
-    messages.success(request, f"Order #{order.id} returned successfully.")
+@login_required
+@user_passes_test(staff_required)
+def return_order_items(request, order_id):
+    order = get_object_or_404(Order, id=order_id, status__in=Order.RETURNABLE_STATUSES)
+    items = order.items.select_related("product")
 
-    return redirect("confirmed_orders")
+    if request.method == "POST":
+        quantities = {}
+        for item in items:
+            value = request.POST.get(f"return_{item.id}", "").strip()
+            if value.isdigit() and int(value) > 0:
+                quantities[item.id] = int(value)
+
+        try:
+            returned = return_items(order, quantities, user=request.user)
+        except InvalidTransition as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, f"{returned} item(s) of order #{order.id} returned to stock.")
+        return redirect("confirmed_orders")
+
+    return render(request, "order/return_items.html", {
+        "order": order,
+        "items": items,
+    })
+
+@login_required
+@user_passes_test(staff_required)
+def accounting_export(request, kind):
+    """
+    Stream orders (one line per item) or stock movements as CSV
+    for the ?from=&to= date range (inclusive, defaults to today).
+    """
+    if kind not in EXPORTS:
+        return HttpResponseBadRequest("Unknown export")
+
+    today = timezone.localdate().strftime("%Y-%m-%d")
+    from_date = request.GET.get("from") or today
+    to_date = request.GET.get("to") or today
+
+    try:
+        start, end = date_range(from_date, to_date)
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD")
+
+    response = StreamingHttpResponse(
+        stream_csv(kind, start, end),
+        content_type="text/csv",
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{kind}_{from_date}_{to_date}.csv"'
+    )
+    return response
 
-def order_success(request):
-    return render(request, "order/success.html")
+@login_required
+@user_passes_test(staff_required)
+def dispatch_sheets(request):
+    """
+    Printable per-district courier manifests for confirmed COD orders.
+    """
+    today = timezone.localdate().strftime("%Y-%m-%d")
+    from_date = request.GET.get("from") or today
+    to_date = request.GET.get("to") or today
+
+    try:
+        start, end = date_range(from_date, to_date)
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD")
+
+    districts = dispatch_plan(start, end)
+
+    return render(request, "order/dispatch.html", {
+        "districts": districts,
+        "from_date": from_date,
+        "to_date": to_date,
+        "total_orders": sum(d["order_count"] for d in districts),
+        "total_cash": sum(d["cash_to_collect"] for d in districts),
+    })
+
+MY_ORDERS_PAGE_SIZE = 10
+
+@login_required
+def my_orders(request):
+    """
+    The logged-in customer's orders, newest first, archived ones included.
+    Keyset pagination on (created_at, id) keeps every page an index range
+    scan on (user, created_at) in both tables; ids are shared, so the two
+    pages merge into one.
+    """
+    keyset = Q()
+    cursor = request.GET.get("before", "")
+    created_at, _, order_id = cursor.rpartition("_")
+    created_at = parse_datetime(created_at) if created_at else None
+    if created_at and order_id.isdigit():
+        keyset = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+
+    page = sorted(
+        (
+            order
+            for model in (Order, ArchivedOrder)
+            for order in model.objects.filter(keyset, user=request.user)
+            .order_by("-created_at", "-id")
+            .prefetch_related("items__product")[:MY_ORDERS_PAGE_SIZE + 1]
+        ),
+        key=lambda order: (order.created_at, order.id),
+        reverse=True,
+    )[:MY_ORDERS_PAGE_SIZE + 1]
+    next_cursor = None
+    if len(page) > MY_ORDERS_PAGE_SIZE:
+        page = page[:MY_ORDERS_PAGE_SIZE]
+        last = page[-1]
+        next_cursor = f"{last.created_at.isoformat()}_{last.id}"
+
+    return render(request, "order/my_orders.html", {
+        "orders": page,
+        "next_cursor": next_cursor,
+        "is_first_page": not cursor,
+    })
+
+def order_success(request, token=None):
+    """
+    Confirmation page. With a checkout token it shows that order: the
+    token is only known to the browser that submitted the checkout form.
+    """
+    order = None
+    if token:
+        order = get_object_or_404(Order, checkout_token=token)
+    return render(request, "order/success.html", {"order": order})
 
 
 
@@ -1,7 +1,52 @@
 from django.contrib import admin
+
+from amhaz.admin import IndexedSearchMixin
 from .models import Product, Category, StockMovement, SubCategory
 
-admin.site.register(Product)
-admin.site.register(Category)
-admin.site.register(StockMovement)
-admin.site.register(SubCategory)
\ No newline at end of file
+# Products and stock movements are searched by exact id or sku only
+# (IndexedSearchMixin); categories are small enough for a name prefix
+# search. show_full_result_count=False skips the extra unfiltered COUNT(*)
+# per page.
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "is_active")
+    list_filter = ("is_active",)
+    search_fields = ("^name",)
+
+
+@admin.register(SubCategory)
+class SubCategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "category", "is_active")
+    list_filter = ("is_active",)
+    list_select_related = ("category",)
+    autocomplete_fields = ("category",)
+    search_fields = ("^name",)
+
+
+@admin.register(Product)
+class ProductAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("name", "sku", "category", "price", "cached_quantity", "reserved_quantity", "is_active", "is_visible")
+    list_filter = ("is_active",)
+    list_select_related = ("category",)
+    autocomplete_fields = ("category",)
+    search_exact = ("sku",)
+    search_ids = ("id",)
+    search_help_text = "Product id or sku"
+    readonly_fields = ("reserved_quantity",)
+    ordering = ("name",)
+    show_full_result_count = False
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("product", "change", "kind", "order", "reason", "created_at")
+    list_filter = ("kind",)
+    list_select_related = ("product", "order")
+    raw_id_fields = ("product", "order", "user")
+    date_hierarchy = "created_at"
+    search_ids = ("product_id", "order_id")
+    search_help_text = "Product or order id"
+    ordering = ("-id",)
+    show_full_result_count = False
@@ -0,0 +1,22 @@
+from amhaz.archive import archive_in_batches
+from .models import ArchivedStockMovement, StockMovement
+
+
+def archive_movements(cutoff, batch_size=1000):
+    """
+    Move stock movements created before `cutoff` to the archive table.
+    """
+    return archive_in_batches(
+        StockMovement.objects.filter(created_at__lt=cutoff),
+        ArchivedStockMovement,
+        batch_size=batch_size,
+    )
+
+
+def archived_movements(**filters):
+    """
+    Archived movements matching `filters`, or None when the range doesn't
+    reach into the archive (one indexed EXISTS).
+    """
+    movements = ArchivedStockMovement.objects.filter(**filters)
+    return movements if movements.exists() else None
@@ -0,0 +1,66 @@
+import csv
+import json
+from itertools import islice
+
+# Column order shared by import_catalog and export_catalog
+CATALOG_COLUMNS = [
+    "sku",
+    "name",
+    "description",
+    "price",
+    "quantity",
+    "category",
+    "subcategory",
+    "is_active",
+]
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def read_rows(fh, fmt):
+    """
+    Yield one dict per catalog row without loading the file in memory.
+    """
+    if fmt == "jsonl":
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(fh)
+
+
+def write_rows(fh, fmt, rows):
+    """
+    Write tuples ordered like CATALOG_COLUMNS, one at a time.
+    """
+    if fmt == "jsonl":
+        for row in rows:
+            fh.write(json.dumps(dict(zip(CATALOG_COLUMNS, row)), ensure_ascii=False, default=str))
+            fh.write("\n")
+    else:
+        writer = csv.writer(fh)
+        writer.writerow(CATALOG_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_bool(value, default=True):
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
@@ -1,23 +1,35 @@
-from .models import Category
-from order.utils import get_or_create_cart
-from django.db.models import Sum
+from .models import Category, SubCategory
+from amhaz.cache import get_or_build
+from order.utils import get_cart
+from django.db.models import Prefetch, Sum
 
-def navbar_data(request):
-    # Only active categories
+def build_navbar_tree():
+    # Only active categories, each with only its active subcategories
     categories = Category.objects.filter(is_active=True).prefetch_related(
-        'subcategory_set'
+        Prefetch(
+            'subcategory_set',
+            queryset=SubCategory.objects.filter(is_active=True),
+            to_attr='active_subcategories',
+        )
     )
+    return [
+        {
+            "name": category.name,
+            "active_subcategories": [
+                {"id": sub.id, "name": sub.name} for sub in category.active_subcategories
+            ],
+        }
+        for category in categories
+    ]
 
-    # For each category, only include active subcategories
-    for category in categories:
-        category.active_subcategories = category.subcategory_set.filter(is_active=True)
-
+def navbar_data(request):
     return {
-        "nav_categories": categories
+        "nav_categories": get_or_build("catalog", ["navbar"], build_navbar_tree)
     }
 
 def cart_context(request):
-    cart = get_or_create_cart(request)
+    # Don't create a cart (and a session) just to render the navbar
+    cart = get_cart(request)
 
     total_items = 0
     if cart:
@@ -0,0 +1,206 @@
+"""
+Faceted product search: filters and per-facet counts for the search page.
+
+All counts come from one GROUP BY query over the products matching the
+search text, grouped by (category, subcategory) with a conditional count
+per price bucket, each overall and in stock. Every facet's counts apply
+the other selected filters but not its own (picking a price bucket still
+shows how many products the other buckets hold), which the grouped rows
+allow without a COUNT query per facet value. The rows are cached per
+search text in the "search" namespace, dropped on any catalog change.
+"""
+import hashlib
+from decimal import Decimal
+
+from django.db.models import Count, F, Q
+
+from amhaz.cache import get_or_build
+
+FACETS_TIMEOUT = 60  # stock counts also change on every order, which doesn't invalidate
+
+# (key, label, lower bound included, upper bound excluded)
+PRICE_BUCKETS = [
+    ("0-25", "Under $25", None, Decimal("25")),
+    ("25-50", "$25 to $50", Decimal("25"), Decimal("50")),
+    ("50-100", "$50 to $100", Decimal("50"), Decimal("100")),
+    ("100-250", "$100 to $250", Decimal("100"), Decimal("250")),
+    ("250+", "$250 and up", Decimal("250"), None),
+]
+PRICE_BUCKET_KEYS = [key for key, _, _, _ in PRICE_BUCKETS]
+
+# Stock held by open checkouts can't be bought, like Product.available_quantity
+IN_STOCK = Q(cached_quantity__gt=F("reserved_quantity"))
+
+
+def _int(value):
+    return int(value) if value and value.isdigit() else None
+
+
+def parse_filters(params):
+    """
+    Read the search filters from a QueryDict; unknown or malformed values are ignored.
+    """
+    price = params.get("price")
+    return {
+        "q": params.get("q", "").strip(),
+        "category": _int(params.get("category")),
+        "subcategory": _int(params.get("subcategory")),
+        "price": price if price in PRICE_BUCKET_KEYS else None,
+        "in_stock": params.get("in_stock") == "1",
+    }
+
+
+def price_q(key):
+    _, _, low, high = PRICE_BUCKETS[PRICE_BUCKET_KEYS.index(key)]
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def price_column(key):
+    # Bucket keys like "0-25" aren't valid column aliases
+    return f"price{PRICE_BUCKET_KEYS.index(key)}"
+
+
+def search_products(products, filters):
+    """
+    Narrow `products` to the search text only; facets are counted on this.
+    """
+    if filters["q"]:
+        products = products.filter(name__icontains=filters["q"])
+    return products
+
+
+def filter_products(products, filters):
+    """
+    Apply every selected filter, for the result list.
+    """
+    products = search_products(products, filters)
+    if filters["category"]:
+        products = products.filter(top_category_id=filters["category"])
+    if filters["subcategory"]:
+        products = products.filter(category_id=filters["subcategory"])
+    if filters["price"]:
+        products = products.filter(price_q(filters["price"]))
+    if filters["in_stock"]:
+        products = products.filter(IN_STOCK)
+    return products
+
+
+def facet_rows(products):
+    """
+    One row per (category, subcategory) with the number of products overall
+    ("all") and per price bucket ("price0"...), each also counted in stock
+    ("all_stock", "price0_stock"...).
+    """
+    counts = {"all": Count("id"), "all_stock": Count("id", filter=IN_STOCK)}
+    for key in PRICE_BUCKET_KEYS:
+        counts[price_column(key)] = Count("id", filter=price_q(key))
+        counts[f"{price_column(key)}_stock"] = Count("id", filter=price_q(key) & IN_STOCK)
+
+    return list(
+        products.order_by()
+        .values("top_category_id", "top_category__name", "category_id", "category__name")
+        .annotate(**counts)
+        .order_by("top_category__name", "category__name")
+    )
+
+
+def cached_facet_rows(products, filters, scope):
+    """
+    facet_rows() of the products matching the search text, cached per
+    `scope` (who is searching) and search text.
+    """
+    digest = hashlib.md5(filters["q"].lower().encode()).hexdigest()
+    return get_or_build(
+        "search", ["facets", scope, digest],
+        lambda: facet_rows(search_products(products, filters)),
+        timeout=FACETS_TIMEOUT,
+    )
+
+
+def facet_counts(rows, filters):
+    """
+    Turn the grouped rows into the facets shown next to the results:
+    {"total", "categories", "subcategories", "prices", "in_stock"}.
+    Each facet counts with every selected filter but its own.
+    """
+    def column(price=None, in_stock=filters["in_stock"]):
+        name = price_column(price) if price else "all"
+        return f"{name}_stock" if in_stock else name
+
+    def in_category(row):
+        return not filters["category"] or row["top_category_id"] == filters["category"]
+
+    def in_subcategory(row):
+        return not filters["subcategory"] or row["category_id"] == filters["subcategory"]
+
+    selected = column(filters["price"])
+
+    categories = {}
+    for row in rows:
+        if row["top_category_id"] is None:
+            continue
+        category = categories.setdefault(row["top_category_id"], {
+            "id": row["top_category_id"], "name": row["top_category__name"], "count": 0,
+        })
+        category["count"] += row[selected]
+
+    subcategories = [
+        {"id": row["category_id"], "name": row["category__name"], "count": row[selected]}
+        for row in rows
+        if filters["category"] and in_category(row)
+    ]
+
+    matching = [row for row in rows if in_category(row) and in_subcategory(row)]
+    return {
+        "total": sum(row[selected] for row in matching),
+        "categories": list(categories.values()),
+        "subcategories": subcategories,
+        "prices": [
+            {"key": key, "label": label, "count": sum(row[column(key)] for row in matching)}
+            for key, label, _, _ in PRICE_BUCKETS
+        ],
+        "in_stock": sum(row[column(filters["price"], in_stock=True)] for row in matching),
+    }
+
+
+def facet_query(params, **changes):
+    """
+    The query string of `params` with `changes` applied (None removes a
+    key). Any change sends the visitor back to the first page.
+    """
+    params = params.copy()
+    params.pop("page", None)
+    for key, value in changes.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = value
+    return params.urlencode()
+
+
+def facet_links(facets, params, filters):
+    """
+    Mark the selected facet options and give each one the query string that
+    toggles it.
+    """
+    for category in facets["categories"]:
+        category["selected"] = category["id"] == filters["category"]
+        category["query"] = facet_query(
+            params, category=None if category["selected"] else category["id"], subcategory=None
+        )
+    for subcategory in facets["subcategories"]:
+        subcategory["selected"] = subcategory["id"] == filters["subcategory"]
+        subcategory["query"] = facet_query(
+            params, subcategory=None if subcategory["selected"] else subcategory["id"]
+        )
+    for price in facets["prices"]:
+        price["selected"] = price["key"] == filters["price"]
+        price["query"] = facet_query(params, price=None if price["selected"] else price["key"])
+    facets["in_stock_query"] = facet_query(params, in_stock=None if filters["in_stock"] else "1")
+    facets["clear_query"] = facet_query(params, category=None, subcategory=None, price=None, in_stock=None)
+    return facets
@@ -0,0 +1,92 @@
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DemandForecast, Product, StockMovement
+
+def day_start(day):
+    """
+    Local midnight at the start of `day`, as an aware datetime.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def daily_sales(start, end):
+    """
+    Units sold per product per day in [start, end), as {product_id: {date: units}}.
+    Summed from "sale" stock movements by the database in one GROUP BY
+    over the (kind, created_at) index.
+    """
+    sales = defaultdict(dict)
+    for product_id, day, units in (
+        StockMovement.objects.filter(kind="sale", created_at__gte=start, created_at__lt=end)
+        .annotate(day=TruncDate("created_at"))
+        .values_list("product_id", "day")
+        .annotate(units=-Sum("change"))
+        .order_by()
+    ):
+        sales[product_id][day] = units
+    return sales
+
+
+def smoothed_rate(series, alpha):
+    """
+    Exponentially smoothed units per day over `series` (oldest first),
+    seeded with the series mean so a single early spike doesn't dominate.
+    """
+    rate = sum(series) / len(series)
+    for units in series:
+        rate = alpha * units + (1 - alpha) * rate
+    return rate
+
+
+def forecast(days=56, alpha=0.3, lead_days=7, cover_days=14):
+    """
+    Demand forecasts for every product that sold in the last `days` whole
+    days, up to yesterday: today's sales are still coming in, and a
+    near-empty last day would drag the smoothed rate down.
+    A product should be reordered up to `lead_days + cover_days` of demand.
+    Returns unsaved DemandForecast objects.
+    """
+    now = timezone.now()
+    today = timezone.localdate(now)
+    dates = [today - timedelta(days=offset) for offset in range(days, 0, -1)]
+    sales = daily_sales(day_start(dates[0]), day_start(today))
+
+    stock = dict(
+        Product.objects.filter(id__in=sales)
+        .values_list("id", "cached_quantity")
+    )
+
+    forecasts = []
+    for product_id, per_day in sales.items():
+        if product_id not in stock:
+            continue
+        rate = smoothed_rate([per_day.get(day, 0) for day in dates], alpha)
+        on_hand = stock[product_id]
+        target = math.ceil(rate * (lead_days + cover_days))
+        forecasts.append(DemandForecast(
+            product_id=product_id,
+            daily_demand=Decimal(rate).quantize(Decimal("0.01")),
+            days_of_cover=Decimal(on_hand / rate).quantize(Decimal("0.1")) if rate else None,
+            reorder_quantity=max(target - on_hand, 0),
+            computed_at=now,
+        ))
+    return forecasts
+
+
+@transaction.atomic
+def refresh_forecasts(**options):
+    """
+    Replace the stored forecasts. Returns how many were written.
+    """
+    forecasts = forecast(**options)
+    DemandForecast.objects.all().delete()
+    DemandForecast.objects.bulk_create(forecasts, batch_size=1000)
+    return len(forecasts)
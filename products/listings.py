@@ -0,0 +1,51 @@
+"""
+Cached subcategory listings.
+
+Every listing is cached in its own group of the catalog namespace, so a
+stock change drops only the listing of the product's subcategory, not
+the navbar and every other listing.
+"""
+from django.db import transaction
+
+from amhaz.cache import get_or_build, invalidate_group
+from .models import Product
+
+
+def _group(sub_id):
+    return f"subcategory:{sub_id}"
+
+
+def build_subcategory_products(sub_id):
+    return list(Product.objects.filter(category_id=sub_id, is_visible=True))
+
+
+def subcategory_products(sub_id):
+    """
+    The visible products of a subcategory, shared by every customer.
+    """
+    return get_or_build(
+        "catalog", ["subcategory", sub_id], lambda: build_subcategory_products(sub_id), group=_group(sub_id)
+    )
+
+
+def invalidate_subcategories(sub_ids):
+    """
+    Drop the cached listings of `sub_ids` once the current transaction
+    commits; before that, a rebuild would cache the old stock again.
+    """
+    sub_ids = set(sub_ids)
+
+    def bump():
+        for sub_id in sub_ids:
+            invalidate_group("catalog", _group(sub_id))
+
+    transaction.on_commit(bump)
+
+
+def invalidate_listings(product_ids):
+    """
+    Drop the cached listings showing any of `product_ids`.
+    """
+    invalidate_subcategories(
+        Product.objects.filter(id__in=list(product_ids)).values_list("category_id", flat=True).distinct()
+    )
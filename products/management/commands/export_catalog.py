@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.catalog import detect_format, write_rows
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Export the catalog as CSV or JSONL, in the format read by import_catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", "-o", help="File to write (defaults to stdout)")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = detect_format(output or "", options["format"])
+
+        rows = (
+            Product.objects.order_by("id")
+            .values_list(
+                "sku",
+                "name",
+                "description",
+                "price",
+                "cached_quantity",
+                "category__category__name",
+                "category__name",
+                "is_active",
+            )
+            .iterator(chunk_size=options["chunk_size"])
+        )
+
+        if output:
+            with open(output, "w", newline="", encoding="utf-8") as fh:
+                write_rows(fh, fmt, rows)
+        else:
+            write_rows(sys.stdout, fmt, rows)
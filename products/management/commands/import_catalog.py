@@ -0,0 +1,271 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from amhaz.cache import invalidate
+from products.catalog import chunked, detect_format, parse_bool, read_rows
+from products.models import Category, SubCategory, Product, StockMovement
+from products.visibility import refresh_visibility
+
+CENTS = Decimal("0.01")
+UPDATE_FIELDS = ["name", "description", "price", "cached_quantity", "category", "is_active"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV or JSONL file. Rows are matched on `sku`, or on "
+        "(subcategory, name) when the sku is blank or unknown, upserted in chunks "
+        "and every stock difference is logged as a StockMovement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file to import")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--reason", default="Catalog import", help="StockMovement reason")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would change (use -v 2 for a per-product diff)",
+        )
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options["path"], options["format"])
+        self.dry_run = options["dry_run"]
+        self.verbosity = options["verbosity"]
+        self.reason = options["reason"][:100]
+        self.stats = dict(created=0, updated=0, unchanged=0, skipped=0, movements=0, new_subcategories=0)
+        self.load_category_map()
+
+        try:
+            fh = open(options["path"], newline="", encoding="utf-8")
+        except OSError as exc:
+            raise CommandError(exc)
+
+        with fh:
+            rows = read_rows(fh, fmt)
+            for chunk in chunked(rows, options["chunk_size"]):
+                if self.dry_run:
+                    self.process_chunk(chunk)
+                else:
+                    with transaction.atomic():
+                        self.process_chunk(chunk)
+
+        if not self.dry_run:
+            # bulk_create skips model signals
+            invalidate("catalog", "search")
+
+        prefix = "[dry-run] " if self.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}created={self.stats['created']} updated={self.stats['updated']} "
+            f"unchanged={self.stats['unchanged']} skipped={self.stats['skipped']} "
+            f"stock_movements={self.stats['movements']} "
+            f"new_subcategories={self.stats['new_subcategories']}"
+        ))
+
+    # ----------------------------
+    # CATEGORY MAP
+    # ----------------------------
+    def load_category_map(self):
+        self.categories = {
+            name.lower(): pk for pk, name in Category.objects.values_list("id", "name")
+        }
+        self.subcategories = {
+            (category_name.lower(), name.lower()): pk
+            for pk, name, category_name in SubCategory.objects.values_list(
+                "id", "name", "category__name"
+            )
+        }
+
+    def resolve_subcategory(self, category_name, subcategory_name):
+        key = (category_name.lower(), subcategory_name.lower())
+        if key in self.subcategories:
+            return self.subcategories[key]
+
+        self.stats["new_subcategories"] += 1
+        if self.dry_run:
+            # Remember it so the same pair is only counted once
+            self.subcategories[key] = None
+            return None
+
+        category_id = self.categories.get(key[0])
+        if category_id is None:
+            category_id = Category.objects.create(name=category_name).id
+            self.categories[key[0]] = category_id
+
+        subcategory = SubCategory.objects.create(name=subcategory_name, category_id=category_id)
+        self.subcategories[key] = subcategory.id
+        return subcategory.id
+
+    # ----------------------------
+    # ROWS
+    # ----------------------------
+    def parse_row(self, row):
+        sku = (row.get("sku") or "").strip()
+        name = (row.get("name") or "").strip()
+        category = (row.get("category") or "").strip()
+        subcategory = (row.get("subcategory") or "").strip()
+        if not (name and category and subcategory):
+            raise ValueError("name, category and subcategory are required")
+
+        quantity = row.get("quantity")
+        return {
+            "sku": sku or None,
+            "name": name[:100],
+            "description": row.get("description") or "",
+            "price": Decimal(row.get("price") or 0).quantize(CENTS),
+            "quantity": None if quantity in (None, "") else max(int(quantity), 0),
+            "category": category,
+            "subcategory": subcategory,
+            "is_active": parse_bool(row.get("is_active")),
+        }
+
+    def match_existing(self, parsed):
+        """
+        Map each row key to the product it updates: by sku first, then by
+        (subcategory, name) for rows without a known sku. A product that
+        already has a different sku is never taken over by name; with
+        duplicate names in a subcategory the oldest product is used.
+        """
+        columns = ("id", "sku", "name", "description", "price", "cached_quantity", "category_id", "is_active")
+        skus = [data["sku"] for data in parsed.values() if data["sku"]]
+        by_sku = {
+            row[1]: row for row in Product.objects.filter(sku__in=skus).values_list(*columns)
+        }
+
+        matched = {}
+        by_name = []
+        for key, data in parsed.items():
+            if data["sku"] in by_sku:
+                matched[key] = by_sku[data["sku"]]
+            elif data["category_id"] is not None:
+                by_name.append(key)
+
+        candidates = defaultdict(list)
+        for with_sku in (True, False):
+            keys = [key for key in by_name if bool(parsed[key]["sku"]) == with_sku]
+            if not keys:
+                continue
+            products = Product.objects.filter(
+                category_id__in={parsed[key]["category_id"] for key in keys},
+                name__in={parsed[key]["name"] for key in keys},
+            )
+            if with_sku:
+                # Only products without a sku can adopt one; once the catalog
+                # has skus this lookup is an index probe that finds nothing
+                products = products.filter(sku=None)
+            for row in products.order_by("id").values_list(*columns):
+                candidates[(row[6], row[2])].append(row)
+
+        taken = {row[0] for row in matched.values()}
+        for key in by_name:
+            data = parsed[key]
+            for row in candidates[(data["category_id"], data["name"])]:
+                if row[0] not in taken and (row[1] is None or data["sku"] is None):
+                    matched[key] = row
+                    taken.add(row[0])
+                    break
+        return matched
+
+    def process_chunk(self, chunk):
+        parsed = {}
+        for row in chunk:
+            try:
+                data = self.parse_row(row)
+            except (TypeError, ValueError, InvalidOperation) as exc:
+                self.stats["skipped"] += 1
+                self.stderr.write(f"Skipping row {row!r}: {exc}")
+                continue
+            data["category_id"] = self.resolve_subcategory(data["category"], data["subcategory"])
+            # Last row wins when a product is repeated inside a chunk
+            key = data["sku"] or (data["category"].lower(), data["subcategory"].lower(), data["name"])
+            parsed[key] = data
+
+        if not parsed:
+            return
+
+        existing = self.match_existing(parsed)
+
+        created, updated = [], []
+        deltas = []
+        for key, data in parsed.items():
+            current = existing.get(key)
+            label = data["sku"] or data["name"]
+            old_quantity = current[5] if current else 0
+            quantity = old_quantity if data["quantity"] is None else data["quantity"]
+
+            product = Product(
+                sku=data["sku"] or (current[1] if current else None),
+                name=data["name"],
+                description=data["description"],
+                price=data["price"],
+                cached_quantity=quantity,
+                category_id=data["category_id"],
+                is_active=data["is_active"],
+            )
+            new_values = (
+                product.sku, data["name"], data["description"], data["price"],
+                quantity, data["category_id"], data["is_active"],
+            )
+            if current is None:
+                self.stats["created"] += 1
+                self.log_diff(f"+ {label} (qty {quantity})")
+                created.append(product)
+            elif current[1:] != new_values:
+                product.id = current[0]
+                updated.append(product)
+                self.stats["updated"] += 1
+                changes = [
+                    f"{field}: {old!r} -> {new!r}"
+                    for field, old, new in zip(["sku"] + UPDATE_FIELDS, current[1:], new_values)
+                    if old != new
+                ]
+                self.log_diff(f"~ {label} " + ", ".join(changes))
+            else:
+                # Unchanged rows aren't written at all
+                self.stats["unchanged"] += 1
+
+            if quantity != old_quantity:
+                deltas.append((product, quantity - old_quantity))
+
+        self.stats["movements"] += len(deltas)
+        if self.dry_run:
+            return
+
+        # Both backends used here return the new primary keys from bulk_create
+        Product.objects.bulk_create(created)
+        self.update_products(updated)
+        # bulk writes skip the pre_save signal that fills the denormalized columns
+        refresh_visibility(Product.objects.filter(id__in=[product.id for product in created + updated]))
+
+        StockMovement.objects.bulk_create([
+            StockMovement(product_id=product.id, change=change, kind="adjustment", reason=self.reason)
+            for product, change in deltas
+        ])
+
+    def update_products(self, products):
+        """
+        Write ["sku"] + UPDATE_FIELDS of `products` with one parameterized
+        UPDATE run per row. bulk_update() builds a CASE expression per field
+        and row, which spends minutes in query compilation on a full catalog.
+        """
+        if not products:
+            return
+        fields = [Product._meta.get_field(name) for name in ["sku"] + UPDATE_FIELDS]
+        sql = "UPDATE {} SET {} WHERE {} = %s".format(
+            connection.ops.quote_name(Product._meta.db_table),
+            ", ".join(f"{connection.ops.quote_name(field.column)} = %s" for field in fields),
+            connection.ops.quote_name(Product._meta.pk.column),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields]
+                + [product.id]
+                for product in products
+            ])
+
+    def log_diff(self, line):
+        if self.verbosity >= 2:
+            self.stdout.write(line)
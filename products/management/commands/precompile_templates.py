@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from amhaz.templating import precompile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile every template and report the ones that don't compile. "
+        "Gunicorn workers run the same step at boot (gunicorn.conf.py)."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        compiled, errors = precompile()
+        seconds = time.perf_counter() - start
+
+        if options["verbosity"] >= 2:
+            for name in compiled:
+                self.stdout.write(f"  compiled {name}")
+        for name, error in errors.items():
+            self.stderr.write(f"  failed {name}: {error}")
+
+        if errors:
+            raise CommandError(f"{len(errors)} templates don't compile")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled {len(compiled)} templates in {seconds * 1000:.0f}ms"
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from amhaz.templating import precompile, profile_renders, reset_template_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Render a page repeatedly, with templates compiled on every request "
+        "and with the compiled-template cache, and show the time spent per template."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="URL path of the page, e.g. /subcategory/3/")
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per run")
+        parser.add_argument("--user", help="Username to render the page as")
+
+    def handle(self, *args, **options):
+        client = Client()
+        if options["user"]:
+            user = get_user_model().objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']}")
+            client.force_login(user)
+
+        # Rate limits would turn repeated requests into 429s
+        with override_settings(ALLOWED_HOSTS=["testserver"], RATELIMIT_ENABLED=False):
+            # First request fills the data caches, so both runs only differ in templates
+            response = client.get(options["path"])
+            if response.status_code != 200:
+                raise CommandError(f"{options['path']} returned {response.status_code}")
+
+            uncached, _ = self.run(client, options["path"], options["repeat"], reset=True)
+            precompile()
+            cached, profile = self.run(client, options["path"], options["repeat"], reset=False)
+
+        repeat = options["repeat"]
+        self.stdout.write(f"{'own ms':>9} {'total ms':>9} {'calls':>6}  template (per request, cached)")
+        for name, calls, total, own in profile.rows():
+            self.stdout.write(f"{own / repeat:9.2f} {total / repeat:9.2f} {calls / repeat:6.0f}  {name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['path']}: {uncached:.1f}ms per request compiling templates, "
+            f"{cached:.1f}ms with compiled templates ({repeat} requests each)"
+        ))
+
+    def run(self, client, path, repeat, reset):
+        """
+        Average request time in ms, and the render profile of all requests.
+        """
+        elapsed = 0.0
+        with profile_renders() as profile:
+            for _ in range(repeat):
+                if reset:
+                    reset_template_cache()
+                start = time.perf_counter()
+                client.get(path)
+                elapsed += time.perf_counter() - start
+        return elapsed * 1000 / repeat, profile
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.forecasting import refresh_forecasts
+
+
+class Command(BaseCommand):
+    help = "Rebuild demand forecasts and reorder suggestions from recent sales. Run it nightly from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=56, help="Days of sales history to read")
+        parser.add_argument("--alpha", type=float, default=0.3, help="Smoothing factor, higher follows recent days more")
+        parser.add_argument("--lead-days", type=int, default=7, help="Days a supplier takes to deliver")
+        parser.add_argument("--cover-days", type=int, default=14, help="Days of demand a reorder should cover")
+
+    def handle(self, *args, **options):
+        written = refresh_forecasts(
+            days=options["days"],
+            alpha=options["alpha"],
+            lead_days=options["lead_days"],
+            cover_days=options["cover_days"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} forecasts"))
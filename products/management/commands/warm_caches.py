@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from products.warmup import warm, warm_tasks
+
+
+class Command(BaseCommand):
+    help = "Prime the shared caches (navbar, busiest subcategory pages) after a deploy or restart."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Number of subcategory pages to build")
+        parser.add_argument("--workers", type=int, default=4, help="Threads building in parallel")
+        parser.add_argument("--budget", type=float, default=30, help="Seconds to spend at most")
+
+    def handle(self, *args, **options):
+        warmed, failed, skipped, seconds = warm(
+            warm_tasks(top=options["top"]),
+            workers=options["workers"],
+            budget=options["budget"],
+        )
+
+        if options["verbosity"] >= 2:
+            for label in warmed:
+                self.stdout.write(f"  warmed {label}")
+        for label, error in failed.items():
+            self.stderr.write(f"  failed {label}: {error}")
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"  out of time, skipped: {', '.join(skipped)}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(warmed)} cache entries in {seconds:.1f}s "
+            f"({len(failed)} failed, {len(skipped)} skipped)"
+        ))
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-19 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_visibility(apps, schema_editor):
+    """
+    Fill top_category and is_visible one id range at a time.
+    """
+    Product = apps.get_model("products", "Product")
+    SubCategory = apps.get_model("products", "SubCategory")
+    subcategory = SubCategory.objects.filter(id=OuterRef("category_id"))
+    last_id = 0
+    while True:
+        ids = list(Product.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        last_id = ids[-1]
+        Product.objects.filter(id__gte=ids[0], id__lte=last_id).update(
+            top_category_id=Subquery(subcategory.values("category_id")[:1]),
+            is_visible=ExpressionWrapper(
+                Exists(subcategory.filter(is_active=True, category__is_active=True)) & Q(is_active=True),
+                output_field=BooleanField(),
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_stockmovement_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_visible',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='top_category',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category'),
+        ),
+        migrations.RunPython(backfill_visibility, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_visible', 'category'], name='products_pr_is_visi_fc599b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_visible', 'top_category'], name='products_pr_is_visi_6cb5fc_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_visibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='products.product')),
+                ('daily_demand', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('days_of_cover', models.DecimalField(decimal_places=1, max_digits=10, null=True)),
+                ('reorder_quantity', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['reorder_quantity', 'days_of_cover'], name='products_de_reorder_93e282_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 6.0 on 2026-10-19 13:20
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+ORDER_REASON = re.compile(r"^Order #(\d+)")
+
+
+def parse_reasons(apps, schema_editor):
+    """
+    Derive kind and order from the old free-text reasons, batch by batch:
+    "Order #N from ..." is a sale, "Order #N [partially] returned" a return,
+    anything else a restock or an adjustment depending on the sign.
+    """
+    StockMovement = apps.get_model("products", "StockMovement")
+    Order = apps.get_model("order", "Order")
+    last_id = 0
+    while True:
+        rows = list(
+            StockMovement.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "change", "reason")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        order_ids = {}
+        for row in rows:
+            match = ORDER_REASON.match(row.reason)
+            if match:
+                order_ids[row.id] = int(match.group(1))
+        existing = set(Order.objects.filter(id__in=set(order_ids.values())).values_list("id", flat=True))
+
+        for row in rows:
+            if row.id in order_ids:
+                row.kind = "return" if row.change > 0 else "sale"
+                row.order_id = order_ids[row.id] if order_ids[row.id] in existing else None
+            else:
+                row.kind = "restock" if row.change > 0 else "adjustment"
+        StockMovement.objects.bulk_update(rows, ["kind", "order"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0023_productpair_recommendationrun'),
+        ('products', '0014_demandforecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], default='adjustment', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='order.order'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(parse_reasons, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'created_at'], name='products_st_product_a806c1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['kind', 'created_at'], name='products_st_kind_440d10_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 13:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_stockmovement_kind_order_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedStockMovement',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('change', models.IntegerField()),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('order_id', models.BigIntegerField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='products_ar_product_c68781_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 14:20
+
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_archivedstockmovement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=products.storage.media_storage, upload_to='products/'),
+        ),
+    ]
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.db import models
-from cloudinary_storage.storage import MediaCloudinaryStorage
+from .storage import media_storage
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -15,20 +16,114 @@ class SubCategory(models.Model):
         return self.name
 
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)  # supplier reference, used by import_catalog
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    price = models.FloatField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
     cached_quantity = models.PositiveIntegerField(default=0)
+    reserved_quantity = models.PositiveIntegerField(default=0, db_index=True)  # held by open checkouts
     category = models.ForeignKey(SubCategory, on_delete=models.CASCADE)
-    photo = models.ImageField(upload_to='products/', storage=MediaCloudinaryStorage(), blank=True, null=True)
+    photo = models.ImageField(upload_to='products/', storage=media_storage, blank=True, null=True)
     is_active = models.BooleanField(default=True)
+
+    # Denormalized from the subcategory so storefront queries stay on this table.
+    # Maintained by products.visibility; never edit by hand.
+    top_category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, editable=False, related_name="+")
+    is_visible = models.BooleanField(default=False, editable=False)  # product, subcategory and category all active
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_visible", "category"]),
+            models.Index(fields=["is_visible", "top_category"]),
+        ]
+
+    @property
+    def available_quantity(self):
+        return max(self.cached_quantity - self.reserved_quantity, 0)
+
     def __str__(self):
         return self.name
 
 class StockMovement(models.Model):
+    KIND_CHOICES = [
+        ("sale", "Sale"),
+        ("return", "Return"),
+        ("restock", "Restock"),
+        ("adjustment", "Adjustment"),
+    ]
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     change = models.IntegerField()  # +10, -1, -5
-    reason = models.CharField(max_length=50)
-    created_at = models.DateTimeField(auto_now_add=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default="adjustment")
+    order = models.ForeignKey(
+        "order.Order",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    reason = models.CharField(max_length=100, blank=True)  # free-text note, not parsed anywhere
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "created_at"]),
+            models.Index(fields=["kind", "created_at"]),
+        ]
+
+    def __str__(self):
+        return self.product.name
+
+class ArchivedStockMovement(models.Model):
+    """
+    StockMovement rows moved out of the live table by archive_history.
+    Same ids and columns; `order_id` may point at an archived order.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, related_name="+", on_delete=models.CASCADE)
+    change = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=StockMovement.KIND_CHOICES)
+    order_id = models.BigIntegerField(null=True, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    reason = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "created_at"]),
+        ]
+
     def __str__(self):
         return self.product.name
+
+class DemandForecast(models.Model):
+    """
+    Nightly demand estimate and reorder suggestion for a product that sold
+    recently. Rebuilt by the refresh_forecasts command.
+    """
+    product = models.OneToOneField(Product, primary_key=True, related_name="forecast", on_delete=models.CASCADE)
+    daily_demand = models.DecimalField(max_digits=10, decimal_places=2)  # smoothed units sold per day
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True)  # None when nothing is selling
+    reorder_quantity = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["reorder_quantity", "days_of_cover"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.daily_demand}/day"
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from amhaz.cache import invalidate
+from .listings import invalidate_subcategories
+from .models import Category, SubCategory, Product, StockMovement
+from .visibility import refresh_visibility, set_visibility
+
+
+@receiver(pre_save, sender=Product)
+def fill_product_visibility(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"category", "is_active"} & set(update_fields):
+        set_visibility(instance)
+
+
+@receiver(post_save, sender=Product)
+def save_product_visibility(sender, instance, update_fields=None, **kwargs):
+    # save(update_fields=["is_active"]) doesn't write what pre_save computed
+    if update_fields and {"category", "is_active"} & update_fields and "is_visible" not in update_fields:
+        refresh_visibility(Product.objects.filter(id=instance.id))
+
+
+@receiver(post_save, sender=Category)
+def cascade_category_visibility(sender, instance, created, **kwargs):
+    if not created:
+        refresh_visibility(Product.objects.filter(top_category_id=instance.id))
+
+
+@receiver(post_save, sender=SubCategory)
+def cascade_subcategory_visibility(sender, instance, created, **kwargs):
+    # also covers a subcategory moved under another category
+    if not created:
+        refresh_visibility(Product.objects.filter(category_id=instance.id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    invalidate("catalog", "search")
+
+
+@receiver(post_save, sender=StockMovement)
+def invalidate_stock(sender, instance, **kwargs):
+    # Only the listing showing this product's stock; the navbar and the
+    # other listings stay cached
+    invalidate_subcategories([instance.product.category_id])
@@ -0,0 +1,46 @@
+const categorySelect = document.getElementById("categorySelect");
+const subcategorySelect = document.getElementById("subcategorySelect");
+const productSelect = document.getElementById("productSelect");
+
+categorySelect.addEventListener("change", () => {
+  const categoryId = categorySelect.value;
+
+  subcategorySelect.innerHTML = `<option value="">All Subcategories</option>`;
+  productSelect.innerHTML = `<option value="">All Products</option>`;
+
+  if (!categoryId) return;
+
+  fetch(`/ajax/subcategories/?category=${categoryId}`)
+    .then(res => res.json())
+    .then(data => {
+      data.forEach(sub => {
+        subcategorySelect.innerHTML +=
+          `<option value="${sub.id}">${sub.name}</option>`;
+      });
+    });
+
+  fetch(`/ajax/products/?category=${categoryId}`)
+    .then(res => res.json())
+    .then(data => {
+      data.forEach(prod => {
+        productSelect.innerHTML +=
+          `<option value="${prod.id}">${prod.name}</option>`;
+      });
+    });
+});
+
+subcategorySelect.addEventListener("change", () => {
+  const categoryId = categorySelect.value;
+  const subId = subcategorySelect.value;
+
+  productSelect.innerHTML = `<option value="">All Products</option>`;
+
+  fetch(`/ajax/products/?category=${categoryId}&subcategory=${subId}`)
+    .then(res => res.json())
+    .then(data => {
+      data.forEach(prod => {
+        productSelect.innerHTML +=
+          `<option value="${prod.id}">${prod.name}</option>`;
+      });
+    });
+});
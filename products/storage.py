@@ -0,0 +1,56 @@
+from django.core.files.storage import Storage
+
+
+def _proxy(name):
+    def method(self, *args, **kwargs):
+        return getattr(self.storage, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+class LazyMediaStorage(Storage):
+    """
+    Stands in for MediaCloudinaryStorage until a file is actually read,
+    written or linked. Importing the Cloudinary SDK and building the
+    storage is deferred until then, so processes that never touch product
+    photos (management commands, cron jobs, most API calls) don't pay
+    for it at model import time.
+    """
+
+    def __init__(self):
+        self._storage = None
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from cloudinary_storage.storage import MediaCloudinaryStorage
+
+            self._storage = MediaCloudinaryStorage()
+        return self._storage
+
+    # Storage defines these itself, so __getattr__ alone wouldn't forward them
+    open = _proxy("open")
+    save = _proxy("save")
+    get_valid_name = _proxy("get_valid_name")
+    get_alternative_name = _proxy("get_alternative_name")
+    get_available_name = _proxy("get_available_name")
+    generate_filename = _proxy("generate_filename")
+    path = _proxy("path")
+    delete = _proxy("delete")
+    exists = _proxy("exists")
+    listdir = _proxy("listdir")
+    size = _proxy("size")
+    url = _proxy("url")
+    get_accessed_time = _proxy("get_accessed_time")
+    get_created_time = _proxy("get_created_time")
+    get_modified_time = _proxy("get_modified_time")
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+
+def media_storage():
+    # Callable storage: migrations reference this function, not a storage instance
+    return LazyMediaStorage()
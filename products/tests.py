@@ -1,3 +1,758 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import itertools
+import os
+import re
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.template import Template, engines
+from django.template.loader_tags import BlockNode
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+try:
+    import redis
+except ImportError:  # optional, only needed for the Redis cache tests
+    redis = None
+
+from amhaz.cache import get_or_build, invalidate, invalidate_group, make_key
+from amhaz.ratelimit import stats as ratelimit_stats
+from amhaz.templating import precompile, profile_renders, reset_template_cache, template_names
+
+from .facets import PRICE_BUCKET_KEYS, facet_counts, facet_rows, filter_products, parse_filters, search_products
+from .forecasting import day_start, forecast, refresh_forecasts
+from .listings import subcategory_products
+from .warmup import warm
+from .models import Category, DemandForecast, Product, StockMovement, SubCategory
+
+# Pages render {% static %} without a collectstatic run
+PLAIN_STATIC = override_settings(STORAGES={
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+
+
+class CatalogRoundTripTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Phones")
+        self.subcategory = SubCategory.objects.create(name="Chargers", category=category)
+        # Products created through the site have no sku
+        self.usb = Product.objects.create(name="USB-C charger", price=Decimal("12.50"), cached_quantity=4, category=self.subcategory)
+        self.car = Product.objects.create(name="Car charger", price=Decimal("8.00"), cached_quantity=0, category=self.subcategory)
+        self.tmp = tempfile.mkdtemp()
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def write_csv(self, name, rows):
+        with open(self.path(name), "w", newline="", encoding="utf-8") as fh:
+            writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return self.path(name)
+
+    def import_catalog(self, path):
+        out = io.StringIO()
+        call_command("import_catalog", path, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def test_export_then_import_changes_nothing(self):
+        call_command("export_catalog", output=self.path("catalog.csv"))
+
+        summary = self.import_catalog(self.path("catalog.csv"))
+
+        self.assertIn("created=0 updated=0 unchanged=2 skipped=0", summary)
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_supplier_skus_are_adopted_by_existing_products(self):
+        path = self.write_csv("supplier.csv", [
+            {"sku": "SUP-1", "name": "USB-C charger", "price": "13.00", "quantity": "10",
+             "category": "Phones", "subcategory": "Chargers", "is_active": "1"},
+            {"sku": "SUP-2", "name": "Wireless pad", "price": "20.00", "quantity": "3",
+             "category": "Phones", "subcategory": "Chargers", "is_active": "1"},
+        ])
+
+        summary = self.import_catalog(path)
+
+        self.assertIn("created=1 updated=1", summary)
+        self.usb.refresh_from_db()
+        self.assertEqual((self.usb.sku, self.usb.price, self.usb.cached_quantity), ("SUP-1", Decimal("13.00"), 10))
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(StockMovement.objects.get(product=self.usb).change, 6)
+
+        # The next supplier file matches on the adopted sku
+        path = self.write_csv("supplier2.csv", [
+            {"sku": "SUP-1", "name": "USB-C charger 20W", "price": "13.00", "quantity": "10",
+             "category": "Phones", "subcategory": "Chargers", "is_active": "1"},
+        ])
+        self.assertIn("created=0 updated=1", self.import_catalog(path))
+        self.usb.refresh_from_db()
+        self.assertEqual(self.usb.name, "USB-C charger 20W")
+
+    def test_products_with_another_sku_are_not_taken_over_by_name(self):
+        self.car.sku = "OLD-9"
+        self.car.save()
+        path = self.write_csv("supplier.csv", [
+            {"sku": "SUP-3", "name": "Car charger", "price": "9.00", "quantity": "1",
+             "category": "Phones", "subcategory": "Chargers", "is_active": "1"},
+        ])
+
+        self.assertIn("created=1", self.import_catalog(path))
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.sku, "OLD-9")
+
+
+# Branding assets that live in the deploy's static directory, not in the repo
+DEPLOY_ONLY_STATIC = {"images/logo.jpeg"}
+
+
+class StaticReferencesTests(SimpleTestCase):
+    def test_every_static_reference_exists(self):
+        # The manifest storage raises on a missing file, on every page that uses it
+        engine = engines["django"].engine
+        missing = []
+        for name in template_names(engine):
+            source = engine.find_template(name)[0].source
+            for path in re.findall(r"""{%\s*static\s+['"]([^'"]+)['"]""", source):
+                if path not in DEPLOY_ONLY_STATIC and not finders.find(path):
+                    missing.append(f"{name}: {path}")
+        self.assertEqual(missing, [])
+
+
+@PLAIN_STATIC
+class TemplateProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Laptops")
+        cls.subcategory = SubCategory.objects.create(name="Gaming", category=category)
+        Product.objects.bulk_create(
+            Product(name=f"Laptop {i}", price=Decimal("999.00"), cached_quantity=5, category=cls.subcategory)
+            for i in range(60)
+        )
+        cls.url = f"/subcategory/{cls.subcategory.id}/"
+
+    def count_compiles(self, reset, repeat=3):
+        """
+        Template compilations (parses) over `repeat` requests, optionally
+        emptying the loader cache before each one.
+        """
+        compile_nodelist = Template.compile_nodelist
+        with mock.patch.object(Template, "compile_nodelist", autospec=True, side_effect=compile_nodelist) as compiles:
+            for _ in range(repeat):
+                if reset:
+                    reset_template_cache()
+                self.client.get(self.url)
+        return compiles.call_count
+
+    def test_render_methods_are_restored_after_profiling(self):
+        before = (Template._render, BlockNode.render)
+        with profile_renders():
+            with profile_renders() as profile:
+                self.client.get(self.url)
+            self.assertNotEqual(Template._render, before[0])
+        self.assertEqual((Template._render, BlockNode.render), before)
+        self.assertIn("products/products_by_subcategory.html", [name for name, *_ in profile.rows()])
+
+    def test_listing_page_reuses_compiled_templates(self):
+        self.client.get(self.url)  # fills the catalog cache
+
+        self.assertGreater(self.count_compiles(reset=True), 0)
+        reset_template_cache()
+        precompile()
+        self.assertEqual(self.count_compiles(reset=False), 0)
+
+
+class GetOrBuildTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+
+    def builder(self, value):
+        def build():
+            self.builds.append(value)
+            return value
+        return build
+
+    def test_fresh_value_is_built_once(self):
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("a")), "a")
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("b")), "a")
+        self.assertEqual(self.builds, ["a"])
+
+    def test_stale_value_is_served_while_another_worker_rebuilds(self):
+        get_or_build("catalog", ["x"], self.builder("old"), timeout=0)  # stale at once
+        cache.add(f"lock:{make_key('catalog', 'x')}", 1)  # another worker is rebuilding
+
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("new")), "old")
+        self.assertEqual(self.builds, ["old"])
+
+        cache.delete(f"lock:{make_key('catalog', 'x')}")
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("new")), "new")
+        self.assertEqual(self.builds, ["old", "new"])
+
+    def test_cold_key_waits_for_the_worker_holding_the_lock(self):
+        key = make_key("catalog", "x")
+        cache.add(f"lock:{key}", 1)
+        other_worker = threading.Timer(0.2, cache.set, [key, ("theirs", time.time() + 60)])
+        other_worker.start()
+        self.addCleanup(other_worker.cancel)
+
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("mine")), "theirs")
+        self.assertEqual(self.builds, [])
+
+    def test_cold_key_is_built_when_the_lock_holder_never_finishes(self):
+        cache.add(f"lock:{make_key('catalog', 'x')}", 1)
+
+        with mock.patch("amhaz.cache.LOCK_WAIT", 0.1):
+            self.assertEqual(get_or_build("catalog", ["x"], self.builder("mine")), "mine")
+        self.assertEqual(self.builds, ["mine"])
+
+    def test_invalidate_bumps_only_the_given_namespaces(self):
+        get_or_build("catalog", ["x"], self.builder("catalog 1"))
+        get_or_build("search", ["x"], self.builder("search 1"))
+        old_key = make_key("catalog", "x")
+
+        invalidate("catalog")
+
+        self.assertNotEqual(make_key("catalog", "x"), old_key)
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("catalog 2")), "catalog 2")
+        self.assertEqual(get_or_build("search", ["x"], self.builder("search 2")), "search 1")
+
+    def test_invalidate_group_keeps_the_rest_of_the_namespace(self):
+        get_or_build("catalog", ["x"], self.builder("navbar 1"))
+        get_or_build("catalog", ["y"], self.builder("laptops 1"), group="laptops")
+        get_or_build("catalog", ["y"], self.builder("phones 1"), group="phones")
+
+        invalidate_group("catalog", "laptops")
+
+        self.assertEqual(get_or_build("catalog", ["x"], self.builder("navbar 2")), "navbar 1")
+        self.assertEqual(get_or_build("catalog", ["y"], self.builder("laptops 2"), group="laptops"), "laptops 2")
+        self.assertEqual(get_or_build("catalog", ["y"], self.builder("phones 2"), group="phones"), "phones 1")
+
+        invalidate("catalog")
+        self.assertEqual(get_or_build("catalog", ["y"], self.builder("phones 3"), group="phones"), "phones 3")
+
+    def test_invalidate_restarts_an_evicted_version(self):
+        old_key = make_key("catalog", "x")
+        cache.delete("ns:catalog:version")
+
+        invalidate("catalog")
+
+        self.assertNotEqual(make_key("catalog", "x"), old_key)
+
+
+class VisibilityCascadeTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Laptops")
+        self.subcategory = SubCategory.objects.create(name="Gaming", category=self.category)
+        self.product = Product.objects.create(name="Laptop", price=Decimal("999.00"), category=self.subcategory)
+        self.hidden = Product.objects.create(
+            name="Old laptop", price=Decimal("499.00"), category=self.subcategory, is_active=False
+        )
+
+    def visible(self):
+        return set(Product.objects.filter(is_visible=True).values_list("name", flat=True))
+
+    def test_new_products_are_visible_unless_hidden(self):
+        self.assertEqual(self.visible(), {"Laptop"})
+        self.assertEqual(Product.objects.get(id=self.hidden.id).top_category_id, self.category.id)
+
+    def test_hiding_and_unhiding_a_category(self):
+        self.category.is_active = False
+        self.category.save()
+        self.assertEqual(self.visible(), set())
+
+        self.category.is_active = True
+        self.category.save()
+        self.assertEqual(self.visible(), {"Laptop"})
+
+    def test_hiding_and_unhiding_a_subcategory(self):
+        self.subcategory.is_active = False
+        self.subcategory.save()
+        self.assertEqual(self.visible(), set())
+
+        self.subcategory.is_active = True
+        self.subcategory.save()
+        self.assertEqual(self.visible(), {"Laptop"})
+
+    def test_hiding_and_unhiding_a_product(self):
+        self.product.is_active = False
+        self.product.save(update_fields=["is_active"])
+        self.assertEqual(self.visible(), set())
+
+        self.product.is_active = True
+        self.product.save(update_fields=["is_active"])
+        self.assertEqual(self.visible(), {"Laptop"})
+
+    def test_product_in_hidden_subcategory_stays_hidden_when_activated(self):
+        self.subcategory.is_active = False
+        self.subcategory.save()
+        self.hidden.is_active = True
+        self.hidden.save()
+        self.assertEqual(self.visible(), set())
+
+    def test_explicitly_hidden_product_stays_hidden_when_parents_come_back(self):
+        self.category.is_active = False
+        self.category.save()
+        self.subcategory.is_active = False
+        self.subcategory.save()
+
+        self.subcategory.is_active = True
+        self.subcategory.save()
+        self.category.is_active = True
+        self.category.save()
+
+        self.assertEqual(self.visible(), {"Laptop"})
+        self.assertFalse(Product.objects.get(id=self.hidden.id).is_visible)
+
+    def test_moving_a_subcategory_follows_the_new_category(self):
+        hidden_category = Category.objects.create(name="Archive", is_active=False)
+        self.subcategory.category = hidden_category
+        self.subcategory.save()
+
+        product = Product.objects.get(id=self.product.id)
+        self.assertEqual(product.top_category_id, hidden_category.id)
+        self.assertFalse(product.is_visible)
+
+
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name="Phones")
+        cls.laptops = Category.objects.create(name="Laptops")
+        cls.chargers = SubCategory.objects.create(name="Chargers", category=cls.phones)
+        cables = SubCategory.objects.create(name="Cables", category=cls.phones)
+        gaming = SubCategory.objects.create(name="Gaming", category=cls.laptops)
+        for name, price, subcategory, quantity, reserved in [
+            ("USB-C charger", "19.99", cls.chargers, 5, 0),
+            ("USB-C fast charger", "35.00", cls.chargers, 2, 2),  # all held by checkouts
+            ("Wireless charger", "60.00", cls.chargers, 0, 0),
+            ("USB-C cable", "9.99", cables, 10, 4),
+            ("Lightning cable", "12.00", cables, 0, 0),
+            ("USB-C gaming laptop", "1299.00", gaming, 1, 0),
+            ("Gaming laptop", "999.00", gaming, 3, 1),
+        ]:
+            Product.objects.create(
+                name=name, price=Decimal(price), category=subcategory,
+                cached_quantity=quantity, reserved_quantity=reserved,
+            )
+
+    def count(self, filters, **changes):
+        return filter_products(Product.objects.all(), {**filters, **changes}).count()
+
+    def test_in_stock_excludes_reserved_stock(self):
+        filters = parse_filters(QueryDict("in_stock=1"))
+
+        names = set(filter_products(Product.objects.all(), filters).values_list("name", flat=True))
+        facets = facet_counts(facet_rows(Product.objects.all()), filters)
+
+        self.assertNotIn("USB-C fast charger", names)
+        self.assertEqual(facets["total"], len(names))
+        self.assertEqual(facets["in_stock"], 4)
+
+    def test_each_facet_counts_with_every_other_selected_filter(self):
+        for query in itertools.product(
+            ["", "q=usb"],
+            ["", f"category={self.phones.id}", f"category={self.phones.id}&subcategory={self.chargers.id}"],
+            ["", "price=0-25", "price=250+"],
+            ["", "in_stock=1"],
+        ):
+            filters = parse_filters(QueryDict("&".join(part for part in query if part)))
+            with self.subTest(filters=filters):
+                rows = facet_rows(search_products(Product.objects.all(), filters))
+                facets = facet_counts(rows, filters)
+
+                self.assertEqual(facets["total"], self.count(filters))
+                self.assertEqual(
+                    {category["id"]: category["count"] for category in facets["categories"]},
+                    {
+                        category["id"]: self.count(filters, category=category["id"], subcategory=None)
+                        for category in facets["categories"]
+                    },
+                )
+                self.assertEqual(
+                    [subcategory["count"] for subcategory in facets["subcategories"]],
+                    [self.count(filters, subcategory=subcategory["id"]) for subcategory in facets["subcategories"]],
+                )
+                self.assertEqual(
+                    [price["count"] for price in facets["prices"]],
+                    [self.count(filters, price=key) for key in PRICE_BUCKET_KEYS],
+                )
+                self.assertEqual(facets["in_stock"], self.count(filters, in_stock=True))
+                if filters["category"]:
+                    self.assertEqual(len(facets["subcategories"]), 2)
+
+
+class ListingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Phones")
+        self.chargers = SubCategory.objects.create(name="Chargers", category=category)
+        self.cables = SubCategory.objects.create(name="Cables", category=category)
+        self.charger = Product.objects.create(name="Charger", price=Decimal("5.99"), cached_quantity=5, category=self.chargers)
+        self.cable = Product.objects.create(name="Cable", price=Decimal("3.00"), cached_quantity=5, category=self.cables)
+
+    def test_a_sale_drops_only_its_subcategory_listing(self):
+        self.assertEqual(subcategory_products(self.chargers.id)[0].cached_quantity, 5)
+        untouched = [
+            make_key("catalog", "navbar"),
+            make_key("catalog", "subcategory", self.cables.id, group=f"subcategory:{self.cables.id}"),
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(id=self.charger.id).update(cached_quantity=4)
+            StockMovement.objects.create(product=self.charger, change=-1, kind="sale")
+
+        self.assertEqual(subcategory_products(self.chargers.id)[0].cached_quantity, 4)
+        self.assertEqual([
+            make_key("catalog", "navbar"),
+            make_key("catalog", "subcategory", self.cables.id, group=f"subcategory:{self.cables.id}"),
+        ], untouched)
+
+    def test_listing_waits_for_the_commit(self):
+        subcategory_products(self.chargers.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Product.objects.filter(id=self.charger.id).update(cached_quantity=4)
+            StockMovement.objects.create(product=self.charger, change=-1, kind="sale")
+            self.assertEqual(subcategory_products(self.chargers.id)[0].cached_quantity, 5)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(subcategory_products(self.chargers.id)[0].cached_quantity, 4)
+
+
+class WarmupTests(TestCase):
+    def test_failures_are_reported_and_the_rest_warmed(self):
+        def broken():
+            raise OperationalError("database is down")
+
+        warmed, failed, skipped, _ = warm([("ok", lambda: None), ("broken", broken)], workers=1)
+
+        self.assertEqual(warmed, ["ok"])
+        self.assertEqual(list(failed), ["broken"])
+        self.assertEqual(skipped, [])
+
+    def test_tasks_past_the_budget_never_start(self):
+        ran = []
+        tasks = [("slow", lambda: time.sleep(0.5))] + [
+            (f"queued {i}", lambda i=i: ran.append(i)) for i in range(3)
+        ]
+
+        warmed, failed, skipped, seconds = warm(tasks, workers=1, budget=0.1)
+
+        self.assertLess(seconds, 0.4)
+        self.assertEqual((warmed, failed), ([], {}))
+        self.assertEqual(skipped, ["slow", "queued 0", "queued 1", "queued 2"])
+        time.sleep(0.6)  # the slow task is done, its thread is free again
+        self.assertEqual(ran, [])
+
+    def test_worker_boots_cold_when_warming_fails(self):
+        spec = importlib.util.spec_from_file_location("gunicorn_conf", settings.BASE_DIR / "gunicorn.conf.py")
+        gunicorn_conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(gunicorn_conf)
+        worker = mock.Mock()
+
+        with mock.patch.object(gunicorn_conf, "PRECOMPILE_TEMPLATES_ON_BOOT", False), \
+                mock.patch.object(gunicorn_conf, "WARM_CACHES_ON_BOOT", True), \
+                mock.patch("products.warmup.warm_tasks", side_effect=OperationalError("database is down")):
+            gunicorn_conf.post_worker_init(worker)
+
+        worker.log.exception.assert_called_once()
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Enough of the Redis protocol (RESP2) for django's RedisCache: strings
+    with expiry, SET NX, INCRBY, MGET. Every command runs under one lock,
+    so add() and incr() are as atomic as on a real server.
+    """
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, bool):
+            self.wfile.write(b"+OK\r\n" if value else b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, list):
+            self.wfile.write(b"*%d\r\n" % len(value))
+            for item in value:
+                self.reply(item)
+        elif isinstance(value, Exception):
+            self.wfile.write(f"-ERR {value}\r\n".encode())
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        while (args := self.read_command()) is not None:
+            with self.server.lock:
+                self.reply(self.run(args[0].decode().upper(), args[1:]))
+
+    def live(self, key):
+        value, expires_at = self.server.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.server.data[key]
+            return None
+        return value
+
+    def run(self, command, args):
+        data = self.server.data
+        if command == "PING":
+            return b"PONG"
+        if command in ("SELECT", "CLIENT"):
+            return True
+        if command == "FLUSHDB":
+            data.clear()
+            return True
+        if command == "GET":
+            return self.live(args[0])
+        if command == "MGET":
+            return [self.live(key) for key in args]
+        if command == "EXISTS":
+            return sum(self.live(key) is not None for key in args)
+        if command == "DEL":
+            return sum(data.pop(key, None) is not None for key in args if self.live(key) is not None)
+        if command == "SET":
+            key, value, options = args[0], args[1], [arg.decode().upper() for arg in args[2:]]
+            if "NX" in options and self.live(key) is not None:
+                return None
+            expires_at = None
+            if "EX" in options:
+                expires_at = time.monotonic() + int(options[options.index("EX") + 1])
+            elif "PX" in options:
+                expires_at = time.monotonic() + int(options[options.index("PX") + 1]) / 1000
+            data[key] = (value, expires_at)
+            return True
+        if command in ("INCR", "INCRBY", "DECRBY"):
+            delta = int(args[1]) if len(args) > 1 else 1
+            value = self.live(args[0]) or b"0"
+            if not value.lstrip(b"-").isdigit():
+                return ValueError("value is not an integer or out of range")
+            value = int(value) + (-delta if command == "DECRBY" else delta)
+            data[args[0]] = (str(value).encode(), data.get(args[0], (None, None))[1])
+            return value
+        if command in ("EXPIRE", "PERSIST"):
+            if self.live(args[0]) is None:
+                return 0
+            expires_at = time.monotonic() + int(args[1]) if command == "EXPIRE" else None
+            data[args[0]] = (data[args[0]][0], expires_at)
+            return 1
+        return ValueError(f"unknown command '{command}'")
+
+
+@skipUnless(redis, "the redis package is not installed")
+class RedisGetOrBuildTests(GetOrBuildTests):
+    """
+    The same tests against django's RedisCache, talking to a local fake
+    Redis server: add() (SET NX) takes the locks and incr() bumps versions.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redis = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRedisHandler)
+        cls.redis.daemon_threads = True
+        cls.redis.data, cls.redis.lock = {}, threading.Lock()
+        threading.Thread(target=cls.redis.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.redis.server_close)
+        cls.addClassCleanup(cls.redis.shutdown)
+        redis_cache = override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": f"redis://127.0.0.1:{cls.redis.server_address[1]}/0",
+            "OPTIONS": {"protocol": 2},  # the fake only speaks RESP2
+        }})
+        redis_cache.enable()
+        cls.addClassCleanup(redis_cache.disable)
+        super().setUpClass()
+
+    def test_values_live_in_redis(self):
+        get_or_build("catalog", ["x"], self.builder("a"))
+
+        self.assertIn(f":1:{make_key('catalog', 'x')}".encode(), self.redis.data)
+        self.assertEqual(self.redis.data[b":1:ns:catalog:version"][0], b"1")
+
+
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import django
+django.setup()
+print(time.perf_counter() - start)
+print(" ".join(sys.modules))
+"""
+
+
+class StartupTests(SimpleTestCase):
+    # django.setup() in a fresh process, cron commands included; about 0.4s
+    # on a developer laptop, so the budget only catches a heavy new import
+    SETUP_BUDGET = 1.5
+
+    def start_process(self):
+        """
+        (seconds spent in django.setup(), imported module names, the
+        slowest imports by cumulative time from -X importtime).
+        """
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        )
+        seconds, modules = result.stdout.splitlines()[-2:]
+        imports = []
+        for line in result.stderr.splitlines():
+            match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+            if match:
+                imports.append((int(match[1]), match[3]))
+        slowest = [f"{us / 1000:.0f}ms {name}" for us, name in sorted(imports, reverse=True)[:15]]
+        return float(seconds), set(modules.split()), slowest
+
+    def test_heavy_dependencies_are_not_imported_at_startup(self):
+        _, modules, _ = self.start_process()
+
+        self.assertNotIn("cloudinary", modules)
+        if not (settings.BASE_DIR / ".env").exists():
+            self.assertNotIn("dotenv", modules)
+
+    def test_setup_time_within_budget(self):
+        runs = [self.start_process() for _ in range(3)]
+        seconds, _, slowest = min(runs)
+
+        self.assertLess(seconds, self.SETUP_BUDGET, "\n".join(slowest))
+
+
+@PLAIN_STATIC
+@override_settings(RATELIMIT_ENABLED=True)
+class SearchRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Frozen clock: every request lands in the same window
+        clock = mock.patch("amhaz.ratelimit.time", mock.Mock(time=lambda: 1_800_000_000.0))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def search(self, **extra):
+        return self.client.get("/search/", {"q": "phone"}, **extra)
+
+    def test_one_client_gets_30_searches_a_minute(self):
+        with self.assertLogs("amhaz.ratelimit", "WARNING") as logs:
+            statuses = [self.search().status_code for _ in range(100)]
+            throttled = self.search()
+
+        self.assertEqual(statuses, [200] * 30 + [429] * 70)
+        self.assertEqual(throttled["Retry-After"], "60")
+        self.assertEqual(len(logs.records), 71)
+        self.assertEqual(ratelimit_stats(["search"]), {"search": 71})
+
+    def test_other_clients_are_not_throttled(self):
+        with self.assertLogs("amhaz.ratelimit", "WARNING"):
+            for _ in range(31):
+                self.search()
+
+        self.assertEqual(self.search(REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    def test_flood_runs_no_queries_once_throttled(self):
+        self.search(REMOTE_ADDR="10.0.0.2")  # fills the page caches
+        with CaptureQueriesContext(connection) as one_search:
+            self.search(REMOTE_ADDR="10.0.0.3")
+
+        with self.assertLogs("amhaz.ratelimit", "WARNING"), CaptureQueriesContext(connection) as flood:
+            statuses = [self.search().status_code for _ in range(100)]
+
+        # Only the 30 allowed searches reach the database
+        self.assertEqual(statuses.count(200), 30)
+        self.assertEqual(len(flood), 30 * len(one_search))
+        with CaptureQueriesContext(connection) as after:
+            self.assertEqual(self.search(REMOTE_ADDR="10.0.0.4").status_code, 200)
+        self.assertEqual(len(after), len(one_search))
+
+    @override_settings(RATELIMIT_PROXY_COUNT=1)
+    def test_forged_forwarded_for_does_not_escape_the_limit(self):
+        # The client prepends a new address each time; the proxy appends the real one
+        with self.assertLogs("amhaz.ratelimit", "WARNING"):
+            statuses = [
+                self.search(HTTP_X_FORWARDED_FOR=f"198.51.100.{i}, 203.0.113.7").status_code
+                for i in range(31)
+            ]
+
+        self.assertEqual(statuses, [200] * 30 + [429])
+        self.assertEqual(self.search(HTTP_X_FORWARDED_FOR="203.0.113.8").status_code, 200)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_off_unless_enabled(self):
+        statuses = {self.search().status_code for _ in range(31)}
+
+        self.assertEqual(statuses, {200})
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Phones")
+        subcategory = SubCategory.objects.create(name="Chargers", category=category)
+        self.product = Product.objects.create(name="USB-C charger", price=Decimal("5.99"), category=subcategory)
+        self.today = timezone.localdate()
+
+    def sold(self, units, days_ago):
+        movement = StockMovement.objects.create(product=self.product, change=-units, kind="sale")
+        midday = day_start(self.today - timedelta(days=days_ago)) + timedelta(hours=12)
+        StockMovement.objects.filter(id=movement.id).update(created_at=midday)
+
+    def forecast_for(self, on_hand, **options):
+        Product.objects.filter(id=self.product.id).update(cached_quantity=on_hand)
+        forecasts = forecast(**options)
+        self.assertEqual([f.product_id for f in forecasts], [self.product.id])
+        return forecasts[0]
+
+    def test_steady_sales_over_whole_days(self):
+        for days_ago in range(1, 57):
+            self.sold(2, days_ago)
+        # Outside the window: today's partial day and the day before it starts
+        self.sold(50, 0)
+        self.sold(50, 57)
+
+        result = self.forecast_for(on_hand=10)
+
+        self.assertEqual(result.daily_demand, Decimal("2.00"))
+        self.assertEqual(result.days_of_cover, Decimal("5.0"))
+        self.assertEqual(result.reorder_quantity, 2 * (7 + 14) - 10)
+
+    def test_last_bucket_is_yesterday(self):
+        self.sold(10, 1)
+        self.sold(3, 0)
+
+        result = self.forecast_for(on_hand=10, days=4)
+
+        # Smoothing [0, 0, 0, 10] from its mean of 2.5
+        self.assertEqual(result.daily_demand, Decimal("3.60"))
+        self.assertEqual(result.reorder_quantity, 76 - 10)
+
+    def test_refresh_replaces_stored_forecasts(self):
+        self.sold(1, 1)
+
+        self.assertEqual(refresh_forecasts(), 1)
+        self.assertEqual(refresh_forecasts(), 1)
+        self.assertEqual(list(DemandForecast.objects.values_list("product", flat=True)), [self.product.id])
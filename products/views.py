@@ -4,7 +4,12 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.models import Sum
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import SubCategory, Product, StockMovement, Category
+from amhaz.ratelimit import ratelimit, stats as ratelimit_stats
+from .facets import cached_facet_rows, facet_counts, facet_links, facet_query, filter_products, parse_filters
+from .listings import subcategory_products
+from .models import SubCategory, Product, StockMovement, Category, DemandForecast
+
+SEARCH_PAGE_SIZE = 24
 
 
 def home(request):
@@ -14,10 +19,11 @@ def home(request):
 def products_by_subcategory(request, sub_id):
     subcategory = get_object_or_404(SubCategory, id=sub_id)
 
-    products = Product.objects.filter(category=subcategory)
-
-    if not request.user.is_staff:
-        products = products.filter(is_active=True)
+    if request.user.is_staff:
+        products = Product.objects.filter(category=subcategory)
+    else:
+        # shared by every customer; dropped when its products or their stock change
+        products = subcategory_products(sub_id)
 
     return render(request, 'products/products_by_subcategory.html', {
         'subcategory': subcategory,
@@ -25,22 +31,35 @@ def products_by_subcategory(request, sub_id):
     })
 
 
+@ratelimit("search", rate="30/m")
 def product_search(request):
-    search_query = request.GET.get('q', '').strip()
+    filters = parse_filters(request.GET)
 
     products = Product.objects.all()
 
     if not request.user.is_staff:
-        products = products.filter(is_active=True)
+        products = products.filter(is_visible=True)
+
+    # Counts for every facet from one grouped query (see products/facets.py)
+    rows = cached_facet_rows(products, filters, "staff" if request.user.is_staff else "public")
+    facets = facet_links(facet_counts(rows, filters), request.GET, filters)
 
-    if search_query:
-        products = products.filter(
-            name__icontains=search_query
-        )
+    page = request.GET.get('page', '')
+    page = int(page) if page.isdigit() and int(page) > 0 else 1
+    offset = (page - 1) * SEARCH_PAGE_SIZE
+
+    # One extra row tells whether there is a next page, without a COUNT
+    results = list(
+        filter_products(products, filters).order_by('id')[offset:offset + SEARCH_PAGE_SIZE + 1]
+    )
 
     return render(request, 'products/product_search.html', {
-        'products': products,
-        'search_query': search_query,
+        'products': results[:SEARCH_PAGE_SIZE],
+        'search_query': filters['q'],
+        'filters': filters,
+        'facets': facets,
+        'previous_query': facet_query(request.GET, page=page - 1) if page > 1 else None,
+        'next_query': facet_query(request.GET, page=page + 1) if len(results) > SEARCH_PAGE_SIZE else None,
     })
 
 
@@ -113,9 +132,9 @@ def dashboard(request):
 
     # -------- FILTERS --------
     if category_id:
-        products = products.filter(category_id=category_id)
+        products = products.filter(top_category_id=category_id)
         subcategories = SubCategory.objects.filter(category_id=category_id)
-        movements = movements.filter(product__category_id=category_id)
+        movements = movements.filter(product__top_category_id=category_id)
 
     if subcategory_id:
         products = products.filter(category=subcategory_id)
@@ -134,6 +153,13 @@ def dashboard(request):
 
     recent_movements = movements.order_by('-created_at')[:10]
 
+    # precomputed nightly by refresh_forecasts
+    reorder_suggestions = (
+        DemandForecast.objects.filter(reorder_quantity__gt=0, product__in=products)
+        .select_related('product')
+        .order_by('days_of_cover')[:20]
+    )
+
     return render(request, 'dashboard/dashboard.html', {
         'categories': categories,
         'subcategories': subcategories,
@@ -145,14 +171,18 @@ def dashboard(request):
         'total_stock': total_stock,
         'low_stock_products': low_stock_products,
         'recent_movements': recent_movements,
+        'reorder_suggestions': reorder_suggestions,
+        'throttled': ratelimit_stats(["cart", "search", "ajax"]),
     })
 
+@ratelimit("ajax", rate="120/m")
 def ajax_subcategories(request):
     category_id = request.GET.get("category")
     subs = SubCategory.objects.filter(category_id=category_id).values("id", "name")
     return JsonResponse(list(subs), safe=False)
 
 
+@ratelimit("ajax", rate="120/m")
 def ajax_products(request):
     category_id = request.GET.get("category")
     subcategory_id = request.GET.get("subcategory")
@@ -160,7 +190,7 @@ def ajax_products(request):
     qs = Product.objects.all()
 
     if category_id:
-        qs = qs.filter(category_id=category_id)
+        qs = qs.filter(top_category_id=category_id)
     if subcategory_id:
         qs = qs.filter(category_id=subcategory_id)
 
@@ -178,7 +208,9 @@ def add_stock(request, product_id):
         if form.is_valid():
             change = form.cleaned_data['change']
             reason = form.cleaned_data['reason']
-            StockMovement.objects.create(product=product, change=change, reason=reason)
+            StockMovement.objects.create(
+                product=product, change=change, kind="restock", user=request.user, reason=reason
+            )
             product.cached_quantity += change
             product.save()
             return redirect('dashboard')
@@ -197,7 +229,9 @@ def remove_stock(request, product_id):
         if form.is_valid():
             change = form.cleaned_data['change']
             reason = form.cleaned_data['reason']
-            StockMovement.objects.create(product=product, change=-change, reason=reason)
+            StockMovement.objects.create(
+                product=product, change=-change, kind="adjustment", user=request.user, reason=reason
+            )
             product.cached_quantity -= change
             if product.cached_quantity < 0:
                 product.cached_quantity = 0
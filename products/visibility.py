@@ -0,0 +1,45 @@
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q, Subquery
+
+from .models import Product, SubCategory
+
+
+def visible_expression():
+    """
+    SQL for "the product, its subcategory and its category are all active".
+    """
+    return ExpressionWrapper(
+        Exists(SubCategory.objects.filter(id=OuterRef("category_id"), is_active=True, category__is_active=True))
+        & Q(is_active=True),
+        output_field=BooleanField(),
+    )
+
+
+def refresh_visibility(products=None):
+    """
+    Recompute top_category and is_visible for `products` (a Product
+    queryset, all products by default) in a single UPDATE.
+    Returns the number of rows touched.
+    """
+    if products is None:
+        products = Product.objects.all()
+    return products.update(
+        top_category_id=Subquery(SubCategory.objects.filter(id=OuterRef("category_id")).values("category_id")[:1]),
+        is_visible=visible_expression(),
+    )
+
+
+def set_visibility(product):
+    """
+    Fill the denormalized columns on an unsaved/changed product in memory.
+    """
+    row = (
+        SubCategory.objects.filter(id=product.category_id)
+        .values_list("category_id", "is_active", "category__is_active")
+        .first()
+    )
+    if row is None:
+        product.top_category_id, product.is_visible = None, False
+        return
+    category_id, subcategory_active, category_active = row
+    product.top_category_id = category_id
+    product.is_visible = product.is_active and subcategory_active and category_active
@@ -0,0 +1,90 @@
+"""
+Cache priming for freshly deployed or restarted workers.
+
+Builds the same cache entries the storefront reads (navbar tree, the
+busiest subcategory listings) through get_or_build, so the first
+customers after a deploy get steady-state response times.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import close_old_connections, connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from amhaz.cache import get_or_build
+from .context_processors import build_navbar_tree
+from .listings import subcategory_products
+from .models import StockMovement, SubCategory
+
+
+def top_subcategories(limit, days=30):
+    """
+    The `limit` subcategories that sold most units over the last `days`
+    days, topped up with other active subcategories when sales are thin.
+    """
+    since = timezone.now() - timedelta(days=days)
+    ids = list(
+        StockMovement.objects.filter(kind="sale", created_at__gte=since)
+        .values_list("product__category_id", flat=True)
+        .annotate(units=Sum("change"))
+        .order_by("units")[:limit]  # sales are negative
+    )
+    if len(ids) < limit:
+        ids += SubCategory.objects.filter(is_active=True).exclude(id__in=ids).values_list("id", flat=True)[:limit - len(ids)]
+    return ids
+
+
+def warm_tasks(top=20):
+    """
+    (label, callable) pairs, most important first.
+    """
+    tasks = [("navbar", lambda: get_or_build("catalog", ["navbar"], build_navbar_tree))]
+    for sub_id in top_subcategories(top):
+        tasks.append((f"subcategory {sub_id}", lambda sub_id=sub_id: subcategory_products(sub_id)))
+    return tasks
+
+
+class OutOfTime(Exception):
+    pass
+
+
+def _run(task, deadline):
+    # A thread freed just as the budget ran out could still pick up a task
+    if time.monotonic() >= deadline:
+        raise OutOfTime
+    close_old_connections()
+    try:
+        task()
+    finally:
+        # each pool thread opened its own connection
+        connections.close_all()
+
+
+def warm(tasks, workers=4, budget=30):
+    """
+    Run `tasks` on a thread pool and return after at most `budget` seconds.
+    Tasks not started by then are cancelled and never start. A task
+    already running can't be interrupted (Python threads can't be killed):
+    it finishes in the background, on its own connection, and still fills
+    its cache entry.
+    Returns (warmed labels, failed {label: error}, skipped labels, seconds).
+    """
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm")
+    futures = {pool.submit(_run, task, started + budget): label for label, task in tasks}
+    done, pending = wait(futures, timeout=budget)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    warmed, failed, skipped = [], {}, []
+    for future in done:
+        error = future.exception()
+        if error is None:
+            warmed.append(futures[future])
+        elif isinstance(error, OutOfTime):
+            skipped.append(futures[future])
+        else:
+            failed[futures[future]] = error
+    skipped += [label for future, label in futures.items() if future in pending]
+    return warmed, failed, skipped, time.monotonic() - started
@@ -0,0 +1,81 @@
+document.addEventListener("click", (e) => {
+  const btn = e.target.closest(".add-to-cart-btn");
+  if (!btn) return;
+
+  const form = btn.closest(".add-to-cart-form");
+  const productId = form.dataset.productId;
+  const csrfToken = form.querySelector("[name=csrfmiddlewaretoken]").value;
+
+  const cart = document.getElementById("cartIcon");
+  const card = btn.closest(".card");
+  const img = card?.querySelector("img");
+
+  /* ========= START RECT ========= */
+  const startRect = (img || btn).getBoundingClientRect();
+  const endRect = cart.getBoundingClientRect();
+
+  const startX = startRect.left + startRect.width / 2;
+  const startY = startRect.top + startRect.height / 2;
+
+  const endX = endRect.left + endRect.width / 2;
+  const endY = endRect.top + endRect.height / 2;
+
+  const dx = endX - startX;
+  const dy = endY - startY;
+
+  /* ========= CREATE CLONE ========= */
+  let clone;
+  if (img) {
+    clone = img.cloneNode(true);
+  } else {
+    clone = document.createElement("div");
+    clone.innerHTML = '<i class="bi bi-basket3-fill"></i>';
+    clone.style.display = "flex";
+    clone.style.alignItems = "center";
+    clone.style.justifyContent = "center";
+    clone.style.background = "#f1f5f9";
+    clone.style.color = "#2563eb";
+    clone.style.fontSize = "22px";
+  }
+
+  clone.classList.add("fly-img");
+  clone.style.left = startRect.left + "px";
+  clone.style.top = startRect.top + "px";
+  clone.style.width = startRect.width + "px";
+  clone.style.height = startRect.height + "px";
+  clone.style.boxShadow = "0 12px 25px rgba(0,0,0,.2)";
+  clone.style.borderRadius = "12px";
+  clone.style.transition = "transform 0.42s cubic-bezier(.22,.9,.3,1), opacity 0.42s ease-out";
+  clone.style.opacity = "1";
+
+  document.body.appendChild(clone);
+
+  /* ========= ANIMATION ========= */
+  requestAnimationFrame(() => {
+    clone.style.transform = `translate(${dx}px, ${dy}px) scale(0.22)`;
+    clone.style.opacity = "0.25";
+  });
+
+  /* ========= HANDLE CART BOUNCE + COUNTER ========= */
+  clone.addEventListener("transitionend", () => {
+    clone.remove();
+    cart.classList.add("cart-bounce");
+
+    // Only update counter after bounce
+    fetch(`/order/add/${productId}/`, {
+      method: "POST",
+      headers: {
+        "X-CSRFToken": csrfToken,
+        "X-Requested-With": "XMLHttpRequest"
+      }
+    })
+    .then(r => r.ok ? r.json() : null)
+    .then(data => {
+      if (data) {
+        document.getElementById("cartCount").textContent = data.cart_count;
+      }
+    });
+
+    setTimeout(() => cart.classList.remove("cart-bounce"), 320);
+  }, { once: true });
+});